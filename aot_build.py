@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import os
+import time
+
+from py65xx import aot
+from py65xx.bus import MMap
+from pyc64.aot import seeds
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Translate C64 BASIC and KERNAL ROMs into Python ahead of time",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--rom-dir", type=str, default=".", help="Directory of ROM files.")
+    parser.add_argument("--cache-dir", type=str, default=aot.default_cache_dir(),
+                        help="Directory of translated modules.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+
+    basic = MMap("basic", os.path.join(args.rom_dir, "basic"), 0xA000, 0xBFFF)
+    kernal = MMap("kernal", os.path.join(args.rom_dir, "kernal"), 0xE000, 0xFFFF)
+    roms = [basic, kernal]
+    entries = seeds(basic, kernal)
+
+    start = time.time()
+    translator = aot.Translator(roms)
+    blocks = translator.discover(entries)
+    key = aot.rom_key(roms, entries)
+    source = translator.generate(blocks, key)
+    print(f"Translated in {time.time() - start:.2f} s")
+
+    for rom in roms:
+        covered = set()
+        for insns in blocks.values():
+            for insn in insns:
+                if rom.start_addr <= insn.addr <= rom.end_addr:
+                    covered.update(range(insn.addr, insn.addr + insn.length))
+        size = rom.end_addr - rom.start_addr + 1
+        print(f"{rom.name:8} {len(covered):6} bytes of code, {100 * len(covered) / size:6.2f}%")
+    print(f"{len(blocks)} blocks, {sum(len(b) for b in blocks.values())} instructions")
+
+    fname = aot.module_path(key, args.cache_dir)
+    aot.write_module(fname, source)
+    start = time.time()
+    aot.load(roms, entries, args.cache_dir)
+    print(f"Written into {fname}, compiled in {time.time() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import typing
+
+from pyc64.hacks import ProgramInject
+from pyc64.jobs import JobRunner
+from pyc64.machine import FRAME_CYCLES
+from pyc64.softrender import SoftRenderer, png
+
+# Per worker process state.
+_runner: typing.Optional[JobRunner] = None
+_renderer: typing.Optional[SoftRenderer] = None
+_options: typing.Dict[str, typing.Any] = {}
+
+
+def _init(options: typing.Dict[str, typing.Any]):
+    """
+    Build and boot the machine once per worker. Jobs start from the snapshot taken after boot.
+    """
+    global _runner, _renderer, _options
+    _options = options
+    _runner = JobRunner(
+        options["rom_dir"],
+        options["aot"],
+        options["aot_cache"],
+        options["boot_cache"],
+        options["boot_cycles"],
+        options["idle_skip"],
+        options["idioms"],
+        options["traps"],
+    )
+    if options["screenshots"] is not None:
+        with open(os.path.join(options["rom_dir"], "chargen"), "rb") as f:
+            _renderer = SoftRenderer(f.read())
+
+
+def _run_job(program: str) -> typing.Dict[str, typing.Any]:
+    options = _options
+    result: typing.Dict[str, typing.Any] = {"program": program}
+    start = time.time()
+    try:
+        prg = ProgramInject.load(program)
+        if prg is None:
+            raise ValueError("unsupported file")
+
+        values, image = _runner.run(
+            prg, options["frames"], options["frame_cycles"], options["stop_pc"], options["stop_text"]
+        )
+        result.update(values)
+        if _renderer is not None:
+            name = os.path.splitext(os.path.basename(program))[0] + ".png"
+            fname = os.path.join(options["screenshots"], name)
+            with open(fname, "wb") as f:
+                f.write(png(_renderer.draw(image)))
+            result["screenshot"] = fname
+    except Exception as e:
+        result.update(status="error", error=f"{type(e).__name__}: {e}")
+    result["wall_time"] = round(time.time() - start, 3)
+    return result
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Run many programs headless in parallel and collect results",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("program", nargs="*", type=str, help="PRG or single-file T64 file to run.")
+    parser.add_argument("--list", type=str, help="File having one program file name per line.")
+    parser.add_argument("--out", type=str, default="results.jsonl",
+                        help="JSONL file of results, one line per program in order of completion.")
+    parser.add_argument("--frames", type=int, default=500, help="Frame budget of each program.")
+    parser.add_argument("--frame-cycles", type=int, default=FRAME_CYCLES, help="Cycles per frame.")
+    parser.add_argument("--boot-cycles", type=int, default=5_000_000,
+                        help="Maximum cycles run after reset to reach the READY prompt, if it is not cached.")
+    parser.add_argument("--boot-cache", type=str, help="Directory of cached boot snapshots. Default is in user cache.")
+    parser.add_argument("--stop-pc", type=lambda x: int(x, 16), action="append", default=[],
+                        help="Stop when CPU reaches this (hex) address. Can be given multiple times."
+                        " Turns --aot, --idle-skip and --idioms off.")
+    parser.add_argument("--stop-text", type=str, help="Stop when screen contains this text. Checked per frame.")
+    parser.add_argument("--screenshots", type=str, help="Write final screen of each program into this directory.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Count of worker processes.")
+    parser.add_argument("--aot", action="store_true", help="Run BASIC and KERNAL translated ahead of time.")
+    parser.add_argument("--aot-cache", type=str, help="Directory of translated ROMs. Default is in user cache.")
+    parser.add_argument("--idle-skip", action="store_true",
+                        help="Fast-forward loops waiting for an interrupt, e.g. for a key press.")
+    parser.add_argument("--idioms", action="store_true", help="Run recognized copy and fill loops natively.")
+    parser.add_argument("--traps", action="store_true",
+                        help="Run KERNAL routines and BASIC floating point routines natively.")
+    parser.add_argument("--rom-dir", type=str, default=".", help="Directory of ROM files.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    programs = list(args.program)
+    if args.list is not None:
+        with open(args.list, "r") as f:
+            programs += [line.strip() for line in f if line.strip()]
+    if args.screenshots is not None:
+        os.makedirs(args.screenshots, exist_ok=True)
+
+    options = dict(
+        rom_dir=args.rom_dir,
+        aot=args.aot,
+        aot_cache=args.aot_cache,
+        boot_cycles=args.boot_cycles,
+        boot_cache=args.boot_cache,
+        idle_skip=args.idle_skip,
+        idioms=args.idioms,
+        traps=args.traps,
+        frames=args.frames,
+        frame_cycles=args.frame_cycles,
+        stop_pc=args.stop_pc,
+        stop_text=args.stop_text,
+        screenshots=args.screenshots,
+    )
+
+    start = time.time()
+    count = 0
+    with open(args.out, "w") as out, multiprocessing.Pool(
+        min(args.jobs, max(len(programs), 1)), initializer=_init, initargs=(options,)
+    ) as pool:
+        for result in pool.imap_unordered(_run_job, programs):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            count += 1
+            print(f"[{count}/{len(programs)}] {result['program']}: {result['status']}"
+                  f" in {result['wall_time']:.2f} s")
+
+    print(f"Ran {count} programs in {time.time() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
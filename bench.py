@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+import typing
+
+from pyc64.machine import C64, FRAME_CYCLES
+
+
+def measure(func: typing.Callable[[], typing.Any], repeat: int) -> typing.Tuple[float, float]:
+    """
+    :return: Mean and minimum time of a call, in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return sum(times) / len(times), min(times)
+
+
+def benchmarks(machine: C64) -> typing.Dict[str, typing.Callable[[], typing.Any]]:
+    """
+    Operations a batch harness repeats for every job.
+    """
+    machine.reset()
+    machine.run(FRAME_CYCLES)
+    state = machine.snapshot()
+    return {
+        "reset": machine.reset,
+        "snapshot": machine.snapshot,
+        "restore": lambda: machine.restore(state),
+        "frame": lambda: machine.run(FRAME_CYCLES),
+    }
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Measure machine operations repeated by batch harnesses.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100, help="Calls of each operation.")
+    parser.add_argument("--reset-limit", type=float, default=1.0, metavar="MS",
+                        help="Fail if a cold reset takes longer than this on average.")
+    parser.add_argument("--rom-dir", type=str, default=".", help="Directory of ROM files.")
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    results = {}
+    # Devices print on some register writes.
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        machine = C64(args.rom_dir)
+        for name, func in benchmarks(machine).items():
+            # Frames are much slower than the others.
+            results[name] = measure(func, args.repeat if name != "frame" else max(1, args.repeat // 20))
+
+    print(f"{'operation':10} {'mean ms':>9} {'min ms':>9}")
+    for name, (mean, best) in results.items():
+        print(f"{name:10} {mean * 1e3:9.3f} {best * 1e3:9.3f}")
+    if results["reset"][0] * 1e3 > args.reset_limit:
+        print(f"Reset takes over {args.reset_limit} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+
+from py65xx.coverage import OPCODE, OPERAND, READ, WRITE, Coverage
+
+# Default regions, the C64 ROMs.
+REGIONS = ["basic:A000-BFFF", "kernal:E000-FFFF"]
+
+
+def parse_region(text: str):
+    name, _, span = text.partition(":")
+    start, _, end = span.partition("-")
+    return name, int(start, 16), int(end, 16)
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Merge and report coverage files written with --coverage",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("coverage", nargs="+", type=str, help="Coverage files. All are merged together.")
+    parser.add_argument("--out", type=str, help="Write the merged coverage into this file.")
+    parser.add_argument("--region", type=str, action="append",
+                        help="Region to report, as NAME:START-END in hex. Can be given multiple times."
+                             " Default: " + ", ".join(REGIONS))
+    parser.add_argument("--ranges", action="store_true", help="List executed address ranges of each region.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+
+    coverage = Coverage.load(args.coverage[0])
+    for fname in args.coverage[1:]:
+        coverage.merge(Coverage.load(fname))
+    if args.out is not None:
+        coverage.save(args.out)
+
+    print(f"{'region':10} {'range':11} {'executed':>14} {'read':>6} {'written':>7}")
+    for name, start, end in map(parse_region, args.region or REGIONS):
+        size = end - start + 1
+        executed = coverage.count(start, end, OPCODE | OPERAND)
+        read = coverage.count(start, end, READ)
+        written = coverage.count(start, end, WRITE)
+        print(f"{name:10} {start:04X}-{end:04X} {executed:6} {100 * executed / size:6.2f}%"
+              f" {read:6} {written:7}")
+        if args.ranges:
+            for a, b in coverage.ranges(start, end):
+                print(f"    ${a:04X}-${b:04X} ({b - a + 1} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+import typing
+
+from py65xx.cpu65xx import BreakOp
+from pyc64 import basicfloat
+from pyc64.jobs import JobRunner
+from pyc64.machine import C64
+from pyc64.support.prg import tokenize
+
+ROUTINES = {
+    "FADDT": basicfloat.FADDT,
+    "FMULTT": basicfloat.FMULTT,
+    "FDIVT": basicfloat.FDIVT,
+}
+# Routines are called from here, in RAM.
+RETURN = 0x0F00
+
+# Number crunching with all arithmetic operations, and functions evaluating polynomials.
+BENCHMARK = """
+10 T=0:FOR I=1 TO 200
+20 X=SIN(I/10)*COS(I/7)+SQR(I)*LOG(I)/EXP(I/100)
+30 T=T+X*X/(I+1)-ATN(X)
+40 NEXT
+50 PRINT "RESULT";T
+"""
+
+
+def _stop(cpu):
+    raise StopIteration
+
+
+def _mantissa(r: random.Random) -> typing.List[int]:
+    k = r.random()
+    if k < 0.7:
+        return [r.getrandbits(8) | 0x80] + [r.getrandbits(8) for _ in range(3)]
+    if k < 0.85:
+        # Mantissas carrying or borrowing through all bytes.
+        return [0x80 | r.getrandbits(1) << 6] + [r.choice([0, 0xFF, r.getrandbits(8)]) for _ in range(3)]
+    # Not normalized.
+    return [r.getrandbits(8) for _ in range(4)]
+
+
+def _exponents(r: random.Random) -> typing.Tuple[int, int]:
+    fac = r.choice([r.getrandbits(8), r.randrange(0x70, 0x90), 0, 0xFF, r.randrange(0xF0, 0x100), r.randrange(1, 0x10)])
+    k = r.random()
+    if k < 0.1:
+        arg = 0
+    elif k < 0.2:
+        arg = r.getrandbits(8)
+    elif k < 0.3:
+        arg = fac
+    else:
+        # Near each other, so that the operands are shifted by a few bits.
+        arg = max(0, min(0xFF, fac + r.randrange(-40, 41)))
+    return fac, arg
+
+
+def random_case(r: random.Random) -> typing.Tuple[bytes, int, typing.Tuple[int, int, int, int]]:
+    """
+    :return: Zero page and stack from $0002 on, stack pointer, and A, X, Y, P,
+        as BASIC calls the routines: A is the exponent of FAC, and Z is set by it.
+    """
+    low = bytearray(r.getrandbits(8) for _ in range(0x1FE))
+    fac, arg = _exponents(r)
+    fac_sign, arg_sign = r.choice([0, 0xFF, r.getrandbits(8)]), r.choice([0, 0xFF, r.getrandbits(8)])
+    fac_mantissa = _mantissa(r)
+    arg_mantissa = list(fac_mantissa) if r.random() < 0.1 else _mantissa(r)
+
+    def put(addr: int, values: typing.List[int]):
+        low[addr - 2 : addr - 2 + len(values)] = bytes(values)
+
+    put(basicfloat.FAC, [fac] + fac_mantissa + [fac_sign])
+    put(basicfloat.ARG, [arg] + arg_mantissa + [arg_sign])
+    put(basicfloat.ARISGN, [fac_sign ^ arg_sign if r.random() < 0.9 else r.getrandbits(8)])
+    if r.random() < 0.7:
+        put(basicfloat.BITS, [0])
+
+    sp = r.randrange(0x10, 0x100)
+    ret = RETURN - 1
+    put(0x100 + sp, [ret >> 8])
+    put(0x100 + sp - 1, [ret & 0xFF])
+    a = fac if r.random() < 0.8 else r.getrandbits(8)
+    # Decimal mode clear, as BASIC keeps it.
+    p = r.getrandbits(8) & ~0x0A | 0x20 | (0x02 if a == 0 else 0)
+    return bytes(low), sp - 2, (a, r.getrandbits(8), r.getrandbits(8), p)
+
+
+def _call(machine: C64, routine: int, case) -> float:
+    low, sp, (a, x, y, p) = case
+    cpu = machine.cpu
+    machine.ram.write_block(0x0002, low)
+    machine.bus.write(0x0001, 0x37)
+    cpu.sp = sp
+    cpu.A, cpu.X, cpu.Y = a, x, y
+    cpu.p.val = p
+    cpu.pc = routine
+    # CPU prints when stopped by a break point.
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        start = time.perf_counter()
+        while machine.run(100_000) == 0:
+            pass
+        return time.perf_counter() - start
+
+
+def _state(machine: C64) -> tuple:
+    cpu = machine.cpu
+    return bytes(machine.ram.mem), cpu.A, cpu.X, cpu.Y, cpu.p.val, cpu.sp, cpu.pc
+
+
+def check(rom_dir: str, cases: int, seed: int) -> bool:
+    """
+    Run the routines in ROM and natively with the same random operands, and compare memory, registers
+    and cycles taken.
+
+    :return: True if all results were the same.
+    """
+    machines = []
+    for traps in (False, True):
+        machine = C64(rom_dir)
+        machine.reset()
+        if traps:
+            machine.enable_traps()
+        for addr in (RETURN, basicfloat.OVERFLOW, basicfloat.DIVISION_BY_ZERO):
+            machine.cpu.breaks[addr] = BreakOp(action=_stop)
+        machines.append(machine)
+    rom, native = machines
+    missing = [name for name in ROUTINES if name not in native.traps.installed]
+    if missing:
+        print("BASIC ROM does not have the code of", ", ".join(missing))
+        return False
+
+    ok = True
+    r = random.Random(seed)
+    print(f"{'routine':8} {'cases':>6} {'errors':>6} {'cycles':>7} {'ROM us':>8} {'native us':>9} {'speedup':>7}")
+    for name, routine in ROUTINES.items():
+        errors = 0
+        cycles = 0
+        times = [0.0, 0.0]
+        for i in range(cases):
+            case = random_case(r)
+            start = rom.clock.cycles
+            times[0] += _call(rom, routine, case)
+            rom_cycles = rom.clock.cycles - start
+            cycles += rom_cycles
+            start = native.clock.cycles
+            times[1] += _call(native, routine, case)
+            expected = _state(rom) + (rom_cycles,)
+            got = _state(native) + (native.clock.cycles - start,)
+            if expected != got:
+                errors += 1
+                if errors <= 5:
+                    diff = [f"${i:04X}" for i in range(0x10000) if expected[0][i] != got[0][i]]
+                    print(f"{name} case {i}: registers and cycles {expected[1:]} != {got[1:]}, memory differs at", *diff[:8])
+                # Continue from the same state.
+                native.ram.write_block(0, expected[0])
+        ok = ok and errors == 0
+        print(
+            f"{name:8} {cases:6} {errors:6} {cycles // cases:7}"
+            f" {times[0] / cases * 1e6:8.0f} {times[1] / cases * 1e6:9.0f} {times[0] / times[1]:6.1f}x"
+        )
+    return ok
+
+
+def benchmark(rom_dir: str, frames: int):
+    """
+    Run the BASIC benchmark program with and without the traps.
+    """
+    prg = tokenize(BENCHMARK, "BENCHMARK")
+    results = []
+    for traps in (False, True):
+        runner = JobRunner(rom_dir, traps=traps)
+        start = time.perf_counter()
+        result, _ = runner.run(prg, frames, stop_text="RESULT")
+        elapsed = time.perf_counter() - start
+        line = next((line.strip() for line in result["screen"] if "RESULT" in line), None)
+        print(f"{'native' if traps else 'ROM':6} {elapsed:7.2f} s {result['cycles']:11} cycles  {line}")
+        results.append((elapsed, line))
+    print(f"Speedup {results[0][0] / results[1][0]:.1f}x, results {'same' if results[0][1] == results[1][1] else 'DIFFER'}")
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Check native BASIC floating point routines against the ROM.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--cases", type=int, default=1000, help="Random cases per routine.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random cases.")
+    parser.add_argument("--bench", action="store_true",
+                        help="Also run a BASIC number crunching program with and without the native routines.")
+    parser.add_argument("--frames", type=int, default=5000, help="Frame budget of the benchmark program.")
+    parser.add_argument("--rom-dir", type=str, default=".", help="Directory of ROM files.")
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    ok = check(args.rom_dir, args.cases, args.seed)
+    if args.bench:
+        benchmark(args.rom_dir, args.frames)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+import typing
+
+from py65xx import fuzz
+from py65xx.fuzz import Case
+
+# Per worker process state.
+_options: typing.Dict[str, typing.Any] = {}
+
+
+def _init(options: typing.Dict[str, typing.Any]):
+    global _options
+    _options = options
+    # Interpreter prints about BRK, jams and faults.
+    sys.stdout = open(os.devnull, "w")
+
+
+def _fails(case: Case) -> bool:
+    return bool(fuzz.check(_options["engine"], [case], _options["cycles"])[0][1])
+
+
+def _run_batch(cases: typing.List[Case]):
+    """
+    :return: Per case: coverage features, and the minimized case and differences if it failed.
+    """
+    out = []
+    for case, (features, diff) in zip(cases, fuzz.check(_options["engine"], cases, _options["cycles"])):
+        failure = None
+        if diff:
+            small = fuzz.minimize(case, _fails)
+            failure = small, fuzz.check(_options["engine"], [small], _options["cycles"])[0][1]
+        out.append((features, failure))
+    return out
+
+
+def save_failure(out_dir: str, case: Case, diff: typing.List[str], engine: str, cycles: int) -> typing.Optional[str]:
+    """
+    :return: File name, or None if the case was already saved.
+    """
+    data = case.to_dict()
+    key = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
+    fname = os.path.join(out_dir, f"case_{key}.json")
+    if os.path.exists(fname):
+        return None
+    with open(fname, "w") as f:
+        json.dump(dict(case=data, engine=engine, cycles=cycles, diff=diff, code=fuzz.disassemble(case)), f, indent=2)
+    return fname
+
+
+def replay(fname: str):
+    with open(fname, "r") as f:
+        saved = json.load(f)
+    case = Case.from_dict(saved["case"])
+    print("\n".join(fuzz.disassemble(case)))
+    print(f"a=${case.a:02X} x=${case.x:02X} y=${case.y:02X} sp=${case.sp:02X} p=${case.p:02X}")
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    diff = fuzz.check(saved["engine"], [case], saved["cycles"])[0][1]
+    sys.stdout = stdout
+    print("\n".join(diff) if diff else "No differences.")
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Fuzz CPU engines against the reference interpreter",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--engine", choices=sorted(fuzz.ENGINES), default="flat", help="Engine under test.")
+    parser.add_argument("--cycles", type=int, default=1000, help="Cycle budget of each case.")
+    parser.add_argument("--time", type=float, default=60, help="Seconds to run, 0 for until interrupted.")
+    parser.add_argument("--batch", type=int, default=64, help="Cases per batch sent to a worker.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Count of worker processes.")
+    parser.add_argument("--seed", type=int, help="Random seed. Default is random.")
+    parser.add_argument("--report", type=float, default=5, help="Seconds between progress reports.")
+    parser.add_argument("--out", type=str, default="fuzz_failures", help="Directory of minimized failing cases.")
+    parser.add_argument("--replay", type=str, help="Run a saved failing case and print differences.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    if args.replay is not None:
+        replay(args.replay)
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    rng = random.Random(args.seed)
+    corpus: typing.List[Case] = []
+    features: typing.Set[int] = set()
+    failures = 0
+    cases = 0
+
+    def batch() -> typing.List[Case]:
+        # Half new random cases, half mutations of cases having found new features.
+        return [
+            fuzz.mutate(rng.choice(corpus), rng) if corpus and rng.random() < 0.5 else fuzz.random_case(rng)
+            for _ in range(args.batch)
+        ]
+
+    options = dict(engine=args.engine, cycles=args.cycles)
+    results: "queue.Queue" = queue.Queue()
+    start = last_report = time.time()
+    with multiprocessing.Pool(args.jobs, initializer=_init, initargs=(options,)) as pool:
+        pending = 0
+        try:
+            while args.time <= 0 or time.time() - start < args.time:
+                # Keep all workers busy, but generate from the corpus as late as possible.
+                while pending < 2 * args.jobs:
+                    sent = batch()
+                    pool.apply_async(
+                        _run_batch, (sent,), callback=lambda r, s=sent: results.put((s, r)), error_callback=results.put
+                    )
+                    pending += 1
+
+                done = results.get()
+                pending -= 1
+                if isinstance(done, BaseException):
+                    raise done
+                for case, (found, failure) in zip(*done):
+                    cases += 1
+                    if not found <= features:
+                        features |= found
+                        corpus.append(case)
+                    if failure is not None:
+                        fname = save_failure(args.out, *failure, args.engine, args.cycles)
+                        if fname is not None:
+                            failures += 1
+                            print(f"Failure: {fname}: {'; '.join(failure[1])}")
+
+                now = time.time()
+                if now - last_report >= args.report:
+                    last_report = now
+                    print(
+                        f"{now - start:.0f} s: {cases} cases, {cases / (now - start):.0f} cases/s,"
+                        f" {len(features)} features, corpus {len(corpus)}, {failures} failures"
+                    )
+        except KeyboardInterrupt:
+            pass
+
+    elapsed = time.time() - start
+    print(
+        f"Ran {cases} cases in {elapsed:.1f} s ({cases / elapsed:.0f} cases/s on {args.jobs} workers),"
+        f" {len(features)} features, corpus {len(corpus)}, {failures} failures"
+    )
+
+
+if __name__ == '__main__':
+    main()
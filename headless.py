@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import time
+
+from py65xx.callgraph import CallProfiler
+from py65xx.coverage import Coverage
+from py65xx.profiler import Profiler, Symbols
+from py65xx.trace import Tracer
+from pyc64 import bootcache
+from pyc64.framelog import FrameRecorder
+from pyc64.hacks import ProgramInject
+from pyc64.inputlog import InputReplayer
+from pyc64.machine import C64, FRAME_CYCLES
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Run the emulator without display",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("program", nargs="*", type=str,
+                        help="Program file to add in list of quick-load programs.")
+    parser.add_argument("--frames", type=int, default=500, help="Count of frames to run.")
+    parser.add_argument("--frame-cycles", type=int, default=FRAME_CYCLES, help="Cycles per frame.")
+    parser.add_argument("--inject-at", type=int, action="append", default=[],
+                        help="Load and run next program at this frame. Can be given multiple times.")
+    parser.add_argument("--record", type=str, help="Record frames into this file. See render_log.py.")
+    parser.add_argument("--snapshot", type=str, help="Start from this snapshot instead of reset.")
+    parser.add_argument("--replay", type=str,
+                        help="Replay input recorded with main_sdl.py --record-input, starting from its recorded state.")
+    parser.add_argument("--save-snapshot", type=str, help="Save snapshot into this file when done.")
+    parser.add_argument("--profile", action="store_true", help="Count cycles per address and print hot spots.")
+    parser.add_argument("--call-graph", type=str,
+                        help="Track JSR/RTS and interrupts, print routines by inclusive cycles"
+                             " and write folded stacks (for flame graph tools) into this file.")
+    parser.add_argument("--coverage", type=str,
+                        help="Record executed addresses into this file. See coverage_report.py.")
+    parser.add_argument("--coverage-data", action="store_true",
+                        help="With --coverage, record also data reads and writes. Slower.")
+    parser.add_argument("--trace", type=str, help="Write binary execution trace into this file. See trace_dump.py.")
+    parser.add_argument("--trace-bus", action="store_true", help="With --trace, trace also bus reads and writes.")
+    parser.add_argument("--symbols", type=str, action="append", default=[],
+                        help="VICE label file or AS65 listing for --profile. Can be given multiple times.")
+    parser.add_argument("--fast-boot", action="store_true",
+                        help="Start from the READY prompt, restoring a cached snapshot if there is one for the ROMs.")
+    parser.add_argument("--aot", action="store_true",
+                        help="Run BASIC and KERNAL translated ahead of time. Not used with the options above"
+                             " which need to see every instruction. See aot_build.py.")
+    parser.add_argument("--aot-cache", type=str, help="Directory of translated ROMs. Default is in user cache.")
+    parser.add_argument("--idle-skip", action="store_true",
+                        help="Fast-forward loops waiting for an interrupt, e.g. for a key press."
+                             " Not used with the options above which need to see every instruction.")
+    parser.add_argument("--idioms", action="store_true",
+                        help="Run recognized copy and fill loops natively, and report how often each ran."
+                             " Not used with the options above which need to see every instruction.")
+    parser.add_argument("--traps", action="store_true",
+                        help="Run KERNAL routines and BASIC floating point routines natively where the ROM"
+                             " has the expected code, and report how often each ran."
+                             " See pyc64/traps.py and pyc64/basicfloat.py.")
+    parser.add_argument("--trap-cost", type=str, action="append", default=[], metavar="NAME=CYCLES",
+                        help="Cycles charged for a trap, instead of the default or the cycles it counts."
+                             " Can be given multiple times.")
+    parser.add_argument("--rom-dir", type=str, default=".", help="Directory of ROM files.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+
+    machine = C64(args.rom_dir)
+    if args.aot:
+        machine.enable_aot(args.aot_cache)
+    if args.idle_skip:
+        machine.enable_idle_skip()
+    if args.idioms:
+        machine.enable_idioms()
+    if args.traps:
+        costs = {}
+        for cost in args.trap_cost:
+            name, cycles = cost.split("=")
+            costs[name] = int(cycles)
+        machine.enable_traps(costs)
+    if args.fast_boot:
+        bootcache.boot(machine)
+    else:
+        machine.reset()
+    if args.snapshot is not None:
+        machine.load_snapshot(args.snapshot)
+
+    replayer = None
+    if args.replay is not None:
+        replayer = InputReplayer(machine, args.replay)
+    run = replayer.run if replayer is not None else machine.run
+
+    inject = ProgramInject(args.program, machine.bus, machine.ram)
+    recorder = None
+    if args.record is not None:
+        recorder = FrameRecorder(machine, args.record, args.frame_cycles)
+
+    profiler = None
+    if args.profile:
+        profiler = machine.cpu.profiler = Profiler()
+    coverage = None
+    if args.coverage is not None:
+        coverage = machine.cpu.coverage = Coverage()
+        if args.coverage_data:
+            coverage.attach(machine.bus)
+    tracer = None
+    if args.trace is not None:
+        tracer = machine.cpu.tracer = Tracer(args.trace, machine.clock)
+        if args.trace_bus:
+            tracer.attach(machine.bus)
+    call_profiler = None
+    if args.call_graph is not None:
+        call_profiler = machine.cpu.call_profiler = CallProfiler(machine.clock)
+
+    start = time.time()
+    for frame in range(args.frames):
+        if frame in args.inject_at:
+            prg = inject.next_program()
+            if prg is not None:
+                machine.inject_program(prg)
+        if run(args.frame_cycles) != 0:
+            break
+        if recorder is not None:
+            recorder.record()
+
+    if recorder is not None:
+        recorder.close()
+    if args.save_snapshot is not None:
+        machine.save_snapshot(args.save_snapshot)
+    print("took", time.time() - start, "s")
+    machine.clock.stats()
+    if machine.cpu.idle is not None:
+        print(f"Skipped {machine.cpu.idle.skipped} idle cycles in {machine.cpu.idle.skips} skips")
+    if machine.cpu.idioms is not None:
+        machine.cpu.idioms.report()
+    if machine.traps is not None:
+        machine.traps.report()
+
+    if coverage is not None:
+        coverage.save(args.coverage)
+    if tracer is not None:
+        tracer.close()
+        print("Traced", tracer.records, "records")
+    symbols = Symbols()
+    for fname in args.symbols:
+        symbols.load(fname)
+    if profiler is not None:
+        profiler.report(machine.cpu, symbols)
+    if call_profiler is not None:
+        call_profiler.report(symbols)
+        call_profiler.write_folded(args.call_graph, symbols)
+
+
+if __name__ == '__main__':
+    main()
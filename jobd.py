@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+"""
+Local job service with a pool of pre-booted machines.
+
+Protocol: one JSON object per line over a Unix stream socket, answered by one JSON line.
+
+- Job: {"program": base64 of PRG file, "name": ..., "frames": ..., "frame_cycles": ...,
+  "stop_pc": [int, ...], "stop_text": ...}. Only "program" is required.
+  Answer is the result of pyc64.jobs.JobRunner.run with "name", "latency" (seconds from
+  receiving to answering), "queued" (seconds before a worker took the job) and "run_time" added,
+  or {"status": "error", "error": ...}.
+- {"cmd": "metrics"}: answer is the current metrics, see Metrics.get.
+
+A connection can send any number of requests without waiting for the answers. Jobs run
+concurrently, and the answers are written in request order.
+"""
+
+import argparse
+import base64
+import collections
+import functools
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import signal
+import socketserver
+import sys
+import threading
+import time
+import typing
+
+from pyc64.jobs import JobRunner
+from pyc64.machine import FRAME_CYCLES
+from pyc64.support.prg import parse_prg
+
+# Per worker process state.
+_runner: typing.Optional[JobRunner] = None
+
+
+def _init(options: typing.Dict[str, typing.Any]):
+    global _runner
+    _runner = JobRunner(**options)
+
+
+def _run_job(job: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    start = time.time()
+    try:
+        prg = parse_prg(base64.b64decode(job["program"]), job.get("name", ""))
+        result, _ = _runner.run(
+            prg,
+            job.get("frames", 500),
+            job.get("frame_cycles", FRAME_CYCLES),
+            job.get("stop_pc", ()),
+            job.get("stop_text"),
+        )
+    except Exception as e:
+        result = dict(status="error", error=f"{type(e).__name__}: {e}")
+    result["started"] = start
+    result["run_time"] = round(time.time() - start, 3)
+    return result
+
+
+class Metrics:
+    """
+    Counters and latencies of the service. Latency percentiles and recent throughput
+    are calculated from the last `window` jobs.
+    """
+
+    def __init__(self, workers: int, window: int = 1000):
+        self._lock = threading.Lock()
+        self._workers = workers
+        self._start = time.time()
+        self._submitted = 0
+        self._completed = 0
+        self._errors = 0
+        # (completion time, latency, queued time)
+        self._recent: typing.Deque[typing.Tuple[float, float, float]] = collections.deque(maxlen=window)
+
+    def submit(self):
+        with self._lock:
+            self._submitted += 1
+
+    def complete(self, latency: float, queued: float, error: bool):
+        with self._lock:
+            self._completed += 1
+            self._errors += error
+            self._recent.append((time.time(), latency, queued))
+
+    def get(self) -> typing.Dict[str, typing.Any]:
+        """
+        :return: Dict of
+            uptime, workers, submitted, completed, errors,
+            in_flight (submitted but not completed), queue_depth (in flight jobs waiting for a worker),
+            throughput (completed jobs per second over uptime), throughput_60s (over last minute),
+            latency_p50, latency_p90, latency_p99, latency_max and queued_mean in seconds.
+        """
+        with self._lock:
+            now = time.time()
+            uptime = now - self._start
+            in_flight = self._submitted - self._completed
+            latencies = sorted(r[1] for r in self._recent)
+            out = dict(
+                uptime=round(uptime, 3),
+                workers=self._workers,
+                submitted=self._submitted,
+                completed=self._completed,
+                errors=self._errors,
+                in_flight=in_flight,
+                queue_depth=max(0, in_flight - self._workers),
+                throughput=round(self._completed / uptime, 3) if uptime > 0 else 0.0,
+                throughput_60s=round(sum(1 for r in self._recent if now - r[0] <= 60) / min(60.0, uptime), 3)
+                if uptime > 0
+                else 0.0,
+            )
+            if latencies:
+                for p in (50, 90, 99):
+                    out[f"latency_p{p}"] = round(latencies[min(len(latencies) - 1, len(latencies) * p // 100)], 4)
+                out["latency_max"] = round(latencies[-1], 4)
+                out["queued_mean"] = round(sum(r[2] for r in self._recent) / len(self._recent), 4)
+            return out
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "JobServer"
+
+    def handle(self):
+        # Jobs are given to the pool as soon as they are read, and a writer thread waits for the answers in order.
+        answers: "queue.Queue[typing.Optional[typing.Callable[[], typing.Dict[str, typing.Any]]]]" = queue.Queue()
+        writer = threading.Thread(target=self._write, args=(answers,))
+        writer.start()
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                answers.put(self._submit(line))
+        finally:
+            answers.put(None)
+            writer.join()
+
+    def _submit(self, line: bytes) -> typing.Callable[[], typing.Dict[str, typing.Any]]:
+        received = time.time()
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return functools.partial(dict, status="error", error=f"Invalid request: {e}")
+
+        if request.get("cmd") == "metrics":
+            return functools.partial(dict, self.server.metrics.get())
+        if "program" not in request:
+            return functools.partial(dict, status="error", error="Missing program")
+
+        self.server.metrics.submit()
+        pending = self.server.pool.apply_async(self.server.run_job, (request,))
+        return functools.partial(self._result, request, received, pending)
+
+    def _result(
+        self, request: typing.Dict[str, typing.Any], received: float, pending: "multiprocessing.pool.AsyncResult"
+    ) -> typing.Dict[str, typing.Any]:
+        result = pending.get()
+        result["name"] = request.get("name", "")
+        result["queued"] = round(max(0.0, result.pop("started") - received), 4)
+        result["latency"] = round(time.time() - received, 4)
+        self.server.metrics.complete(result["latency"], result["queued"], result["status"] == "error")
+        return result
+
+    def _write(self, answers: "queue.Queue[typing.Optional[typing.Callable[[], typing.Dict[str, typing.Any]]]]"):
+        while True:
+            answer = answers.get()
+            if answer is None:
+                break
+            data = answer()
+            try:
+                self.wfile.write(json.dumps(data).encode() + b"\n")
+                self.wfile.flush()
+            except OSError:
+                # Client went away. Remaining jobs still finish, for the metrics.
+                pass
+
+
+class JobServer(socketserver.ThreadingUnixStreamServer):
+    """
+    :param run_job: Function run in the pool for each job, returning the result with "started" time.
+
+    Jobs sent on one connection run concurrently, so all of them get to a barrier before any goes on:
+
+    >>> import multiprocessing.pool, tempfile
+    >>> barrier = threading.Barrier(4)
+    >>> def meet(job):
+    ...     started = time.time()
+    ...     try:
+    ...         barrier.wait(timeout=10)
+    ...         status = "ok"
+    ...     except threading.BrokenBarrierError:
+    ...         status = "alone"
+    ...     return dict(status=status, started=started)
+    >>> path = os.path.join(tempfile.mkdtemp(), "jobd.sock")
+    >>> with multiprocessing.pool.ThreadPool(4) as pool, JobServer(path, pool, 4, meet) as server:
+    ...     threading.Thread(target=server.serve_forever, daemon=True).start()
+    ...     answers = list(request_all(path, [dict(program="", name=str(i)) for i in range(4)]))
+    ...     server.shutdown()
+    >>> [(answer["name"], answer["status"]) for answer in answers]
+    [('0', 'ok'), ('1', 'ok'), ('2', 'ok'), ('3', 'ok')]
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str,
+        pool: "multiprocessing.pool.Pool",
+        workers: int,
+        run_job: typing.Callable[[typing.Dict[str, typing.Any]], typing.Dict[str, typing.Any]] = _run_job,
+    ):
+        self.pool = pool
+        self.run_job = run_job
+        self.metrics = Metrics(workers)
+        super().__init__(path, _Handler)
+
+
+def request_all(
+    path: str, data: typing.Iterable[typing.Dict[str, typing.Any]]
+) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    """
+    Send requests to the service on one connection, and yield the answers in order.
+    All requests are sent before reading the answers, so the service runs the jobs concurrently.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        with s.makefile("rwb") as f:
+            count = 0
+            for item in data:
+                f.write(json.dumps(item).encode() + b"\n")
+                count += 1
+            f.flush()
+            for _ in range(count):
+                yield json.loads(f.readline())
+
+
+def request(path: str, data: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    """
+    Send one request to the service and wait for the answer.
+    """
+    (answer,) = request_all(path, [data])
+    return answer
+
+
+def serve(args):
+    options = dict(
+        rom_dir=args.rom_dir,
+        aot=args.aot,
+        aot_cache=args.aot_cache,
+        boot_cache=args.boot_cache,
+        boot_cycles=args.boot_cycles,
+        idle_skip=args.idle_skip,
+        idioms=args.idioms,
+        traps=args.traps,
+    )
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    # Workers start and boot right away, not on first job.
+    with multiprocessing.Pool(args.jobs, initializer=_init, initargs=(options,)) as pool, JobServer(
+        args.socket, pool, args.jobs
+    ) as server:
+        print(f"Serving {args.jobs} workers at {args.socket}")
+        # Stop cleanly also when run as a service. Workers keep the default handler.
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(args.socket)
+
+
+def submit(args):
+    jobs = []
+    for program in args.program:
+        with open(program, "rb") as f:
+            jobs.append(
+                dict(
+                    program=base64.b64encode(f.read()).decode(),
+                    name=program,
+                    frames=args.frames,
+                    stop_pc=args.stop_pc,
+                    stop_text=args.stop_text,
+                )
+            )
+    for answer in request_all(args.socket, jobs):
+        print(json.dumps(answer), flush=True)
+
+
+def metrics(args):
+    print(json.dumps(request(args.socket, {"cmd": "metrics"}), indent=2))
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Run programs on a pool of pre-booted machines over a Unix socket",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--socket", type=str, default="jobd.sock", help="Unix socket path.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("serve", help="Run the service.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.set_defaults(func=serve)
+    p.add_argument("--jobs", type=int, default=os.cpu_count(), help="Count of worker processes.")
+    p.add_argument("--boot-cycles", type=int, default=5_000_000,
+                   help="Maximum cycles run after reset to reach the READY prompt, if it is not cached.")
+    p.add_argument("--boot-cache", type=str, help="Directory of cached boot snapshots. Default is in user cache.")
+    p.add_argument("--aot", action="store_true", help="Run BASIC and KERNAL translated ahead of time.")
+    p.add_argument("--aot-cache", type=str, help="Directory of translated ROMs. Default is in user cache.")
+    p.add_argument("--idle-skip", action="store_true",
+                   help="Fast-forward loops waiting for an interrupt, e.g. for a key press.")
+    p.add_argument("--idioms", action="store_true", help="Run recognized copy and fill loops natively.")
+    p.add_argument("--traps", action="store_true",
+                   help="Run KERNAL routines and BASIC floating point routines natively.")
+    p.add_argument("--rom-dir", type=str, default=".", help="Directory of ROM files.")
+
+    p = commands.add_parser("submit", help="Run programs and print results as JSON lines.",
+                            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.set_defaults(func=submit)
+    p.add_argument("program", nargs="+", type=str, help="PRG file to run.")
+    p.add_argument("--frames", type=int, default=500, help="Frame budget of each program.")
+    p.add_argument("--stop-pc", type=lambda x: int(x, 16), action="append", default=[],
+                   help="Stop when CPU reaches this (hex) address. Can be given multiple times."
+                   " Turns translated code, idle skip and idioms of the server off for the job.")
+    p.add_argument("--stop-text", type=str, help="Stop when screen contains this text. Checked per frame.")
+
+    p = commands.add_parser("metrics", help="Print metrics of the service.")
+    p.set_defaults(func=metrics)
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
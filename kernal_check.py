@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+import typing
+
+from py65xx.cpu65xx import BreakOp
+from pyc64 import traps
+from pyc64.machine import C64
+
+ROUTINES = {
+    "RAMTAS": traps.RAMTAS,
+    "LP2": traps.LP2,
+}
+# Routines are called from here, in RAM.
+RETURN = 0x0F00
+
+
+def _stop(cpu):
+    raise StopIteration
+
+
+def random_case(r: random.Random, name: str) -> typing.Tuple[bytes, int, int, typing.Tuple[int, int, int, int]]:
+    """
+    :return: RAM contents, processor port, stack pointer, and A, X, Y, P.
+    """
+    ram = bytearray(r.getrandbits(8) for _ in range(0x10000))
+    if name == "LP2":
+        ram[traps.KEY_COUNT] = r.choice([0, 1, 1, 2, 3, 10, r.getrandbits(8)])
+    sp = r.randrange(0x10, 0x100)
+    ret = RETURN - 1
+    ram[0x100 + sp] = ret >> 8
+    ram[0x100 + sp - 1] = ret & 0xFF
+    # BASIC ROM in or out, so that RAMTAS ends on BASIC ROM or I/O.
+    port = r.choice([0x37, 0x36])
+    # Mostly with interrupts disabled, as the KERNAL calls the routines. Decimal mode clear.
+    p = r.getrandbits(8) & ~0x08 | 0x20
+    p = p | 0x04 if r.random() < 0.9 else p & ~0x04
+    return bytes(ram), port, sp - 2, (r.getrandbits(8), r.getrandbits(8), r.getrandbits(8), p)
+
+
+def _call(machine: C64, routine: int, case) -> float:
+    ram, port, sp, (a, x, y, p) = case
+    cpu = machine.cpu
+    machine.ram.write_block(0, ram)
+    machine.bus.write(0x0001, port)
+    cpu.sp = sp
+    cpu.A, cpu.X, cpu.Y = a, x, y
+    cpu.p.val = p
+    cpu.pc = routine
+    # CPU prints when stopped by a break point.
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        start = time.perf_counter()
+        while machine.run(100_000) == 0:
+            pass
+        return time.perf_counter() - start
+
+
+def _state(machine: C64) -> tuple:
+    cpu = machine.cpu
+    return bytes(machine.ram.mem), cpu.A, cpu.X, cpu.Y, cpu.p.val, cpu.sp, cpu.pc, machine.bus.get_state()
+
+
+def check(rom_dir: str, cases: int, seed: int) -> bool:
+    """
+    Run the routines in ROM and natively with the same random RAM and registers, and compare memory,
+    registers and cycles taken.
+
+    :return: True if all results were the same.
+    """
+    machines = []
+    for enabled in (False, True):
+        machine = C64(rom_dir)
+        machine.reset()
+        if enabled:
+            machine.enable_traps()
+        machine.cpu.breaks[RETURN] = BreakOp(action=_stop)
+        machines.append(machine)
+    rom, native = machines
+    missing = [name for name in ROUTINES if name not in native.traps.installed]
+    if missing:
+        print("KERNAL ROM does not have the code of", ", ".join(missing))
+        return False
+
+    ok = True
+    r = random.Random(seed)
+    print(f"{'routine':8} {'cases':>6} {'errors':>6} {'cycles':>8} {'ROM us':>9} {'native us':>9} {'speedup':>7}")
+    for name, routine in ROUTINES.items():
+        errors = 0
+        cycles = 0
+        times = [0.0, 0.0]
+        for i in range(cases):
+            case = random_case(r, name)
+            start = rom.clock.cycles
+            times[0] += _call(rom, routine, case)
+            rom_cycles = rom.clock.cycles - start
+            cycles += rom_cycles
+            start = native.clock.cycles
+            times[1] += _call(native, routine, case)
+            expected = _state(rom) + (rom_cycles,)
+            got = _state(native) + (native.clock.cycles - start,)
+            if expected != got:
+                errors += 1
+                if errors <= 5:
+                    diff = [f"${i:04X}" for i in range(0x10000) if expected[0][i] != got[0][i]]
+                    print(f"{name} case {i}: registers and cycles {expected[1:]} != {got[1:]}, memory differs at", *diff[:8])
+        ok = ok and errors == 0
+        print(
+            f"{name:8} {cases:6} {errors:6} {cycles // cases:8}"
+            f" {times[0] / cases * 1e6:9.0f} {times[1] / cases * 1e6:9.0f} {times[0] / times[1]:6.1f}x"
+        )
+    print("Declined:", ", ".join(f"{name} {native.traps.fallbacks[name]}" for name in ROUTINES))
+    return ok
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Check native KERNAL routines against the ROM.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--cases", type=int, default=10,
+                        help="Random cases per routine. RAMTAS takes about 1.4 million cycles in ROM.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random cases.")
+    parser.add_argument("--rom-dir", type=str, default=".", help="Directory of ROM files.")
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    ok = check(args.rom_dir, args.cases, args.seed)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
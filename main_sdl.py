@@ -8,15 +8,13 @@ import time
 import sdl2
 
 import pyc64.keyboard_sdl2 as key_map
-from py65xx.bus import RAM, Bus, MMap
-from py65xx.clock import Clock
-from py65xx.cpu65xx import CPU
-from pyc64.cia import CIA, CIA1AB, CIA2A
+from py65xx.rewind import Rewind
+from pyc64 import bootcache
+from pyc64.framelog import FrameRecorder
 from pyc64.graphics import Renderer, TextRenderer
 from pyc64.hacks import ProgramInject
-from pyc64.keyboard import Keyboard
-from pyc64.pla import PLA, Multiplex
-from pyc64.vic2 import VIC2, ColorRAM
+from pyc64.inputlog import InputRecorder
+from pyc64.machine import C64, FRAME_CYCLES
 
 
 def init(w: int, h: int, title: bytes = b"SDL"):
@@ -47,6 +45,26 @@ def arg_parser():
                              " Next program from the list is run by pressing F9."
                              " Note that emulation must be in the basic prompt before pressing F9!")
     parser.add_argument("--zoom", type=int, default=2, help="Zoom factor.")
+    parser.add_argument("--record", type=str, help="Record frames into this file. See render_log.py.")
+    parser.add_argument("--snapshot", type=str, help="Start from this snapshot instead of reset.")
+    parser.add_argument("--rewind", type=int, default=0, metavar="N",
+                        help="Keep last N frames for rewinding with END key, e.g. 250. 0 disables rewinding.")
+    parser.add_argument("--record-input", type=str,
+                        help="Record input into this file, for replaying with headless.py --replay."
+                             " Disables rewinding.")
+    parser.add_argument("--cold-boot", action="store_true",
+                        help="Boot by running the reset code instead of restoring the cached READY prompt snapshot.")
+    parser.add_argument("--aot", action="store_true",
+                        help="Run BASIC and KERNAL translated ahead of time. See aot_build.py.")
+    parser.add_argument("--aot-cache", type=str, help="Directory of translated ROMs. Default is in user cache.")
+    parser.add_argument("--idle-skip", action="store_true",
+                        help="Fast-forward loops waiting for an interrupt, e.g. for a key press.")
+    parser.add_argument("--idioms", action="store_true", help="Run recognized copy and fill loops natively.")
+    parser.add_argument("--traps", action="store_true",
+                        help="Run KERNAL routines and BASIC floating point routines natively where the ROM"
+                             " has the expected code. See pyc64/traps.py and pyc64/basicfloat.py.")
+    parser.add_argument("--max-speed", action="store_true",
+                        help="Run as fast as possible instead of the speed of the real machine.")
 
     return parser.parse_args()
 
@@ -54,72 +72,65 @@ def arg_parser():
 def main():
     args = arg_parser()
 
-    ram = RAM()
-    bus = Bus()
-
     w, h = Renderer.window_size(args.zoom)
     window, renderer = init(w, h, b"pyc64")
 
-    clock = Clock()
-    cpu = CPU(bus, clock, history_length=16)
-
-    pla = PLA(bus)
-    bus.register(pla)
-    clock.cpu = cpu
-
-    vic2 = VIC2(bus, cpu)
-
-    io = Multiplex()
-    pla.i_io = bus.register(io)
-
-    # IO
-    keys = Keyboard(key_map.keyboard_map())
+    machine = C64(key_map=key_map.keyboard_map())
+    bus = machine.bus
+    cpu = machine.cpu
+    ram = machine.ram
+    vic2 = machine.vic2
+    keys = machine.keys
     keys.unknown_key = key_map.unknown_key_handler
-
-    cia1 = CIA(0xDC00, clock, CPU.IRQ.IRQ)
-    cia1.pio1 = CIA1AB(keys, is_b=False)
-    cia1.pio2 = CIA1AB(keys, is_b=True)
-    cia1.pio2.other_port = cia1.pio1
-    cia1.pio1.other_port = cia1.pio2
-
-    cia2 = CIA(0xDD00, clock, CPU.IRQ.NMI)
-    cia2.pio1 = CIA2A(vic2)
-
-
-    io.add(cia1)
-    io.add(cia2)
-    c_ram = ColorRAM()
-    io.add(c_ram)
-    io.add(vic2)
-
-    clock.register(cia1)
-    clock.register(cia2)
-
-    # ROMs
-    pla.i_kernal = bus.register(MMap("kernal", "kernal", 0xe000, 0xffff))
-    pla.i_basic = bus.register(MMap("basic", "basic", 0xa000, 0xbfff))
-    pla.i_chargen = bus.register(MMap("chargen", "chargen", 0xd000, 0xdfff))
+    if args.aot:
+        machine.enable_aot(args.aot_cache)
+    if args.idle_skip:
+        machine.enable_idle_skip()
+    if args.idioms:
+        machine.enable_idioms()
+    if args.traps:
+        machine.enable_traps()
 
     text_renderer = TextRenderer(renderer, bus, zoom=args.zoom)
     bus.register(text_renderer)
 
-    bus.register(ram)
-    bus.mem = ram.mem
+    display = Renderer(ram, machine.c_ram, vic2, text_renderer, window, renderer, zoom=args.zoom)
+
+    if args.cold_boot:
+        machine.reset()
+    else:
+        bootcache.boot(machine)
+    if args.snapshot is not None:
+        machine.load_snapshot(args.snapshot)
 
-    display = Renderer(ram, c_ram, vic2, text_renderer, window, renderer, zoom=args.zoom)
+    recorder = None
+    if args.record is not None:
+        recorder = FrameRecorder(machine, args.record, FRAME_CYCLES)
 
-    bus.reset()
-    cpu.reset()
+    input_recorder = None
+    if args.record_input is not None:
+        input_recorder = InputRecorder(machine, args.record_input)
+
+    rewind = None
+    if args.rewind > 0 and input_recorder is None:
+        rewind = Rewind(cpu, ram, max_frames=args.rewind)
 
     start = time.time()
     run = True
+    rewinding = False
     dump_index = 0
 
     inject = ProgramInject(args.program, bus, ram)
 
-    # 40000 cycles = 0.04 s = 25 1/s .. if the emulation could run so fast.
-    # 20k gives slightly better keyboard interaction.
-    while run and cpu.run(20000) == 0:
+    while run:
+        if rewinding:
+            if rewind.step_back():
+                text_renderer.invalidate()
+        elif machine.run(FRAME_CYCLES) != 0:
+            break
+        elif rewind is not None:
+            rewind.capture()
+
         event = sdl2.SDL_Event()
         while sdl2.SDL_PollEvent(event):
             if event.type == sdl2.SDL_QUIT:
@@ -130,33 +141,49 @@ def main():
                 if scancode == sdl2.SDL_SCANCODE_PAUSE:
                     # RESTORE
                     print(">NMI")
-                    cpu.irq = cpu.IRQ.NMI
+                    machine.nmi()
                 elif scancode == sdl2.SDL_SCANCODE_F9:
-                    inject.inject_next()
+                    prg = inject.next_program()
+                    if prg is not None:
+                        machine.inject_program(prg)
                 elif scancode == sdl2.SDL_SCANCODE_F10:
                     cpu.fault_log("")
                 elif scancode == sdl2.SDL_SCANCODE_F11:
                     print("Reset")
-                    bus.reset()
-                    cpu.reset()
+                    machine.reset()
                 elif scancode == sdl2.SDL_SCANCODE_F12:
                     ram.dump(f"dump-{dump_index}.dat")
+                    machine.save_snapshot(f"snapshot-{dump_index}.p65")
                     dump_index += 1
+                elif scancode == sdl2.SDL_SCANCODE_END:
+                    rewinding = rewind is not None
                 else:
                     keys.handle_key_down(scancode)
             elif event.type == sdl2.SDL_KEYUP:
-                keys.handle_key_up(event.key.keysym.scancode)
+                if event.key.keysym.scancode == sdl2.SDL_SCANCODE_END:
+                    rewinding = False
+                else:
+                    keys.handle_key_up(event.key.keysym.scancode)
             elif event.type == sdl2.SDL_MOUSEBUTTONDOWN:
                 x = event.button.x - 50
                 x //= 2
                 y = event.button.y - 50
                 y //= 2
                 if 0 <= x <= 320 and 0 <= y <= 200:
-                    vic2.set_lightpen_pos(x, y)
+                    machine.set_lightpen_pos(x, y)
         display.draw()
-
+        if recorder is not None:
+            recorder.record()
+        if not args.max_speed:
+            # Idle frames finish early, and sleep the rest of their time.
+            machine.clock.sync()
+
+    if recorder is not None:
+        recorder.close()
+    if input_recorder is not None:
+        input_recorder.close()
     print("took", time.time() - start, "s")
-    clock.stats()
+    machine.clock.stats()
     print()
 
 
@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import hashlib
+import importlib.util
+import os
+import typing
+
+if typing.TYPE_CHECKING:
+    from .bus import MMap
+    from .cpu65xx import CPU
+
+from .addressing65xx import (
+    aabs,
+    aabsx,
+    aabsy,
+    aacc,
+    afault,
+    aimm,
+    aimpl,
+    aind,
+    aindx,
+    aindy,
+    arel,
+    azero,
+    azerox,
+    azeroy,
+)
+from .instructions65xx import *
+from .iset65xx import ISet
+
+# Changing the generated code must change this, so that old cached modules are not used.
+GENERATOR_VERSION = 1
+
+# Block function: called with CPU, end cycle count and bus index of the ROM.
+BLOCK = typing.Callable[["CPU", int, int], None]
+
+_STOP = (rts, rti, brk)
+_WRITES = (sta, stx, sty, inc, dec, asl, lsr, rol, ror)
+_MEMORY_MODES = (aabs, aabsx, aabsy, aind, aindx, aindy, azero, azerox, azeroy)
+
+# Status register masks.
+_C, _Z, _I, _D, _V, _N = 0x01, 0x02, 0x04, 0x08, 0x40, 0x80
+_BRANCHES = {
+    bcc: f"not p.val & 0x{_C:02X}",
+    bcs: f"p.val & 0x{_C:02X}",
+    bne: f"not p.val & 0x{_Z:02X}",
+    beq: f"p.val & 0x{_Z:02X}",
+    bvc: f"not p.val & 0x{_V:02X}",
+    bvs: f"p.val & 0x{_V:02X}",
+    bpl: f"not p.val & 0x{_N:02X}",
+    bmi: f"p.val & 0x{_N:02X}",
+}
+_FLAGS = {
+    clc: f"p.val &= 0x{0xFF & ~_C:02X}",
+    sec: f"p.val |= 0x{_C:02X}",
+    cli: f"p.val &= 0x{0xFF & ~_I:02X}",
+    sei: f"p.val |= 0x{_I:02X}",
+    cld: f"p.val &= 0x{0xFF & ~_D:02X}",
+    sed: f"p.val |= 0x{_D:02X}",
+    clv: f"p.val &= 0x{0xFF & ~_V:02X}",
+}
+_LOADS = {lda: "_A", ldx: "_X", ldy: "_Y"}
+_STORES = {sta: "_A", stx: "_X", sty: "_Y"}
+_COMPARES = {cmp: "_A", cpx: "_X", cpy: "_Y"}
+_TRANSFERS = {tax: ("_A", "_X"), tay: ("_A", "_Y"), txa: ("_X", "_A"), tya: ("_Y", "_A")}
+_STEPS = {inx: ("_X", 1), iny: ("_Y", 1), dex: ("_X", -1), dey: ("_Y", -1)}
+
+# Value with N and Z flags, other flags cleared.
+NZ = bytes((v & _N) | (_Z if v == 0 else 0) for v in range(256))
+
+
+class Insn(typing.NamedTuple):
+    addr: int
+    opcode: int
+    # Operand bytes as little endian number.
+    operand: int
+    length: int
+
+
+def default_cache_dir() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "py65xx")
+
+
+def rom_key(roms: typing.Sequence[MMap], seeds: typing.Iterable[int]) -> str:
+    """
+    :return: Hash of the ROM contents, locations, seeds and the generator version.
+    """
+    h = hashlib.sha1(f"aot{GENERATOR_VERSION}".encode())
+    for rom in roms:
+        h.update(f"{rom.name}:{rom.start_addr:04X}:{rom.end_addr:04X}".encode())
+        h.update(bytes(rom.data))
+    h.update(",".join(f"{s:04X}" for s in sorted(set(seeds))).encode())
+    return h.hexdigest()
+
+
+class Translator:
+    """
+    Static translator of read-only memory into Python.
+
+    Code is found by following control flow from the seed addresses: branch and jump targets,
+    subroutines and the instructions after a JSR. Code is split into blocks ending at
+    every control transfer, and every target gets its own block, so a block is a straight
+    piece of code which is always entered at its start.
+
+    A translated instruction does the same bus accesses and clock waits in the same order as
+    the interpreter, but the opcode and operands are not read from the bus, and operand
+    addresses are computed statically where possible. Common simple instructions are written
+    out inline, others call the instruction functions of the interpreter.
+
+    Indirect jump targets (JMP ($xxxx), RTS and RTI used as jumps) cannot be found statically.
+    Such code is run by the interpreter, unless it is also reachable some other way.
+    """
+
+    def __init__(self, roms: typing.Sequence[MMap], iset: typing.Optional[ISet] = None):
+        for rom in roms:
+            if rom.writable and not rom.write_through:
+                raise ValueError(f"{rom.name} is writable, it cannot be translated")
+        self.roms = roms
+        self.iset = iset if iset is not None else ISet()
+
+    def _rom_of(self, addr: int) -> typing.Optional[MMap]:
+        for rom in self.roms:
+            if rom.start_addr <= addr <= rom.end_addr:
+                return rom
+        return None
+
+    def _decode(self, rom: MMap, addr: int) -> typing.Optional[Insn]:
+        opcode = rom.data[addr - rom.start_addr]
+        instr, addressing, length, _ = self.iset[opcode]
+        if addressing is afault or instr in (fault, jam):
+            return None
+        if addr + length - 1 > rom.end_addr:
+            return None
+        operand = 0
+        for i in range(length - 1, 0, -1):
+            operand = operand << 8 | rom.data[addr + i - rom.start_addr]
+        return Insn(addr, opcode, operand, length)
+
+    def discover(self, seeds: typing.Iterable[int]) -> typing.Dict[int, typing.List[Insn]]:
+        """
+        :return: Instructions of each block by block start address.
+        """
+        blocks: typing.Dict[int, typing.List[Insn]] = {}
+        work = sorted(set(seeds), reverse=True)
+        while work:
+            start = work.pop()
+            if start in blocks:
+                continue
+            rom = self._rom_of(start)
+            if rom is None:
+                continue
+
+            insns = []
+            addr = start
+            while addr <= rom.end_addr:
+                insn = self._decode(rom, addr)
+                if insn is None:
+                    break
+                insns.append(insn)
+                instr, addressing, length, _ = self.iset[insn.opcode]
+                nxt = addr + length
+                if addressing is arel:
+                    rel = insn.operand
+                    work += [nxt + (rel - 0x100 if rel >= 0x80 else rel), nxt]
+                    break
+                if instr is jsr:
+                    work += [insn.operand, nxt]
+                    break
+                if instr is jmp:
+                    if addressing is aabs:
+                        work.append(insn.operand)
+                    break
+                if instr in _STOP:
+                    break
+                addr = nxt
+            if insns:
+                blocks[start] = insns
+        return blocks
+
+    def generate(self, blocks: typing.Dict[int, typing.List[Insn]], key: str = "") -> str:
+        """
+        :return: Python source of a module having BLOCKS, a dict of block functions by start address.
+        """
+        names = sorted({self.iset[i.opcode][0].__qualname__ for b in blocks.values() for i in b})
+        out = [
+            "# -*- coding: utf-8 -*-",
+            f"# Generated by py65xx.aot version {GENERATOR_VERSION}. Do not edit.",
+            f"# ROMs: {', '.join(f'{r.name} ${r.start_addr:04X}-${r.end_addr:04X}' for r in self.roms)}",
+            f"# Key: {key}",
+            "",
+            "from py65xx.addressing65xx import _save_a, _save_on_addr",
+            "from py65xx.aot import NZ",
+            f"from py65xx.instructions65xx import {', '.join(names)}",
+            "",
+        ]
+        for start in sorted(blocks):
+            out.append("")
+            out.extend(self._block(start, blocks[start]))
+            out.append("")
+        out.append("")
+        out.append("BLOCKS = {")
+        for start in sorted(blocks):
+            out.append(f"    0x{start:04X}: b_{start:04X},")
+        out.append("}")
+        out.append("")
+        return "\n".join(out)
+
+    def _block(self, start: int, insns: typing.List[Insn]) -> typing.List[str]:
+        lines = [
+            f"def b_{start:04X}(cpu, end, idx):",
+            "    clock = cpu.clock",
+            "    wait = clock.wait_cycle",
+            "    bus = cpu.bus",
+            "    read = bus.read",
+            "    enabled = bus.enabled",
+            "    p = cpu.p",
+        ]
+        # Whether data_val may be set by an earlier instruction.
+        dirty = True
+        for n, insn in enumerate(insns):
+            if n:
+                lines.append("    if cpu.irq or clock.cycles >= end:")
+                lines.append("        return")
+            dirty = self._insn(insn, lines, dirty)
+        return lines
+
+    def _address(self, insn: Insn, lines: typing.List[str]) -> str:
+        """
+        Emit the addressing of the instruction after the opcode fetch.
+
+        :return: Expression of the address.
+        """
+        addressing = self.iset[insn.opcode][1]
+        v = insn.operand
+        if addressing in (aabs, aabsx, aabsy):
+            lines.append("    wait()")
+            lines.append("    wait()")
+            if addressing is aabsx:
+                return f"0x{v:04X} + cpu._X"
+            if addressing is aabsy:
+                return f"0x{v:04X} + cpu._Y"
+            return f"0x{v:04X}"
+        if addressing is azero:
+            return f"0x{v:02X}"
+        if addressing is azerox:
+            return f"(0x{v:02X} + cpu._X) & 0xFF"
+        if addressing is azeroy:
+            return f"(0x{v:02X} + cpu._Y) & 0xFF"
+        if addressing is aind:
+            lines.append(f"    addr = read(0x{v:04X}) | read(0x{v + 1:04X}) << 8")
+            return "addr"
+        if addressing is aindx:
+            lines.append("    wait()")
+            lines.append(f"    base = (0x{v:02X} + cpu._X) & 0xFF")
+            lines.append("    addr = read(base) | read(base + 1) << 8")
+            lines.append("    wait()")
+            lines.append("    wait()")
+            return "addr"
+        if addressing is aindy:
+            lines.append(f"    addr = read(0x{v:02X}) + cpu._Y")
+            lines.append(f"    addr += read(0x{v + 1:02X}) << 8")
+            lines.append("    wait()")
+            lines.append("    wait()")
+            return "addr"
+        if addressing is arel:
+            nxt = insn.addr + insn.length
+            return f"0x{nxt + (v - 0x100 if v >= 0x80 else v):04X}"
+        raise ValueError(f"No address in {addressing.__name__}")
+
+    def _insn(self, insn: Insn, lines: typing.List[str], dirty: bool) -> bool:
+        """
+        Emit one instruction.
+
+        :return: Whether data_val may be set afterwards.
+        """
+        instr, addressing, length, _ = self.iset[insn.opcode]
+        pc = insn.addr
+        v = insn.operand
+        arg = "" if length == 1 else f"{v:0{2 * (length - 1)}X}"
+        lines.append(f"    # ${pc:04X} {instr.__name__.upper()} {addressing.dis(arg)}")
+        if instr in _WRITES and addressing in _MEMORY_MODES:
+            lines.append(f"    bus.pc = 0x{pc:04X}")
+        # Opcode fetch.
+        lines.append("    wait()")
+        lines.append(f"    cpu.pc = 0x{pc + length:04X}")
+
+        if instr in _LOADS and addressing is aimm:
+            lines.append("    wait()")
+            lines.append(f"    cpu.{_LOADS[instr]} = 0x{v:02X}")
+            lines.append(f"    p.val = (p.val & 0x7D) | 0x{NZ[v]:02X}")
+        elif instr in _LOADS:
+            addr = self._address(insn, lines)
+            lines.append("    wait()")
+            lines.append(f"    v = read({addr})")
+            lines.append(f"    cpu.{_LOADS[instr]} = v")
+            lines.append("    p.val = (p.val & 0x7D) | NZ[v]")
+        elif instr in _STORES:
+            addr = self._address(insn, lines)
+            lines.append(f"    bus.write({addr}, cpu.{_STORES[instr]})")
+            lines.append("    wait()")
+        elif instr in _COMPARES:
+            reg = _COMPARES[instr]
+            if addressing is aimm:
+                lines.append("    wait()")
+                m = f"0x{v:02X}"
+            else:
+                addr = self._address(insn, lines)
+                lines.append("    wait()")
+                lines.append(f"    m = read({addr})")
+                m = "m"
+            lines.append(f"    r = cpu.{reg}")
+            lines.append(f"    p.val = (p.val & 0x7C) | NZ[(r - {m}) & 0xFF] | (r >= {m})")
+        elif instr in _FLAGS:
+            lines.append(f"    {_FLAGS[instr]}")
+        elif instr in _TRANSFERS:
+            src, dst = _TRANSFERS[instr]
+            lines.append(f"    v = cpu.{dst} = cpu.{src}")
+            lines.append("    p.val = (p.val & 0x7D) | NZ[v]")
+        elif instr in _STEPS:
+            reg, step = _STEPS[instr]
+            lines.append(f"    v = cpu.{reg} = (cpu.{reg} {'+' if step > 0 else '-'} 1) & 0xFF")
+            lines.append("    wait()")
+            lines.append("    p.val = (p.val & 0x7D) | NZ[v]")
+        elif instr in _BRANCHES and addressing is arel and self._address(insn, []) != f"0x{pc:04X}":
+            lines.append(f"    if {_BRANCHES[instr]}:")
+            lines.append(f"        cpu.pc = {self._address(insn, [])}")
+        elif instr is jmp and addressing is aabs and v != pc:
+            lines.append("    wait()")
+            lines.append("    wait()")
+            lines.append(f"    cpu.pc = 0x{v:04X}")
+        else:
+            # Call the interpreter's instruction with the state its addressing would leave.
+            if addressing is aimm:
+                lines.append(f"    cpu.data_val = 0x{v:02X}")
+                lines.append("    wait()")
+                dirty = True
+            elif addressing is aacc:
+                lines.append("    cpu.data_val = cpu._A")
+                dirty = True
+            else:
+                if dirty:
+                    lines.append("    cpu.data_val = None")
+                    dirty = False
+                if addressing is not aimpl:
+                    lines.append(f"    cpu.addr_val = {self._address(insn, lines)}")
+            if instr in (asl, lsr, rol, ror):
+                lines.append(f"    cpu.save = {'_save_a' if addressing is aacc else '_save_on_addr'}")
+            if instr is jmp or instr in _BRANCHES:
+                lines.append(f"    cpu.spc = 0x{pc:04X}")
+            lines.append(f"    {instr.__qualname__}(cpu)")
+
+        if instr in _WRITES and addressing in _MEMORY_MODES:
+            # The write may have changed memory mapping.
+            lines.append("    if not enabled[idx]:")
+            lines.append("        return")
+        return dirty
+
+
+def module_path(key: str, cache_dir: typing.Optional[str] = None) -> str:
+    return os.path.join(cache_dir if cache_dir is not None else default_cache_dir(), f"aot_{key}.py")
+
+
+def write_module(fname: str, source: str):
+    """
+    Write the translated module atomically, so that concurrent runs never see a partial file.
+    """
+    os.makedirs(os.path.dirname(fname) or ".", exist_ok=True)
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(source)
+    os.replace(tmp, fname)
+
+
+def load(
+    roms: typing.Sequence[MMap],
+    seeds: typing.Iterable[int],
+    cache_dir: typing.Optional[str] = None,
+    iset: typing.Optional[ISet] = None,
+) -> typing.Dict[int, BLOCK]:
+    """
+    Load translated blocks of the ROMs, translating them first if they are not in the cache.
+
+    :param cache_dir: Directory of translated modules, default_cache_dir() by default.
+    :return: Block functions by start address.
+    """
+    seeds = list(seeds)
+    key = rom_key(roms, seeds)
+    fname = module_path(key, cache_dir)
+    if not os.path.exists(fname):
+        translator = Translator(roms, iset)
+        write_module(fname, translator.generate(translator.discover(seeds), key))
+
+    spec = importlib.util.spec_from_file_location(f"py65xx_aot_{key}", fname)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.BLOCKS
+
+
+def install(
+    cpu: CPU,
+    roms: typing.Sequence[MMap],
+    seeds: typing.Iterable[int],
+    cache_dir: typing.Optional[str] = None,
+):
+    """
+    Load translated blocks of the ROMs and set them as `CPU.aot`.
+
+    The ROMs must be registered in the bus of the CPU, before any other part that could
+    answer reads of the same addresses while the ROM is enabled.
+    A block is used only while its ROM is enabled in the bus, e.g. mapped in by a PLA.
+    """
+    table = cpu.aot if cpu.aot is not None else {}
+    blocks = load(roms, seeds, cache_dir, cpu.iset)
+    indices = {id(part): i for i, part in enumerate(cpu.bus.parts)}
+    for start, fn in blocks.items():
+        for rom in roms:
+            if rom.start_addr <= start <= rom.end_addr:
+                table[start] = (fn, indices[id(rom)])
+                break
+    cpu.aot = table
+
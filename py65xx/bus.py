@@ -7,19 +7,42 @@ import array
 import typing
 
 from .defs import BusPart, BusRet, TAddr, TData
-from .statelog import LOG
+from .statelog import Log
 
 
 class RAM(BusPart):
-    __slots__ = "mem"
+    __slots__ = ("mem", "dirty")
     CLEAR_BYTE = 0x00
 
     def __init__(self):
-        self.mem = array.array("B", (self.CLEAR_BYTE for _ in range(65536)))
+        self.mem = array.array("B", bytes((self.CLEAR_BYTE,)) * 65536)
+        # Pages written since last clear_dirty, 1 byte per 256-byte page.
+        self.dirty = bytearray(256)
 
     def reset(self):
-        for i in range(len(self.mem)):
-            self.mem[i] = self.CLEAR_BYTE
+        memoryview(self.mem)[:] = bytes((self.CLEAR_BYTE,)) * len(self.mem)
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        self.dirty[:] = b"\x01" * len(self.dirty)
+
+    def clear_dirty(self):
+        self.dirty[:] = bytes(len(self.dirty))
+
+    def dirty_pages(self) -> typing.List[int]:
+        return [i for i, d in enumerate(self.dirty) if d]
+
+    def write_block(self, addr: TAddr, data: bytes):
+        """
+        Write data directly into memory, skipping the bus.
+        """
+        data = data[: len(self.mem) - addr]
+        if not data:
+            return
+        end = addr + len(data)
+        memoryview(self.mem)[addr:end] = data
+        first, last = addr >> 8, (end - 1) >> 8
+        self.dirty[first : last + 1] = b"\x01" * (last - first + 1)
 
     def read_address(self, addr: TAddr) -> typing.Optional[TData]:
         if 0x0000 <= addr <= 0xFFFF:
@@ -28,10 +51,24 @@ class RAM(BusPart):
     def write_address(self, addr: TAddr, data: TData):
         if 0x0000 <= addr <= 0xFFFF:
             self.mem[addr] = data
+            self.dirty[addr >> 8] = 1
+
+    def is_plain(self, addr: TAddr) -> bool:
+        return 0x0000 <= addr <= 0xFFFF
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        return start <= 0xFFFF and end >= 0x0000
 
     def __getitem__(self, item):
         return self.mem[item]
 
+    def get_state(self) -> bytes:
+        return self.mem.tobytes()
+
+    def set_state(self, state: bytes):
+        memoryview(self.mem)[:] = state
+        self.mark_dirty()
+
     def __repr__(self):
         return f"RAM()"
 
@@ -41,7 +78,7 @@ class RAM(BusPart):
 
 
 class MMap(BusPart):
-    __slots__ = ("name", "data", "start_addr", "end_addr", "rom_file")
+    __slots__ = ("name", "data", "start_addr", "end_addr", "rom_file", "pristine")
 
     def __init__(
         self,
@@ -57,7 +94,13 @@ class MMap(BusPart):
         self.writable = writable
         self.write_through = write_through
         self.rom_file = rom_file
-        self.data: typing.List[int] = self.reset()
+        # Contents restored on reset, as ints to copy them to data fast. The file is read only once.
+        if isinstance(rom_file, str):
+            with open(rom_file, "rb") as f:
+                self.pristine: typing.Tuple[int, ...] = tuple(f.read())
+        else:
+            self.pristine = tuple(rom_file)
+        self.data: typing.List[int] = list(self.pristine)
 
         self.end_addr = end_addr if end_addr >= 0 else start_addr + len(self.data) - 1
 
@@ -69,17 +112,8 @@ class MMap(BusPart):
             )
 
     def reset(self):
-        rom_file = self.rom_file
-        if isinstance(rom_file, str):
-            with open(rom_file, "rb") as f:
-                data = list(f.read())
-        elif isinstance(rom_file, bytes):
-            data = list(rom_file)
-        else:
-            data = rom_file.copy()
-
-        self.data = data
-        return data
+        # In place, as the data may be shared, e.g. by a TrappedMMap.
+        self.data[:] = self.pristine
 
     def read_address(self, addr: TAddr) -> BusRet:
         if self.start_addr <= addr <= self.end_addr:
@@ -92,9 +126,24 @@ class MMap(BusPart):
             else:
                 self.data[addr - self.start_addr] = data
 
+    def is_plain(self, addr: TAddr) -> bool:
+        return True
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        return start <= self.end_addr and end >= self.start_addr
+
     def __getitem__(self, item):
         return self.data[item]
 
+    def get_state(self) -> typing.Optional[bytes]:
+        # Read-only memory does not change, so there is no need to save it.
+        if self.writable and not self.write_through:
+            return bytes(self.data)
+        return None
+
+    def set_state(self, state: bytes):
+        self.data[:] = state
+
     def __repr__(self):
         return f"MMap({self.name!r}, ${self.start_addr:04X})"
 
@@ -113,6 +162,11 @@ class Bus:
         "fault_handler",
         "write_breakpoints",
         "read_breakpoints",
+        "coverage",
+        "tracer",
+        "log",
+        "read",
+        "write",
     )
 
     def __init__(self):
@@ -126,6 +180,15 @@ class Bus:
         self.fault_handler = None
         self.write_breakpoints = set()
         self.read_breakpoints = set()
+        # Data access tracking, see coverage.Coverage.attach.
+        self.coverage = None
+        # Bus access tracing, see trace.Tracer.attach.
+        self.tracer = None
+        # Debug logging switches, replaced with the one of the CPU.
+        self.log = Log()
+        # Bound methods in instance, so that observers can replace them, see lockstep.WriteTap.
+        self.read = self._read
+        self.write = self._write
 
     def register(
         self,
@@ -142,16 +205,87 @@ class Bus:
         self._defaults.append(enabled)
         return len(self._parts) - 1
 
+    def replace(self, old: BusPart, new: BusPart):
+        """
+        Put new part in place of old, keeping its index and enabled state.
+        """
+        self._parts[self._parts.index(old)] = new
+
+    def only_part(self, part: BusPart, start: TAddr, end: TAddr) -> bool:
+        """
+        :return: Whether no other enabled part than the given one handles any address in start..end,
+            inclusive. See BusPart.handles.
+        """
+        if start < 0 or end > 0xFFFF:
+            return False
+        enabled = self._enabled
+        for i, other in enumerate(self._parts):
+            if enabled[i] and other is not part and other.handles(start, end):
+                return False
+        return True
+
     def set_enabled(self, index: int, enabled: bool):
         self._enabled[index] = enabled
 
+    def plain_memory(self, start: TAddr, end: TAddr):
+        """
+        :return: bus.mem if only its RAM handles start..end, inclusive, else the bus itself.
+            For reading e.g. instructions to disassemble without going through all the parts.
+        """
+        enabled = self._enabled
+        for i, part in enumerate(self._parts):
+            if enabled[i] and isinstance(part, RAM) and part.mem is self.mem:
+                if self.only_part(part, start, end):
+                    return self.mem
+                break
+        return self
+
+    def is_plain(self, addr: TAddr) -> bool:
+        """
+        :return: Whether the address is plain memory for all enabled parts. See BusPart.is_plain.
+        """
+        enabled = self._enabled
+        for i, part in enumerate(self._parts):
+            if enabled[i] and not part.is_plain(addr):
+                return False
+        return True
+
+    @property
+    def parts(self) -> typing.Sequence[BusPart]:
+        return self._parts
+
+    @property
+    def enabled(self) -> typing.Sequence[bool]:
+        """
+        Enabled flags of the parts, by index. Live view, not a copy.
+        """
+        return self._enabled
+
+    def get_state(self) -> bytes:
+        return bytes(self._enabled)
+
+    def set_state(self, state: bytes):
+        self._enabled[:] = [e != 0 for e in state]
+
     def reset(self):
         for part in self._parts:
             part.reset()
         for i, e in enumerate(self._defaults):
             self._enabled[i] = e
 
-    def read(self, addr: TAddr, silent=False) -> BusRet:
+    def observe(self):
+        """
+        Give accesses to coverage and tracer, if set. Their checks are done only then, not on every access.
+        Replaces read and write, so call it before wrapping them, e.g. with lockstep.WriteTap.
+        """
+        if self.coverage is not None or self.tracer is not None:
+            self.read = self._read_observed
+            self.write = self._write_observed
+        else:
+            self.read = self._read
+            self.write = self._write
+
+    def _read(self, addr: TAddr, silent=False) -> BusRet:
         ret = 0
         if addr in self.read_breakpoints:
             breakpoint()
@@ -167,17 +301,26 @@ class Bus:
             part = self._parts[i]
             value = part.read_address(addr)
             if value is not None:
-                if not silent and LOG.bus_read:
-                    LOG.print(f"<- ${addr:04X}: ${value:02X} ({part})")
+                if not silent and self.log.bus_read:
+                    self.log.print(f"<- ${addr:04X}: ${value:02X} ({part})")
                 return value
             i += 1
-        if not silent and LOG.bus_read:
-            LOG.print(f"<- ${addr:04X}: ${ret:02X}")
+        if not silent and self.log.bus_read:
+            self.log.print(f"<- ${addr:04X}: ${ret:02X}")
         return ret
 
-    def write(self, addr: TAddr, data: TData):
-        if LOG.bus_write and (addr < 0x100 or addr > 0x1FF):
-            LOG.print(f"-> ${addr:04X}: ${data:02X}")
+    def _read_observed(self, addr: TAddr, silent=False) -> BusRet:
+        value = self._read(addr, silent)
+        if not silent:
+            if self.coverage is not None:
+                self.coverage.read(addr, self.pc)
+            if self.tracer is not None and not callable(value):
+                self.tracer.bus_read(addr, value)
+        return value
+
+    def _write(self, addr: TAddr, data: TData):
+        if self.log.bus_write and (addr < 0x100 or addr > 0x1FF):
+            self.log.print(f"-> ${addr:04X}: ${data:02X}")
         if addr in self.write_breakpoints:
             breakpoint()
 
@@ -193,6 +336,13 @@ class Bus:
                 self.fault_handler(f"${self.pc:04X}: {r}")
             i += 1
 
+    def _write_observed(self, addr: TAddr, data: TData):
+        if self.coverage is not None:
+            self.coverage.write(addr)
+        if self.tracer is not None:
+            self.tracer.bus_write(addr, data)
+        self._write(addr, data)
+
     def __getitem__(self, item):
         if isinstance(item, slice):
             return [self.read(i, silent=True) for i in range(item.start, item.stop)]
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from .clock import Clock
+    from .profiler import Symbols
+
+# Stack pointer of the root frame, above any real stack pointer value.
+_ROOT_SP = 0x200
+
+
+class _Frame:
+    __slots__ = ("addr", "sp", "start", "children")
+
+    def __init__(self, addr: typing.Optional[int], sp: int, start: int):
+        # Called address, None for the root.
+        self.addr = addr
+        # Stack pointer after the return address was pushed.
+        self.sp = sp
+        self.start = start
+        # Inclusive cycles of finished callees.
+        self.children = 0
+
+
+class CallProfiler:
+    """
+    Shadow call stack maintained from JSR, RTS, interrupts and RTI.
+    Set as `CPU.call_profiler` to enable.
+
+    The shadow stack is not trusted to match the real one. Instead, a return finishes every
+    frame whose return address is at or below the stack pointer after the return,
+    and a call drops every frame whose return address would be overwritten by the call.
+    So discarding return address with PLA/PLA, using RTS as a jump, and resetting
+    the stack with TXS all keep the shadow stack consistent and bounded.
+    """
+
+    def __init__(self, clock: Clock, max_depth: int = 256):
+        self._clock = clock
+        self.max_depth = max_depth
+        self._stack: typing.List[_Frame] = [_Frame(None, _ROOT_SP, clock.cycles)]
+        # Called address to [calls, inclusive cycles, exclusive cycles].
+        # Inclusive cycles of recursive routines are counted at every level.
+        self.stats: typing.Dict[int, typing.List[int]] = {}
+        # Call path to exclusive cycles.
+        self.folded: typing.Dict[typing.Tuple[int, ...], int] = {}
+
+    def call(self, addr: int, sp: int):
+        """
+        JSR, IRQ or NMI to addr. sp is the stack pointer after pushing the return address.
+        """
+        stack = self._stack
+        now = self._clock.cycles
+        while stack[-1].sp <= sp:
+            self._finish(now)
+        if len(stack) > self.max_depth:
+            # Forget the outermost frame, but keep the root.
+            del stack[1]
+        stack.append(_Frame(addr, sp, now))
+
+    def ret(self, sp: int):
+        """
+        RTS or RTI. sp is the stack pointer after popping the return address.
+        """
+        stack = self._stack
+        now = self._clock.cycles
+        while stack[-1].sp < sp:
+            self._finish(now)
+
+    def _finish(self, now: int):
+        stack = self._stack
+        path = tuple(f.addr for f in stack[1:])
+        frame = stack.pop()
+        inclusive = now - frame.start
+        exclusive = inclusive - frame.children
+        stack[-1].children += inclusive
+
+        s = self.stats.get(frame.addr)
+        if s is None:
+            self.stats[frame.addr] = [1, inclusive, exclusive]
+        else:
+            s[0] += 1
+            s[1] += inclusive
+            s[2] += exclusive
+        self.folded[path] = self.folded.get(path, 0) + exclusive
+
+    @property
+    def depth(self) -> int:
+        return len(self._stack) - 1
+
+    @staticmethod
+    def _name(addr: int, symbols: typing.Optional[Symbols]) -> str:
+        if symbols is not None:
+            name = symbols.label(addr)
+            if name is not None:
+                return name
+        return f"${addr:04X}"
+
+    def write_folded(self, fname: str, symbols: typing.Optional[Symbols] = None):
+        """
+        Write exclusive cycles per call path in the "folded stacks" format
+        used by flamegraph.pl, inferno, speedscope and others.
+        Frames which have not returned yet are not included.
+        """
+        now = self._clock.cycles
+        stack = self._stack
+        # Cycles spent outside of any call so far.
+        root_cycles = now - stack[0].start - stack[0].children
+        if len(stack) > 1:
+            root_cycles -= now - stack[1].start
+        with open(fname, "w") as f:
+            if root_cycles > 0:
+                f.write(f"main {root_cycles}\n")
+            for path, cycles in sorted(self.folded.items()):
+                names = ";".join(self._name(a, symbols) for a in path)
+                f.write(f"main;{names} {cycles}\n")
+
+    def report(self, symbols: typing.Optional[Symbols] = None, top: int = 20):
+        print("Routines by inclusive cycles:")
+        print(f"{'calls':>10} {'inclusive':>12} {'exclusive':>12}  routine")
+        rows = sorted(self.stats.items(), key=lambda r: r[1][1], reverse=True)
+        for addr, (calls, inclusive, exclusive) in rows[:top]:
+            print(f"{calls:10} {inclusive:12} {exclusive:12}  {self._name(addr, symbols)}")
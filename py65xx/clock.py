@@ -1,19 +1,47 @@
 # -*- coding: utf-8 -*-
 # Copyright (C) 2021  Jyrki Launonen
 
+import struct
 import time
 import typing
 
+_STATE = struct.Struct("<Q")
+
 
 class Clocked:
     def on_clock(self) -> typing.Optional[int]:
         raise NotImplementedError()
 
+    def next_event(self) -> typing.Optional[int]:
+        """
+        :return: Count of following clocks that only count down internal state, e.g. timers,
+            without requesting interrupts. Those can be done at once with skip.
+            None if the device has nothing scheduled.
+        """
+        return 0
+
+    def skip(self, cycles: int):
+        """
+        Advance by cycles, at most next_event of them.
+        """
+        for _ in range(cycles):
+            self.on_clock()
+
+    def get_state(self) -> typing.Optional[bytes]:
+        """
+        :return: State of the device for snapshots, or None if the device has no state.
+        """
+        return None
+
+    def set_state(self, state: bytes):
+        pass
+
 
 class Clock:
     __slots__ = (
         "_cycle_time_ns",
         "_last_cycle",
+        "_sync_cycles",
         "_s_waits",
         "_s_late",
         "cycles",
@@ -24,6 +52,7 @@ class Clock:
     def __init__(self, two_mhz=False):
         self._cycle_time_ns = 500 if two_mhz else 1000
         self._last_cycle = 0
+        self._sync_cycles = 0
         self._s_waits = 0
         self._s_late = []
         self.cycles = 0
@@ -33,8 +62,13 @@ class Clock:
     def register(self, listener: Clocked):
         self._cycle_listeners.append(listener)
 
+    @property
+    def listeners(self) -> typing.Sequence[Clocked]:
+        return self._cycle_listeners
+
     def reset(self):
         self._last_cycle = time.time_ns()
+        self._sync_cycles = 0
         self.cycles = 0
 
     def wait_cycle(self):
@@ -45,6 +79,63 @@ class Clock:
                 # IRQ from device connected to clock.
                 self.cpu.irq = r
 
+    def next_event(self) -> typing.Optional[int]:
+        """
+        :return: Count of following cycles that can be skipped, see Clocked.next_event.
+            None if no listener has anything scheduled.
+        """
+        out = None
+        for listener in self._cycle_listeners:
+            n = listener.next_event()
+            if n is not None and (out is None or n < out):
+                out = n
+        return out
+
+    def skip(self, cycles: int):
+        """
+        Advance time by cycles without the CPU. Must not be more than next_event.
+        """
+        self.cycles += cycles
+        for listener in self._cycle_listeners:
+            listener.skip(cycles)
+
+    def advance(self, cycles: int):
+        """
+        Advance time by cycles without the CPU, clocking listeners one cycle at a time only on their events.
+        Interrupts requested meanwhile are left pending as after wait_cycle.
+        """
+        while cycles > 0:
+            n = self.next_event()
+            n = cycles if n is None else min(n, cycles)
+            if n > 0:
+                self.skip(n)
+                cycles -= n
+            if cycles > 0:
+                self.wait_cycle()
+                cycles -= 1
+
+    def sync(self):
+        """
+        Sleep until real time reaches the emulated time, so that the machine runs at its real speed.
+        Time lost by running slower than that is not caught up later.
+        """
+        now = time.time_ns()
+        ahead = (self.cycles - self._sync_cycles) * self._cycle_time_ns - (now - self._last_cycle)
+        if ahead > 0:
+            self._s_waits += 1
+            time.sleep(ahead / 1e9)
+        else:
+            self._last_cycle = now
+            self._sync_cycles = self.cycles
+
+    def get_state(self) -> bytes:
+        return _STATE.pack(self.cycles)
+
+    def set_state(self, state: bytes):
+        (self.cycles,) = _STATE.unpack(state)
+        self._last_cycle = time.time_ns()
+        self._sync_cycles = self.cycles
+
     def stats(self):
         print(
             f"Waits: {self._s_waits}, late: {self._s_late}",
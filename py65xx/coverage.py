@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import struct
+import typing
+
+if typing.TYPE_CHECKING:
+    from .bus import Bus
+
+MAGIC = b"P65C"
+VERSION = 1
+
+# Magic, version.
+_HEADER = struct.Struct("<4sH")
+
+# Flags returned by Coverage.flags.
+OPCODE = 1
+OPERAND = 2
+READ = 4
+WRITE = 8
+
+
+class Coverage:
+    """
+    Which addresses have been executed, and optionally which have been read or written as data.
+    Set as `CPU.coverage` to enable. Data tracking is enabled with `attach`.
+
+    For execution, CPU.run stores the instruction length at the address of each instruction,
+    so that operands can be told apart from opcodes later. That is one bytearray store per instruction.
+    Data tracking costs a call per bus access, so it is optional.
+
+    >>> from py65xx.bus import Bus, RAM
+    >>> from py65xx.clock import Clock
+    >>> from py65xx.cpu65xx import CPU
+    >>> bus, ram = Bus(), RAM()
+    >>> _ = bus.register(ram)
+    >>> bus.mem = ram.mem
+    >>> ram.write_block(0x0200, bytes.fromhex("a5108d00034c0502"))  # LDA $10, STA $0300, JMP $0205
+    >>> clock = Clock()
+    >>> cpu = clock.cpu = CPU(bus, clock)
+    >>> cpu.pc = 0x0200
+    >>> coverage = cpu.coverage = Coverage()
+    >>> coverage.attach(bus)
+    >>> _ = cpu.run(20)
+    >>> for mask in (OPCODE, OPERAND, READ, WRITE):
+    ...     print([f"${start:04X}-${end:04X}" for start, end in coverage.ranges(mask=mask)])
+    ['$0200-$0200', '$0202-$0202', '$0205-$0205']
+    ['$0201-$0201', '$0203-$0204', '$0206-$0207']
+    ['$0010-$0010']
+    ['$0300-$0300']
+    """
+
+    def __init__(self):
+        # Instruction length at opcode addresses, 0 elsewhere.
+        self.executed = bytearray(65536)
+        # READ and WRITE flags.
+        self.data = bytearray(65536)
+
+    def attach(self, bus: Bus):
+        """
+        Track also data reads and writes of the bus.
+        """
+        bus.coverage = self
+        bus.observe()
+
+    def read(self, addr: int, pc: int):
+        """
+        Called by Bus for data reads. Reads of the current instruction itself are ignored.
+        """
+        if not 0 <= addr - pc < (self.executed[pc] or 1):
+            self.data[addr] |= READ
+
+    def write(self, addr: int):
+        self.data[addr] |= WRITE
+
+    def flags(self) -> bytearray:
+        """
+        :return: OPCODE, OPERAND, READ and WRITE flags of every address.
+        """
+        out = bytearray(self.data)
+        for addr, length in enumerate(self.executed):
+            if length:
+                out[addr] |= OPCODE
+                for i in range(addr + 1, min(addr + length, 65536)):
+                    out[i] |= OPERAND
+        return out
+
+    def merge(self, other: Coverage):
+        self.executed[:] = bytes(map(max, self.executed, other.executed))
+        self.data[:] = bytes(a | b for a, b in zip(self.data, other.data))
+
+    def save(self, fname: str):
+        with open(fname, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION))
+            f.write(self.executed)
+            f.write(self.data)
+
+    @classmethod
+    def load(cls, fname: str) -> Coverage:
+        with open(fname, "rb") as f:
+            data = f.read()
+        magic, version = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{fname} is not a coverage file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported coverage file version {version}")
+        pos = _HEADER.size
+        c = cls()
+        c.executed[:] = data[pos : pos + 65536]
+        c.data[:] = data[pos + 65536 : pos + 2 * 65536]
+        return c
+
+    def ranges(
+        self, start: int = 0, end: int = 0xFFFF, mask: int = OPCODE | OPERAND
+    ) -> typing.List[typing.Tuple[int, int]]:
+        """
+        :return: Inclusive (start, end) address ranges having any of given flags.
+        """
+        flags = self.flags()
+        out = []
+        range_start = None
+        for addr in range(start, end + 1):
+            if flags[addr] & mask:
+                if range_start is None:
+                    range_start = addr
+            elif range_start is not None:
+                out.append((range_start, addr - 1))
+                range_start = None
+        if range_start is not None:
+            out.append((range_start, end))
+        return out
+
+    def count(self, start: int = 0, end: int = 0xFFFF, mask: int = OPCODE | OPERAND) -> int:
+        """
+        :return: Count of addresses in the range having any of given flags.
+        """
+        flags = self.flags()
+        return sum(1 for addr in range(start, end + 1) if flags[addr] & mask)
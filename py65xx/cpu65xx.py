@@ -5,18 +5,31 @@ from __future__ import annotations
 
 import collections
 import enum
+import struct
 import typing
 
 if typing.TYPE_CHECKING:
     from .bus import Bus
+    from .callgraph import CallProfiler
     from .clock import Clock
+    from .coverage import Coverage
+    from .idioms import Idioms
+    from .idle import IdleSkip
+    from .profiler import Profiler
+    from .trace import Tracer
 
 from .instructions65xx import irq, nmi
 from .iset65xx import ISet
-from .statelog import LOG
+from .statelog import Log
 
 OP = typing.Callable[["CPU"], typing.Any]
 
+# End cycles given to translated blocks when running without limit.
+_FOREVER = 1 << 62
+
+# pc, sp, p, A, X, Y, irq
+_STATE = struct.Struct("<HBBBBBB")
+
 
 class BreakOp(typing.NamedTuple):
     action: typing.Union[str, typing.Callable[["CPU"], None]] = "debug"
@@ -130,6 +143,15 @@ class CPU:
         "breaks",
         "history",
         "irq",
+        "profiler",
+        "call_profiler",
+        "coverage",
+        "tracer",
+        "aot",
+        "idle",
+        "idioms",
+        "log",
+        "check_stuck",
     )
 
     class IRQ(enum.IntEnum):
@@ -138,7 +160,16 @@ class CPU:
         IRQ = 2
         NMI = 3
 
-    def __init__(self, bus: Bus, clock: Clock, history_length: int = 5):
+    def __init__(
+        self,
+        bus: Bus,
+        clock: Clock,
+        history_length: int = 5,
+        log: typing.Optional[Log] = None,
+    ):
+        """
+        :param log: Debug logging switches. A new Log by default. Shared with the bus.
+        """
         self.bus = bus
         self.clock = clock
 
@@ -158,6 +189,25 @@ class CPU:
         self.breaks: typing.Dict[int, BreakOp] = dict()
         self.history = collections.deque(maxlen=history_length)
         self.irq = self.IRQ.NONE
+        # Per address counters, see profiler.Profiler. Changes are seen on next run call.
+        self.profiler: typing.Optional[Profiler] = None
+        # Shadow call stack, see callgraph.CallProfiler.
+        self.call_profiler: typing.Optional[CallProfiler] = None
+        # Executed addresses, see coverage.Coverage. Changes are seen on next run call.
+        self.coverage: typing.Optional[Coverage] = None
+        # Binary execution trace, see trace.Tracer. Changes are seen on next run call.
+        self.tracer: typing.Optional[Tracer] = None
+        # Translated ROM blocks by start address: (block function, bus index of the ROM).
+        # See aot.install. Not used while any of the above or breakpoints are active.
+        self.aot: typing.Optional[typing.Dict[int, typing.Tuple[typing.Callable, int]]] = None
+        # Fast-forward of idle loops, see idle.IdleSkip, and native copy and fill loops, see idioms.Idioms.
+        # Not used when translated blocks would not be, or with call_profiler. Changes are seen on next run call.
+        self.idle: typing.Optional[IdleSkip] = None
+        self.idioms: typing.Optional[Idioms] = None
+        self.log = log if log is not None else Log()
+        bus.log = self.log
+        # Should JMP and B* instructions check for self-jump, which would stuck the CPU (until IRQ/NMI)?
+        self.check_stuck = False
 
     @property
     def A(self):
@@ -197,9 +247,18 @@ class CPU:
     def load_reset(self):
         self.pc = self.bus.read(0xFFFC) | self.bus.read(0xFFFD) << 8
 
+    def get_state(self) -> bytes:
+        return _STATE.pack(
+            self.pc, self.sp, self.p.val, self._A, self._X, self._Y, self.irq
+        )
+
+    def set_state(self, state: bytes):
+        self.pc, self.sp, p, self._A, self._X, self._Y, self.irq = _STATE.unpack(state)
+        self.p = Status(p)
+
     def print_stack(self):
-        if LOG.stack:
-            LOG.print(
+        if self.log.stack:
+            self.log.print(
                 "%02X:" % self.sp,
                 ", ".join(
                     "%02X" % self.bus.mem[t]
@@ -210,31 +269,74 @@ class CPU:
     def fault_log(self, msg: str):
         print(msg)
         for hpc in self.history:
-            print(self.iset.dis(self.bus, hpc))
+            print(self.iset.dis(self.bus.plain_memory(hpc, hpc + 2), hpc))
+
+    def handle_irq(self):
+        """
+        Start handling of the pending interrupt request, if not masked.
+        """
+        if self.irq == self.IRQ.BRK:
+            irq(self, is_brk=True)
+        elif self.irq & 0x7F == self.IRQ.NMI:
+            nmi(self)
+        elif self.irq == self.IRQ.IRQ and not self.p.I:
+            irq(self, is_brk=False)
+        # Reset request so next request can occur even during handling.
+        self.irq = 0
 
     def run(self, cycles: int = -1, step=False):
         self.bus.fault_handler = self.fault_log
         end_cycles = self.clock.cycles + cycles
+        profiler = self.profiler
+        executed = self.coverage.executed if self.coverage is not None else None
+        tracer = self.tracer
+        log = self.log
+        aot = self.aot
+        idle = self.idle
+        idioms = self.idioms
+        if (aot is not None or idle is not None or idioms is not None) and (
+            profiler is not None
+            or executed is not None
+            or tracer is not None
+            or self.breaks
+            or step
+            or self.log.per_instruction
+        ):
+            aot = idle = idioms = None
+        if self.call_profiler is not None:
+            idle = idioms = None
+        # Whether backward jumps are looked at, so that the plain interpreter does not check them.
+        backward = idle is not None or idioms is not None
+        enabled = self.bus.enabled
+        block_end = end_cycles if cycles >= 0 else _FOREVER
+        loop_end = end_cycles if cycles >= 0 else -1
         try:
             while cycles < 0 or self.clock.cycles < end_cycles:
 
                 # Handle interrupt request, if any.
                 if self.irq:
-                    if self.irq == self.IRQ.BRK:
-                        irq(self, is_brk=True)
-                    elif self.irq & 0x7F == self.IRQ.NMI:
-                        nmi(self)
-                    elif self.irq == self.IRQ.IRQ and not self.p.I:
-                        irq(self, is_brk=False)
-                    # Reset request so next request can occur even during handling.
-                    self.irq = 0
+                    self.handle_irq()
+
+                if aot is not None:
+                    block = aot.get(self.pc)
+                    if block is not None and enabled[block[1]]:
+                        start = self.pc
+                        # Instructions inside the block are not recorded, its entry is enough to find it.
+                        self.history.append(start)
+                        block[0](self, block_end, block[1])
+                        if backward and self.pc <= start:
+                            if idioms is not None:
+                                idioms.backward(self, loop_end)
+                            if idle is not None:
+                                idle.backward(self, loop_end)
+                        continue
 
                 # Continue instruction processing.
                 self.spc = spc = self.pc
                 sclk = self.clock.cycles
-                if LOG.dis:
+                if log.dis:
                     # Disassembly next instruction. Before breakpoint handling so allow debug op to see what's up.
-                    LOG.print(self.iset.dis(self.bus, self.pc))
+                    log.print(self.iset.dis(self.bus.plain_memory(self.pc, self.pc + 2), self.pc))
                 is_bp = self.pc in self.breaks
                 if is_bp:
                     the_break = self.breaks[self.pc]
@@ -242,7 +344,7 @@ class CPU:
                     if the_break.cond is not None and not the_break.cond(self):
                         pass
                     elif bp_op == "log":
-                        LOG.enable_all()
+                        log.enable_all()
                     elif bp_op == "step":
                         step = True
                     elif bp_op == "call":
@@ -269,24 +371,42 @@ class CPU:
                 if callable(cmd):
                     # Not for usual operation, but allows e.g. implementing minikernel natively.
                     cmd(self)
+                    if executed is not None:
+                        executed[spc] = 1
+                    if profiler is not None:
+                        profiler.instructions[spc] += 1
+                        profiler.cycles[spc] += self.clock.cycles - sclk
                     continue
 
                 # "Decode"
                 instruction, addressing, b8s, ncycles = self.iset[cmd]
+                if executed is not None:
+                    executed[spc] = b8s
+                if tracer is not None:
+                    tracer.instruction(self, spc, cmd, b8s, sclk)
                 # Access
                 self.save = addressing(self)
                 # Interact
                 instruction(self)
-
-                if LOG.status:
-                    LOG.print(repr(self))
-                if LOG.chk_cmd and self.pc - spc != b8s:
+                if backward and self.pc <= spc:
+                    if idioms is not None:
+                        idioms.backward(self, loop_end)
+                    if idle is not None:
+                        idle.backward(self, loop_end)
+
+                if profiler is not None:
+                    profiler.instructions[spc] += 1
+                    profiler.cycles[spc] += self.clock.cycles - sclk
+
+                if log.status:
+                    log.print(repr(self))
+                if log.chk_cmd and self.pc - spc != b8s:
                     # N.B. This lies if the instruction was a jump.
-                    LOG.print(
+                    log.print(
                         f"${spc:04X} Advanced {self.pc - spc} bytes, expected {b8s} bytes."
                     )
-                if LOG.chk_clk and self.clock.cycles - sclk != ncycles:
-                    LOG.print(
+                if log.chk_clk and self.clock.cycles - sclk != ncycles:
+                    log.print(
                         f"${spc:04X} Ticked {self.clock.cycles - sclk} cycles, expected {ncycles} cycles."
                     )
 
@@ -296,6 +416,9 @@ class CPU:
         except KeyboardInterrupt:
             print("<stop>")
             return 1
+        finally:
+            if idle is not None:
+                idle.cancel()
         return 0
 
     def __repr__(self):
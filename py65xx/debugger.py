@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import bisect
+import typing
+
+if typing.TYPE_CHECKING:
+    from .cpu65xx import CPU
+
+from . import snapshot
+
+Event = typing.Callable[[], typing.Any]
+
+
+class _Checkpoint(typing.NamedTuple):
+    cycles: int
+    data: bytes
+    # Count of events applied before the checkpoint was taken.
+    events: int
+
+
+class ReverseDebugger:
+    """
+    Run the CPU so that it can be stepped backwards one instruction at time.
+
+    Snapshots are taken automatically every `interval` cycles. Stepping back restores the
+    nearest earlier checkpoint and re-executes up to start of the previous instruction.
+    Execution is deterministic as long as everything coming from outside of the machine
+    (keyboard, NMI, program injection, ...) is given through `post`, as the events are
+    recorded and applied again at same cycle when re-executing.
+
+    Positions are instruction boundaries, identified by clock cycles.
+    """
+
+    def __init__(self, cpu: CPU, interval: int = 20000, max_checkpoints: int = 100):
+        """
+        :param cpu: CPU of the machine.
+        :param interval: Cycles between checkpoints. Smaller is faster to step back but uses more memory.
+        :param max_checkpoints: Count of checkpoints to keep. Older ones are dropped.
+        """
+        self.cpu = cpu
+        self.interval = interval
+        self.max_checkpoints = max_checkpoints
+        self._checkpoints: typing.List[_Checkpoint] = []
+        # Cycles of each checkpoint, for bisecting.
+        self._cycles: typing.List[int] = []
+        self._events: typing.List[typing.Tuple[int, Event]] = []
+        # Index of next event to apply. Less than len(_events) when in the past.
+        self._next_event = 0
+        # Checkpoint cycles to (end cycles, instruction start cycles, instruction PCs).
+        self._bounds: typing.Dict[int, typing.Tuple[int, typing.List[int], typing.List[int]]] = {}
+        self._checkpoint()
+
+    @property
+    def cycles(self) -> int:
+        return self.cpu.clock.cycles
+
+    @property
+    def oldest(self) -> int:
+        """
+        Cycles of the earliest position that can be stepped back to.
+        """
+        return self._checkpoints[0].cycles
+
+    def post(self, event: Event):
+        """
+        Apply an external event at current position and record it for re-execution.
+        If the position is in the past, the recorded future is dropped.
+        """
+        now = self.cycles
+        if self._next_event < len(self._events):
+            del self._events[self._next_event :]
+        while self._checkpoints[-1].cycles > now or self._checkpoints[-1].events > self._next_event:
+            self._checkpoints.pop()
+            self._bounds.pop(self._cycles.pop(), None)
+        # Boundary lists of current segment may have been computed with the dropped events.
+        self._bounds.pop(self._checkpoints[-1].cycles, None)
+
+        self._events.append((now, event))
+        self._next_event += 1
+        event()
+
+    def run(self, cycles: int) -> int:
+        """
+        Run forward at least given cycles, taking checkpoints on the way.
+
+        :return: Return value of CPU.run, i.e. 0 unless stopped.
+        """
+        cpu = self.cpu
+        clock = cpu.clock
+        end = clock.cycles + cycles
+        while clock.cycles < end:
+            self._apply_events()
+            self._checkpoint()
+            stop = min(end, self._cycles[self._index(clock.cycles)] + self.interval)
+            if self._next_event < len(self._events):
+                stop = min(stop, self._events[self._next_event][0])
+            r = cpu.run(stop - clock.cycles)
+            if r != 0:
+                return r
+        return 0
+
+    def step(self) -> int:
+        """
+        Run one instruction forward.
+        """
+        return self.run(1)
+
+    def step_back(self, count: int = 1) -> bool:
+        """
+        Go back given count of instructions.
+
+        :return: False if the position would be earlier than the oldest checkpoint.
+        """
+        now = self.cycles
+        target = now
+        for _ in range(count):
+            index = bisect.bisect_left(self._cycles, target) - 1
+            if index < 0:
+                break
+            starts, _ = self._boundaries(index, target)
+            target = starts[bisect.bisect_left(starts, target) - 1]
+        else:
+            self._replay(self._index(target), target)
+            return True
+        if self.cycles != now:
+            self._replay(self._index(now), now)
+        return False
+
+    def goto(self, cycles: int) -> bool:
+        """
+        Go to first instruction boundary at or after given cycles.
+        Going forward from the current position is same as running.
+        """
+        if cycles >= self.cycles:
+            return self.run(cycles - self.cycles) == 0
+        index = self._index(cycles)
+        if index < 0:
+            return False
+        self._replay(index, cycles)
+        return True
+
+    def trace(self, count: int = 16) -> typing.List[int]:
+        """
+        :return: Start addresses of up to count previous instructions, oldest first.
+        """
+        out = []
+        now = self.cycles
+        target = now
+        index = bisect.bisect_left(self._cycles, target) - 1
+        while index >= 0 and len(out) < count:
+            starts, pcs = self._boundaries(index, target)
+            i = bisect.bisect_left(starts, target)
+            out[:0] = pcs[max(0, i - (count - len(out))) : i]
+            target = self._cycles[index]
+            index -= 1
+        if self.cycles != now:
+            self._replay(self._index(now), now)
+        return out
+
+    def trace_log(self, count: int = 16):
+        """
+        Print disassembly of previous instructions, like CPU.fault_log but not limited by the history length.
+        """
+        for pc in self.trace(count):
+            print(self.cpu.iset.dis(self.cpu.bus.plain_memory(pc, pc + 2), pc))
+
+    def _index(self, cycles: int) -> int:
+        """
+        :return: Index of the latest checkpoint at or before given cycles.
+        """
+        return bisect.bisect_right(self._cycles, cycles) - 1
+
+    def _checkpoint(self):
+        now = self.cycles
+        index = self._index(now)
+        if index >= 0 and now < self._cycles[index] + self.interval:
+            return
+        self._checkpoints.insert(
+            index + 1, _Checkpoint(now, snapshot.capture(self.cpu), self._next_event)
+        )
+        self._cycles.insert(index + 1, now)
+        if len(self._checkpoints) > self.max_checkpoints:
+            self._checkpoints.pop(0)
+            self._bounds.pop(self._cycles.pop(0), None)
+
+    def _apply_events(self):
+        now = self.cycles
+        events = self._events
+        while self._next_event < len(events) and events[self._next_event][0] <= now:
+            events[self._next_event][1]()
+            self._next_event += 1
+
+    def _boundaries(self, index: int, end: int) -> typing.Tuple[typing.List[int], typing.List[int]]:
+        """
+        :return: Start cycles and addresses of instructions from checkpoint until end.
+            The machine is left at end, unless the result was cached.
+        """
+        cycles = self._cycles[index]
+        cached = self._bounds.get(cycles)
+        if cached is not None and cached[0] >= end:
+            return cached[1], cached[2]
+
+        starts = []
+        pcs = []
+        self._replay(index, end, starts, pcs)
+        self._bounds[cycles] = end, starts, pcs
+        return starts, pcs
+
+    def _replay(
+        self,
+        index: int,
+        end: int,
+        starts: typing.Optional[typing.List[int]] = None,
+        pcs: typing.Optional[typing.List[int]] = None,
+    ):
+        """
+        Restore a checkpoint and re-execute until end. Events of end are applied too,
+        so the machine is as it was when the instruction at end was about to be executed.
+        If starts is given, instructions are executed one by one and their start cycles and addresses recorded.
+        """
+        cpu = self.cpu
+        clock = cpu.clock
+        checkpoint = self._checkpoints[index]
+        snapshot.restore(cpu, checkpoint.data)
+        self._next_event = checkpoint.events
+
+        # Break points have been handled already when running the first time.
+        breaks, cpu.breaks = cpu.breaks, {}
+        try:
+            while clock.cycles < end:
+                self._apply_events()
+                if starts is not None:
+                    starts.append(clock.cycles)
+                    pcs.append(cpu.pc)
+                    cpu.run(1)
+                else:
+                    stop = end
+                    if self._next_event < len(self._events):
+                        stop = min(stop, self._events[self._next_event][0])
+                    cpu.run(stop - clock.cycles)
+            self._apply_events()
+        finally:
+            cpu.breaks = breaks
@@ -11,8 +11,35 @@ class BusPart:
     def reset(self):
         pass
 
+    def get_state(self) -> typing.Optional[bytes]:
+        """
+        :return: State of the part for snapshots, or None if the part has no state.
+        """
+        return None
+
+    def set_state(self, state: bytes):
+        """
+        Restore state returned by get_state.
+        """
+        pass
+
     def read_address(self, addr: TAddr) -> BusRet:
         raise NotImplementedError()
 
     def write_address(self, addr: TAddr, data: TData):
         raise NotImplementedError()
+
+    def is_plain(self, addr: TAddr) -> bool:
+        """
+        :return: Whether the address is plain memory for this part: reading it has no side effects,
+            and writing the value it already has changes nothing. Parts not handling the address
+            at all are plain for it. Used to find idle loops, see py65xx.idle.
+        """
+        return False
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        """
+        :return: Whether the part answers reads or acts on writes of any address in start..end, inclusive.
+            Used to find ranges handled by RAM only, see py65xx.idioms.
+        """
+        return True
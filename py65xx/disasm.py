@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from .iset65xx import ISet
+    from .profiler import Symbols
+
+from .addressing65xx import aabs, aabsx, aabsy, aind, arel
+from .instructions65xx import fault
+
+HEX = [f"{b:02X}" for b in range(256)]
+_TARGET_ABS = (aabs, aabsx, aabsy, aind)
+
+
+class _Template(typing.NamedTuple):
+    # " MNEMONIC " between address and operand.
+    mnemonic: str
+    length: int
+    # Operand text: constant, "{0}"-template of hex operand, or list of 256 strings for branches.
+    operand: typing.Union[str, typing.List[str]]
+    is_rel: bool
+    is_abs: bool
+    is_fault: bool
+
+
+class Disassembler:
+    """
+    Disassembler using precomputed per-opcode templates.
+    Output is same as ISet.dis gives, plus optional labels.
+
+    Memory is anything indexable with an address: a Bus, RAM.mem, bytes, etc.
+    Direct memory is fastest, as a Bus is read one byte at time through all the parts.
+
+    Formatted lines are cached by address, and reused if the instruction bytes are the same.
+    """
+
+    def __init__(self, iset: ISet):
+        self._templates: typing.List[_Template] = []
+        for instr, addressing, length, _ in iset.iset:
+            if addressing is arel:
+                operand = [addressing.dis(h) for h in HEX]
+            else:
+                operand = addressing.dis("{0}")
+            self._templates.append(
+                _Template(
+                    f" {instr.__name__.upper()} ",
+                    length,
+                    operand,
+                    addressing is arel,
+                    addressing in _TARGET_ABS,
+                    instr is fault,
+                )
+            )
+        # Address to (instruction bytes, line).
+        self._cache: typing.Dict[int, typing.Tuple[tuple, str]] = {}
+
+    def clear(self):
+        self._cache.clear()
+
+    def line(self, mem, addr: int) -> typing.Tuple[str, int]:
+        """
+        :return: Disassembly of one instruction and its length.
+
+        >>> from py65xx.iset65xx import ISet
+        >>> mem = bytearray(0x10000)
+        >>> mem[0xFFFE:], mem[0] = b"\\x4C\\x34", 0x12
+        >>> Disassembler(ISet()).line(mem, 0xFFFE)
+        ('$FFFE JMP $1234      4C 34 12', 3)
+        """
+        b = mem[addr]
+        if b is None:
+            return f"${addr:04X} None", 1
+        if callable(b):
+            return f"${addr:04X} <native {getattr(b, '__name__', '?')}>", 1
+
+        t = self._templates[b]
+        length = t.length
+        if length == 1:
+            raw = (b,)
+        elif length == 2:
+            raw = (b, mem[(addr + 1) & 0xFFFF])
+        else:
+            # Operand wraps to start of memory like the CPU reads it.
+            raw = (b, mem[(addr + 1) & 0xFFFF], mem[(addr + 2) & 0xFFFF])
+
+        cached = self._cache.get(addr)
+        if cached is not None and cached[0] == raw:
+            return cached[1], length
+
+        if length == 1:
+            operand = t.operand
+        elif t.is_rel:
+            operand = t.operand[raw[1]]
+        elif length == 2:
+            operand = t.operand.format(HEX[raw[1]])
+        else:
+            operand = t.operand.format(HEX[raw[2]] + HEX[raw[1]])
+        body = f"${addr:04X}{t.mnemonic}{operand}"
+        bs = " ".join([HEX[x] for x in raw])
+        if t.is_fault:
+            bs += " " + str(b)
+        text = f"{body:20} {bs}"
+        self._cache[addr] = raw, text
+        return text, length
+
+    def disassemble(
+        self,
+        mem,
+        start: int,
+        end: typing.Optional[int] = None,
+        symbols: typing.Optional[Symbols] = None,
+    ) -> typing.Iterator[typing.Tuple[int, str]]:
+        """
+        Disassemble instructions starting from start until end (inclusive), or forever.
+
+        :param symbols: If given, labels are given as own lines with address of the label,
+            and branch and absolute targets having a label are commented.
+        :return: Address and line of each instruction.
+        """
+        addr = start
+        while end is None or addr <= end:
+            text, length = self.line(mem, addr)
+            if symbols is not None:
+                label = symbols.label(addr)
+                if label is not None:
+                    yield addr, f"{label}:"
+                target = self._target(mem, addr)
+                if target is not None:
+                    name = symbols.label(target)
+                    if name is not None:
+                        text = f"{text:32} ; {name}"
+            yield addr, text
+            addr += length
+
+    def _target(self, mem, addr: int) -> typing.Optional[int]:
+        b = mem[addr]
+        if b is None or callable(b):
+            return None
+        t = self._templates[b]
+        if t.is_rel:
+            rel = mem[(addr + 1) & 0xFFFF]
+            return (addr + 2 + (rel - 0x100 if rel >= 0x80 else rel)) & 0xFFFF
+        if t.is_abs:
+            return mem[(addr + 1) & 0xFFFF] | mem[(addr + 2) & 0xFFFF] << 8
+        return None
+
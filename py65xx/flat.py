@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import typing
+
+from . import snapshot
+from .clock import Clock
+from .cpu65xx import CPU
+from .defs import TAddr, TData
+from .statelog import Log
+
+MEM_SIZE = 0x10000
+# Effective addresses are not wrapped by the addressing modes, e.g. $FFFF,X. Like with Bus,
+# such reads give zero and writes are ignored, so the memory has a tail that is never written.
+_TAIL = 0x200
+
+IOReader = typing.Callable[[TAddr], TData]
+IOWriter = typing.Callable[[TAddr, TData], None]
+
+
+class FlatBus:
+    """
+    Bus replacement for machines without banking: one flat 64 KB memory,
+    and optional I/O hooks for a few declared addresses.
+
+    Provides the parts of Bus interface the CPU uses. There are no bus parts,
+    so bus level coverage, tracing and breakpoints are not available.
+    """
+
+    __slots__ = (
+        "mem",
+        "pc",
+        "fault_handler",
+        "log",
+        "read",
+        "write",
+        "_initial",
+        "_io_read",
+        "_io_write",
+    )
+
+    def __init__(self, data: bytes = b"", start: TAddr = 0):
+        """
+        :param data: Initial memory contents, also restored on reset.
+        :param start: Address of data.
+        """
+        if start + len(data) > MEM_SIZE:
+            raise ValueError(f"Data of {len(data)} bytes does not fit at ${start:04X}")
+        self._initial = (start, bytes(data))
+        self.mem = bytearray(MEM_SIZE + _TAIL)
+        self.mem[start : start + len(data)] = data
+        # Copy of CPU program counter.
+        self.pc = 0
+        self.fault_handler = None
+        # Set by the CPU, bus access logging is not supported.
+        self.log = None
+        self._io_read: typing.Dict[TAddr, IOReader] = {}
+        self._io_write: typing.Dict[TAddr, IOWriter] = {}
+        self.read = self._read
+        self.write = self._write
+
+    def add_io(
+        self,
+        addr: TAddr,
+        read: typing.Optional[IOReader] = None,
+        write: typing.Optional[IOWriter] = None,
+    ):
+        """
+        Call given functions for reads and/or writes of the address instead of accessing memory.
+        Accesses of other addresses cost one dict lookup more once any hooks are added.
+        """
+        if read is not None:
+            self._io_read[addr] = read
+            self.read = self._read_io
+        if write is not None:
+            self._io_write[addr] = write
+            self.write = self._write_io
+
+    def _read(self, addr: TAddr, silent=False) -> TData:
+        return self.mem[addr]
+
+    def _write(self, addr: TAddr, data: TData):
+        if addr < MEM_SIZE:
+            self.mem[addr] = data
+
+    def _read_io(self, addr: TAddr, silent=False) -> TData:
+        hook = self._io_read.get(addr)
+        if hook is not None:
+            return hook(addr)
+        return self.mem[addr]
+
+    def _write_io(self, addr: TAddr, data: TData):
+        hook = self._io_write.get(addr)
+        if hook is not None:
+            hook(addr, data)
+        elif addr < MEM_SIZE:
+            self.mem[addr] = data
+
+    def is_plain(self, addr: TAddr) -> bool:
+        """
+        :return: Whether the address is memory without I/O hooks. See BusPart.is_plain.
+
+        >>> bus = FlatBus()
+        >>> bus.add_io(0xD012, read=lambda addr: 0)
+        >>> bus.is_plain(0xD012), bus.is_plain(0xD013)
+        (False, True)
+        """
+        return addr not in self._io_read and addr not in self._io_write
+
+    def plain_memory(self, start: TAddr, end: TAddr) -> bytearray:
+        """
+        :return: The memory, which indexing the bus reads anyway. See Bus.plain_memory.
+        """
+        return self.mem
+
+    def load(self, addr: TAddr, data: bytes):
+        self.mem[addr : addr + len(data)] = data
+
+    @property
+    def parts(self) -> typing.Sequence:
+        return ()
+
+    @property
+    def enabled(self) -> typing.Sequence[bool]:
+        return ()
+
+    def get_state(self) -> bytes:
+        return bytes(self.mem[:MEM_SIZE])
+
+    def set_state(self, state: bytes):
+        self.mem[:MEM_SIZE] = state
+
+    def reset(self):
+        start, data = self._initial
+        self.mem[:] = bytes(len(self.mem))
+        self.mem[start : start + len(data)] = data
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return list(self.mem[item])
+        return self.mem[item]
+
+
+class FlatCPU(CPU):
+    """
+    CPU with an execution loop reading instructions directly from FlatBus memory.
+
+    The loop leaves out everything not needed in plain runs. When profiling, coverage, tracing,
+    translated blocks, idle skipping, idioms, breakpoints, stepping or instruction logging is enabled,
+    the normal CPU.run is used instead.
+    """
+
+    __slots__ = ()
+
+    def run(self, cycles: int = -1, step=False):
+        if (
+            step
+            or self.breaks
+            or self.profiler is not None
+            or self.coverage is not None
+            or self.tracer is not None
+            or self.aot is not None
+            or self.idle is not None
+            or self.idioms is not None
+            or self.log.per_instruction
+        ):
+            return super().run(cycles, step)
+
+        self.bus.fault_handler = self.fault_log
+        mem = self.bus.mem
+        clock = self.clock
+        wait = clock.wait_cycle
+        iset = self.iset.iset
+        history = self.history
+        end_cycles = clock.cycles + cycles
+        try:
+            while cycles < 0 or clock.cycles < end_cycles:
+                if self.irq:
+                    self.handle_irq()
+
+                self.spc = pc = self.pc
+                history.append(pc)
+                self.data_val = None
+                self.cmd_val = cmd = mem[pc]
+                self.pc = pc + 1
+                wait()
+
+                instruction, addressing, _, _ = iset[cmd]
+                self.save = addressing(self)
+                instruction(self)
+
+        except StopIteration:
+            print("<break>")
+            return 2
+        except KeyboardInterrupt:
+            print("<stop>")
+            return 1
+        return 0
+
+
+class FlatMachine:
+    """
+    Bare 6502 with flat memory, e.g. for conformance tests, fuzzing and benchmarks.
+    """
+
+    def __init__(
+        self,
+        data: bytes = b"",
+        start: TAddr = 0,
+        two_mhz: bool = False,
+        history_length: int = 5,
+        log: typing.Optional[Log] = None,
+    ):
+        """
+        :param data: Initial memory contents.
+        :param start: Address of data.
+        :param log: Debug logging switches of the machine.
+        """
+        self.bus = FlatBus(data, start)
+        self.clock = clock = Clock(two_mhz)
+        self.cpu = cpu = FlatCPU(self.bus, clock, history_length, log)
+        clock.cpu = cpu
+
+    @property
+    def mem(self) -> bytearray:
+        return self.bus.mem
+
+    def reset(self):
+        self.bus.reset()
+        self.cpu.reset()
+
+    def run(self, cycles: int = -1) -> int:
+        return self.cpu.run(cycles)
+
+    def snapshot(self) -> bytes:
+        return snapshot.capture(self.cpu)
+
+    def restore(self, data: bytes):
+        snapshot.restore(self.cpu, data)
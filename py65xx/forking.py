@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import gc
+import os
+import pickle
+import selectors
+import signal
+import sys
+import traceback
+import typing
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+
+
+class ForkError(Exception):
+    pass
+
+
+def _child(func: typing.Callable[[T], R], item: T, fd: int):
+    try:
+        data = pickle.dumps((True, func(item)))
+    except BaseException:
+        data = pickle.dumps((False, traceback.format_exc()))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        # Skip all cleanup of the parent state, e.g. atexit handlers and open files.
+        os._exit(0)
+
+
+def fork_map(
+    func: typing.Callable[[T], R],
+    items: typing.Iterable[T],
+    jobs: typing.Optional[int] = None,
+) -> typing.Iterator[typing.Tuple[int, R]]:
+    """
+    Call func for each item in a child process forked from the current process.
+
+    Each child starts with the state the process has when the child is forked, e.g. a machine
+    halted at some point, and memory is shared copy-on-write: a child costs only the pages it writes.
+    The machine must not be run by the caller while iterating, as children are forked lazily.
+    Results are pickled back to the parent.
+
+    Available only where os.fork is, i.e. not on Windows.
+
+    :param func: Function to call with an item. Its return value must be picklable.
+    :param items: Items to map.
+    :param jobs: Maximum count of children running at once. Default is count of CPUs.
+    :return: Iterator of (index of item, result) in order of completion.
+    :raises ForkError: If func raised, or a child died without result.
+        Remaining children are killed.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    pending = iter(enumerate(items))
+    # Read end of result pipe to (pid, item index, data read so far).
+    running: typing.Dict[int, typing.Tuple[int, int, typing.List[bytes]]] = {}
+    selector = selectors.DefaultSelector()
+
+    # Garbage collection would touch every object, copying the shared pages in all children.
+    gc.collect()
+    gc.freeze()
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and len(running) < jobs:
+                entry = next(pending, None)
+                if entry is None:
+                    exhausted = True
+                    break
+                index, item = entry
+                read_fd, write_fd = os.pipe()
+                # Buffered output would be written by both processes.
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    os.close(read_fd)
+                    _child(func, item, write_fd)
+                os.close(write_fd)
+                running[read_fd] = (pid, index, [])
+                selector.register(read_fd, selectors.EVENT_READ)
+
+            if not running:
+                break
+
+            for key, _ in selector.select():
+                fd = key.fd
+                pid, index, chunks = running[fd]
+                chunk = os.read(fd, 1 << 16)
+                if chunk:
+                    chunks.append(chunk)
+                    continue
+
+                selector.unregister(fd)
+                os.close(fd)
+                del running[fd]
+                os.waitpid(pid, 0)
+                if not chunks:
+                    raise ForkError(f"Child for item {index} exited without result")
+                ok, value = pickle.loads(b"".join(chunks))
+                if not ok:
+                    raise ForkError(f"Child for item {index} failed:\n{value}")
+                yield index, value
+    finally:
+        for fd, (pid, _, _) in running.items():
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            os.close(fd)
+        selector.close()
+        gc.unfreeze()
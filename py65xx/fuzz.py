@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import random
+import typing
+
+from .bus import RAM, Bus
+from .clock import Clock
+from .cpu65xx import CPU
+from .flat import MEM_SIZE, FlatMachine
+from .instructions65xx import fault, jam
+from .iset65xx import ISet
+
+# Case code is placed here, and followed by a JAM which ends the case.
+CODE_ADDR = 0x0200
+# BRK vector points to a JAM, so BRK ends the case too.
+BRK_HALT = 0xFFF0
+# Flags making up a coverage feature with the opcode: N, V, D, Z and C.
+FEATURE_FLAGS = 0xCB
+MAX_CODE = 32
+
+_ISET = ISet()
+VALID_OPCODES = [op for op in range(256) if _ISET[op][0] not in (fault, jam)]
+
+
+class Case(typing.NamedTuple):
+    """
+    Initial state of a fuzz case. Memory is zero except for zero page, stack page, code and vectors.
+    """
+
+    code: bytes
+    zero_page: bytes
+    stack: bytes
+    a: int
+    x: int
+    y: int
+    sp: int
+    p: int
+
+    def image(self) -> bytes:
+        mem = bytearray(MEM_SIZE)
+        mem[0:0x100] = self.zero_page
+        mem[0x100:0x200] = self.stack
+        mem[CODE_ADDR : CODE_ADDR + len(self.code)] = self.code
+        mem[CODE_ADDR + len(self.code)] = 0x02
+        mem[BRK_HALT] = 0x02
+        mem[0xFFFE] = BRK_HALT & 0xFF
+        mem[0xFFFF] = BRK_HALT >> 8
+        return bytes(mem)
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return dict(
+            code=self.code.hex(),
+            zero_page=self.zero_page.hex(),
+            stack=self.stack.hex(),
+            a=self.a,
+            x=self.x,
+            y=self.y,
+            sp=self.sp,
+            p=self.p,
+        )
+
+    @classmethod
+    def from_dict(cls, d: typing.Dict[str, typing.Any]) -> Case:
+        return cls(
+            bytes.fromhex(d["code"]),
+            bytes.fromhex(d["zero_page"]),
+            bytes.fromhex(d["stack"]),
+            d["a"],
+            d["x"],
+            d["y"],
+            d["sp"],
+            d["p"],
+        )
+
+
+class State(typing.NamedTuple):
+    """
+    Final state of a case.
+    """
+
+    pc: int
+    sp: int
+    p: int
+    a: int
+    x: int
+    y: int
+    brk: bool
+    cycles: int
+    halted: bool
+    mem: bytes
+
+    def diff(self, other: State) -> typing.List[str]:
+        """
+        :return: Descriptions of the differences, other being the reference.
+        """
+        out = []
+        for name in State._fields[:-1]:
+            mine, ref = getattr(self, name), getattr(other, name)
+            if mine != ref:
+                out.append(f"{name}: {mine!r}, expected {ref!r}")
+        if self.mem != other.mem:
+            addrs = [i for i in range(MEM_SIZE) if self.mem[i] != other.mem[i]]
+            shown = ", ".join(f"${i:04X}=${self.mem[i]:02X}/${other.mem[i]:02X}" for i in addrs[:8])
+            out.append(f"memory differs at {len(addrs)} addresses: {shown}")
+        return out
+
+
+# Final state, or error raised by the engine.
+Result = typing.Union[State, str]
+
+
+def _random_bytes(rng: random.Random, n: int) -> bytes:
+    return rng.getrandbits(8 * n).to_bytes(n, "little")
+
+
+def random_case(rng: random.Random) -> Case:
+    code = bytearray()
+    for _ in range(rng.randint(1, 8)):
+        opcode = rng.choice(VALID_OPCODES)
+        code.append(opcode)
+        code += _random_bytes(rng, _ISET[opcode][2] - 1)
+    return Case(
+        bytes(code[:MAX_CODE]),
+        _random_bytes(rng, 0x100),
+        _random_bytes(rng, 0x100),
+        rng.getrandbits(8),
+        rng.getrandbits(8),
+        rng.getrandbits(8),
+        rng.getrandbits(8),
+        rng.getrandbits(8) | 0x30,
+    )
+
+
+def mutate(case: Case, rng: random.Random) -> Case:
+    """
+    :return: Case with one random change: code bytes, registers or memory.
+    """
+    kind = rng.randrange(6)
+    if kind == 0:
+        code = bytearray(case.code)
+        code[rng.randrange(len(code))] = rng.getrandbits(8)
+        return case._replace(code=bytes(code))
+    if kind == 1 and len(case.code) < MAX_CODE:
+        # Insert an instruction.
+        opcode = rng.choice(VALID_OPCODES)
+        insn = bytes([opcode]) + _random_bytes(rng, _ISET[opcode][2] - 1)
+        pos = rng.randint(0, len(case.code))
+        return case._replace(code=(case.code[:pos] + insn + case.code[pos:])[:MAX_CODE])
+    if kind == 2 and len(case.code) > 1:
+        pos = rng.randrange(len(case.code))
+        return case._replace(code=case.code[:pos] + case.code[pos + 1 :])
+    if kind == 3:
+        field = rng.choice(("a", "x", "y", "sp"))
+        return case._replace(**{field: rng.getrandbits(8)})
+    if kind == 4:
+        return case._replace(p=case.p ^ (1 << rng.randrange(8)) | 0x30)
+    field = rng.choice(("zero_page", "stack"))
+    data = bytearray(getattr(case, field))
+    data[rng.randrange(len(data))] = rng.choice((0, 0x7F, 0x80, 0xFF, rng.getrandbits(8)))
+    return case._replace(**{field: bytes(data)})
+
+
+def _setup(cpu: CPU, case: Case):
+    cpu.pc = CODE_ADDR
+    cpu.sp = case.sp
+    cpu.p.val = case.p
+    cpu.A, cpu.X, cpu.Y = case.a, case.x, case.y
+    cpu.check_stuck = True
+
+
+def _state(cpu: CPU, clock: Clock, halted: bool, mem: bytes) -> State:
+    return State(cpu.pc, cpu.sp, cpu.p.val, cpu.A, cpu.X, cpu.Y, cpu.irq == CPU.IRQ.BRK, clock.cycles, halted, mem)
+
+
+def _error(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def run_reference(case: Case, cycles: int) -> typing.Tuple[Result, typing.Set[int]]:
+    """
+    Run the case with the interpreter on a generic Bus with RAM, one instruction at a time.
+
+    :return: Final state or error, and coverage features: opcode << 8 | FEATURE_FLAGS of status before it.
+    """
+    bus = Bus()
+    ram = RAM()
+    bus.register(ram)
+    bus.mem = ram.mem
+    ram.write_block(0, case.image())
+    clock = Clock()
+    cpu = CPU(bus, clock)
+    clock.cpu = cpu
+    _setup(cpu, case)
+
+    features = set()
+    halted = False
+    try:
+        while clock.cycles < cycles:
+            if not cpu.irq:
+                features.add(bus.read(cpu.pc, silent=True) << 8 | cpu.p.val & FEATURE_FLAGS)
+            if cpu.run(1) != 0:
+                halted = True
+                break
+    except Exception as e:
+        return _error(e), features
+    return _state(cpu, clock, halted, ram.mem.tobytes()), features
+
+
+def run_flat(case: Case, cycles: int) -> Result:
+    machine = FlatMachine(case.image())
+    _setup(machine.cpu, case)
+    try:
+        halted = machine.run(cycles) != 0
+    except Exception as e:
+        return _error(e)
+    return _state(machine.cpu, machine.clock, halted, bytes(machine.mem[:MEM_SIZE]))
+
+
+def run_vector(cases: typing.Sequence[Case], cycles: int) -> typing.List[Result]:
+    """
+    Run the cases together on py65xx.vector.VectorMachine. Requires numpy.
+    """
+    import numpy
+
+    from .vector import HALTED, VectorMachine
+
+    vm = VectorMachine(len(cases), check_stuck=True)
+    for i, case in enumerate(cases):
+        vm.mem[i, :MEM_SIZE] = numpy.frombuffer(case.image(), dtype=numpy.uint8)
+        vm.pc[i], vm.sp[i], vm.p[i] = CODE_ADDR, case.sp, case.p
+        vm.a[i], vm.x[i], vm.y[i] = case.a, case.x, case.y
+    vm.run(cycles)
+    return [
+        State(
+            int(vm.pc[i]),
+            int(vm.sp[i]),
+            int(vm.p[i]),
+            int(vm.a[i]),
+            int(vm.x[i]),
+            int(vm.y[i]),
+            bool(vm.brk[i]),
+            int(vm.cycles[i]),
+            bool(vm.status[i] == HALTED),
+            vm.mem[i, :MEM_SIZE].tobytes(),
+        )
+        for i in range(len(cases))
+    ]
+
+
+ENGINES: typing.Dict[str, typing.Callable[[typing.Sequence[Case], int], typing.List[Result]]] = {
+    "flat": lambda cases, cycles: [run_flat(case, cycles) for case in cases],
+    "vector": run_vector,
+}
+
+
+def check(
+    engine: str, cases: typing.Sequence[Case], cycles: int
+) -> typing.List[typing.Tuple[typing.Set[int], typing.List[str]]]:
+    """
+    Run cases on the engine and the reference.
+
+    :return: Coverage features and differences to the reference of each case.
+    """
+    results = ENGINES[engine](cases, cycles)
+    out = []
+    for case, result in zip(cases, results):
+        ref, features = run_reference(case, cycles)
+        if not isinstance(ref, State):
+            # Reference has no defined result, e.g. a branch taking PC below zero.
+            diff = []
+        elif isinstance(result, State):
+            diff = result.diff(ref)
+        else:
+            diff = [f"raised {result}"]
+        out.append((features, diff))
+    return out
+
+
+def minimize(case: Case, fails: typing.Callable[[Case], bool]) -> Case:
+    """
+    Simplify a failing case while it keeps failing: drop code bytes, clear memory and registers.
+    """
+
+    def attempt(candidate: Case) -> bool:
+        nonlocal case
+        if candidate != case and fails(candidate):
+            case = candidate
+            return True
+        return False
+
+    changed = True
+    while changed:
+        changed = False
+        pos = 0
+        while pos < len(case.code) and len(case.code) > 1:
+            if not attempt(case._replace(code=case.code[:pos] + case.code[pos + 1 :])):
+                pos += 1
+            else:
+                changed = True
+        for field in ("zero_page", "stack"):
+            data = getattr(case, field)
+            if attempt(case._replace(**{field: bytes(len(data))})):
+                changed = True
+                continue
+            # Clear halves, then single bytes.
+            for size in (128, 64, 16, 1):
+                for start in range(0, len(data), size):
+                    data = getattr(case, field)
+                    if any(data[start : start + size]):
+                        cleared = data[:start] + bytes(size) + data[start + size :]
+                        changed |= attempt(case._replace(**{field: cleared}))
+        for field, simple in (("a", 0), ("x", 0), ("y", 0), ("sp", 0xFF), ("p", 0x30)):
+            if getattr(case, field) != simple:
+                changed |= attempt(case._replace(**{field: simple}))
+    return case
+
+
+def disassemble(case: Case) -> typing.List[str]:
+    return _ISET.dis(case.image(), CODE_ADDR, CODE_ADDR + len(case.code) - 1)
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from .cpu65xx import CPU
+
+from .bus import RAM
+
+# Longest loop body recognized, in instructions.
+MAX_INSNS = 12
+# Backwards jumps to a loop start before trying again a loop which could not be run natively.
+RETRY = 64
+
+_LOAD, _STORE, _STEP, _COMPARE, _TRANSFER = range(5)
+
+
+class _Op(typing.NamedTuple):
+    kind: int
+    name: str
+    # Index register of the addressing, or register stepped, compared or transferred.
+    reg: str
+    # Addressing: "#" immediate, "abs" absolute indexed, "ind" indirect indexed, "" implied.
+    mode: str
+    # Cycles taken by the interpreter.
+    cycles: int
+
+
+_OPCODES = {
+    0xA9: _Op(_LOAD, "LDA", "", "#", 2),
+    0xBD: _Op(_LOAD, "LDA", "X", "abs", 4),
+    0xB9: _Op(_LOAD, "LDA", "Y", "abs", 4),
+    0xB1: _Op(_LOAD, "LDA", "Y", "ind", 4),
+    0x9D: _Op(_STORE, "STA", "X", "abs", 4),
+    0x99: _Op(_STORE, "STA", "Y", "abs", 4),
+    0x91: _Op(_STORE, "STA", "Y", "ind", 4),
+    0xE8: _Op(_STEP, "INX", "X", "", 2),
+    0xC8: _Op(_STEP, "INY", "Y", "", 2),
+    0xCA: _Op(_STEP, "DEX", "X", "", 2),
+    0x88: _Op(_STEP, "DEY", "Y", "", 2),
+    0xE0: _Op(_COMPARE, "CPX", "X", "#", 2),
+    0xC0: _Op(_COMPARE, "CPY", "Y", "#", 2),
+    0x8A: _Op(_TRANSFER, "TXA", "X", "", 1),
+    0x98: _Op(_TRANSFER, "TYA", "Y", "", 1),
+}
+_BNE = 0xD0
+_BNE_CYCLES = 1
+_LENGTH = {"#": 2, "ind": 2, "abs": 3, "": 1}
+
+
+class _Insn(typing.NamedTuple):
+    op: _Op
+    # Immediate value, absolute address or zero page address of the pointer.
+    operand: int
+
+    def __str__(self):
+        op = self.op
+        if op.mode == "#":
+            return f"{op.name} #${self.operand:02X}"
+        if op.mode == "abs":
+            return f"{op.name} ${self.operand:04X},{op.reg}"
+        if op.mode == "ind":
+            return f"{op.name} (${self.operand:02X}),Y"
+        return op.name
+
+
+class Shape(typing.NamedTuple):
+    """
+    Recognized copy or fill loop: loads and stores indexed by one register, one step of the register,
+    optional compare and transfer of the register, and BNE back to the start.
+    """
+
+    start: int
+    # Address after the BNE.
+    end: int
+    # Code of the loop, to see that it has not changed.
+    code: bytes
+    reg: str
+    step: int
+    # Loads and stores, in order.
+    moves: typing.Tuple[_Insn, ...]
+    # Whether the loads and stores come after the step, and see the stepped index.
+    after_step: bool
+    # Immediate value of CPX/CPY, if any.
+    compare: typing.Optional[int]
+    # Whether the loop ends with TXA/TYA, giving A the index.
+    transfer: bool
+    # Whether N and Z come from the compare instead of the index itself.
+    flags_by_compare: bool
+    cycles: int
+    text: str
+
+    @property
+    def kind(self) -> str:
+        return "copy" if any(m.op.kind == _LOAD and m.op.mode != "#" for m in self.moves) else "fill"
+
+
+def decode(read: typing.Callable[[int], int], start: int) -> typing.Optional[Shape]:
+    """
+    Recognize a copy or fill loop.
+
+    :param read: Reads a byte of code without side effects.
+    :param start: Address the loop branches back to.
+    """
+    addr = start
+    code = bytearray()
+    insns: typing.List[_Insn] = []
+    step = None
+    for _ in range(MAX_INSNS):
+        opcode = read(addr)
+        if opcode == _BNE:
+            rel = read(addr + 1)
+            if addr + 2 + (rel - 0x100 if rel >= 0x80 else rel) != start:
+                return None
+            code += bytes((opcode, rel))
+            break
+        op = _OPCODES.get(opcode)
+        if op is None:
+            return None
+        length = _LENGTH[op.mode]
+        operand = 0
+        code.append(opcode)
+        if length > 1:
+            operand = read(addr + 1)
+            code.append(operand)
+        if length > 2:
+            hi = read(addr + 2)
+            operand |= hi << 8
+            code.append(hi)
+        insns.append(_Insn(op, operand))
+        if op.kind == _STEP:
+            if step is not None:
+                return None
+            step = op
+        addr += length
+    else:
+        return None
+    if step is None:
+        return None
+
+    # Check the shape is one that can be done in bulk.
+    reg = step.reg
+    step_at = next(i for i, insn in enumerate(insns) if insn.op is step)
+    moves = tuple(insn for insn in insns if insn.op.kind in (_LOAD, _STORE))
+    memory = [i for i, insn in enumerate(insns) if insn.op.kind in (_LOAD, _STORE) and insn.op.mode != "#"]
+    loads = [i for i, insn in enumerate(insns) if insn.op.kind == _LOAD]
+    stores = [i for i, insn in enumerate(insns) if insn.op.kind == _STORE]
+    compares = [i for i, insn in enumerate(insns) if insn.op.kind == _COMPARE]
+    transfers = [i for i, insn in enumerate(insns) if insn.op.kind == _TRANSFER]
+    if not stores or len(compares) > 1 or len(transfers) > 1:
+        return None
+    if any(insns[i].op.reg != reg for i in memory + compares + transfers):
+        return None
+    # All memory accesses see the same index.
+    if not (all(i < step_at for i in memory) or all(i > step_at for i in memory)):
+        return None
+    # Flags at BNE must come from the index: the step, or a compare or transfer after it.
+    flags = max(loads + [step_at] + compares + transfers)
+    if insns[flags].op.kind == _LOAD or any(i < step_at for i in compares + transfers):
+        return None
+    # Stored values must not depend on the index or the previous iteration.
+    if loads and min(stores) < min(loads) or transfers and (not loads or max(stores) > transfers[0]):
+        return None
+
+    return Shape(
+        start,
+        addr + 2,
+        bytes(code),
+        reg,
+        1 if step.name.startswith("IN") else -1,
+        moves,
+        memory[0] > step_at,
+        insns[compares[0]].operand if compares else None,
+        bool(transfers),
+        insns[flags].op.kind == _COMPARE,
+        sum(insn.op.cycles for insn in insns) + _BNE_CYCLES,
+        "; ".join([str(insn) for insn in insns] + [f"BNE ${start:04X}"]),
+    )
+
+
+def _spans(first: int, count: int, step: int) -> typing.List[typing.Tuple[int, int]]:
+    """
+    :return: Index values first, first + step, ... (count of them, wrapping at 256) as inclusive ranges.
+    """
+    if step > 0:
+        last = first + count - 1
+        if last <= 0xFF:
+            return [(first, last)]
+        return [(first, 0xFF), (0, last - 0x100)]
+    last = first - count + 1
+    if last >= 0:
+        return [(last, first)]
+    return [(0, first), (last + 0x100, 0xFF)]
+
+
+def _overlap(ranges: typing.List[typing.Tuple[int, int]], start: int, end: int) -> bool:
+    return any(s <= end and start <= e for s, e in ranges)
+
+
+class Site(typing.NamedTuple):
+    shape: Shape
+    fires: int
+    iterations: int
+    cycles: int
+
+
+class Idioms:
+    """
+    Native execution of copy and fill loops, e.g. `LDA (src),Y / STA (dst),Y / INY / BNE`. See CPU.idioms.
+
+    When the program counter jumps back to the start of a recognized loop (see decode),
+    the rest of the loop is done as slice copies and fills on RAM, and the clock is advanced
+    by the cycles the iterations would have taken. Registers, flags and cycles end up as if
+    the loop was run. The loop is run normally when it reads or writes anything else than RAM,
+    its writes overlap its reads, its pointers or code, or a clocked device has an event
+    before the loop would end; in the last case the iterations before the event are done natively.
+    """
+
+    __slots__ = ("sites", "_cache")
+
+    def __init__(self):
+        # Statistics by loop start address: shape, count of native runs, iterations and cycles.
+        self.sites: typing.Dict[int, Site] = {}
+        # Decoded loop (or None) by start address, and backwards jumps to wait before trying again.
+        self._cache: typing.Dict[int, typing.List[typing.Any]] = {}
+
+    def backward(self, cpu: CPU, end: int):
+        """
+        Called by CPU.run when the program counter did not advance, i.e. after a jump backwards.
+
+        :param end: Cycle count the run ends at, or -1 if it does not end.
+        """
+        pc = cpu.pc
+        entry = self._cache.get(pc)
+        if entry is not None and entry[1] > 0:
+            entry[1] -= 1
+            return
+        bus = cpu.bus
+
+        def read(addr: int) -> int:
+            return bus.read(addr, silent=True)
+
+        shape = entry[0] if entry is not None else None
+        if shape is None or bytes(read(a) for a in range(shape.start, shape.end)) != shape.code:
+            shape = decode(read, pc)
+            entry = self._cache[pc] = [shape, 0]
+        if shape is None:
+            entry[1] = RETRY
+        elif not cpu.irq and self._run(cpu, shape, end) is False:
+            entry[1] = RETRY
+
+    def _run(self, cpu: CPU, shape: Shape, end: int) -> typing.Optional[bool]:
+        """
+        :return: True if run, False if the loop can not be run natively, None if not now.
+        """
+        bus = cpu.bus
+        ram = next((p for p in bus.parts if isinstance(p, RAM) and p.mem is bus.mem), None)
+        if ram is None:
+            return False
+        index = cpu._X if shape.reg == "X" else cpu._Y
+        # Value of the index ending the loop, by flags of the compare or of the index itself.
+        target = shape.compare if shape.flags_by_compare else 0
+        count = (target - index) * shape.step % 0x100 or 0x100
+
+        # Iterations done before the end of the run, or an event of a device.
+        clock = cpu.clock
+        limit = clock.next_event()
+        if end >= 0 and (limit is None or end - clock.cycles < limit):
+            limit = end - clock.cycles
+        if limit is not None:
+            count = min(count, limit // shape.cycles)
+        if count < 2:
+            return None
+
+        first = (index + shape.step) % 0x100 if shape.after_step else index
+        spans = _spans(first, count, shape.step)
+        mem = bus.mem
+        # Base addresses of the moves, and the ranges accessed.
+        bases = []
+        reads = [(shape.start, shape.end - 1)]
+        writes = []
+        for move in shape.moves:
+            op = move.op
+            if op.mode == "#":
+                bases.append(None)
+                continue
+            if op.mode == "ind":
+                zp = move.operand
+                if not bus.only_part(ram, zp, zp + 1):
+                    return False
+                reads.append((zp, zp + 1))
+                base = mem[zp] | mem[zp + 1] << 8
+            else:
+                base = move.operand
+            bases.append(base)
+            for lo, hi in spans:
+                if not bus.only_part(ram, base + lo, base + hi):
+                    return False
+                if op.kind == _STORE:
+                    if _overlap(writes, base + lo, base + hi):
+                        return False
+                    writes.append((base + lo, base + hi))
+                else:
+                    reads.append((base + lo, base + hi))
+        if any(_overlap(reads, s, e) for s, e in writes):
+            return False
+
+        # Stores in order. As nothing written is read, order of iterations does not matter.
+        view = memoryview(mem)
+        a = cpu._A
+        source = None
+        for move, base in zip(shape.moves, bases):
+            if move.op.kind == _LOAD:
+                source = base
+                if base is None:
+                    a = move.operand
+                continue
+            for lo, hi in spans:
+                if source is None:
+                    data = bytes((a,)) * (hi - lo + 1)
+                else:
+                    data = view[source + lo : source + hi + 1].tobytes()
+                ram.write_block(base + lo, data)
+        if source is not None:
+            # Value loaded by the last iteration.
+            last = (first + (count - 1) * shape.step) % 0x100
+            a = mem[source + last]
+
+        index = (index + count * shape.step) % 0x100
+        if shape.transfer:
+            a = index
+        p = cpu.p.val
+        value = index
+        if shape.compare is not None:
+            p = p & 0xFE | (index >= shape.compare)
+            if shape.flags_by_compare:
+                value = (index - shape.compare) & 0xFF
+        cpu.p.val = p & 0x7D | value & 0x80 | (0x02 if value == 0 else 0)
+        cpu._A = a
+        if shape.reg == "X":
+            cpu._X = index
+        else:
+            cpu._Y = index
+        done = (target - index) % 0x100 == 0
+        if done:
+            cpu.pc = shape.end
+        clock.skip(count * shape.cycles)
+
+        site = self.sites.get(shape.start)
+        if site is None or site.shape != shape:
+            site = Site(shape, 0, 0, 0)
+        self.sites[shape.start] = Site(
+            shape, site.fires + 1, site.iterations + count, site.cycles + count * shape.cycles
+        )
+        return True
+
+    def report(self, top: int = 20):
+        """
+        Print the loops run natively, by cycles.
+        """
+        print("Native loops:")
+        print(f"{'cycles':>12} {'runs':>8} {'iterations':>10}  loop")
+        sites = sorted(self.sites.values(), key=lambda s: s.cycles, reverse=True)
+        for site in sites[:top]:
+            shape = site.shape
+            print(f"{site.cycles:12} {site.fires:8} {site.iterations:10}  ${shape.start:04X} {shape.kind}: {shape.text}")
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from .bus import Bus
+    from .cpu65xx import CPU
+
+from .defs import BusRet, TAddr, TData
+
+# Memory accesses allowed in a checked loop iteration. Longer loops are not idle.
+MAX_ACCESSES = 64
+
+
+class _Watch:
+    """
+    Stand-in for the bus during one loop iteration.
+    Checks that the iteration reads only plain memory, and writes only values the memory already has.
+    """
+
+    __slots__ = ("bus", "cpu", "clean", "_accesses")
+
+    def __init__(self, cpu: CPU):
+        self.bus: Bus = cpu.bus
+        self.cpu = cpu
+        self.clean = True
+        self._accesses = 0
+        cpu.bus = self
+
+    def detach(self):
+        if self.cpu.bus is self:
+            self.cpu.bus = self.bus
+
+    def _fail(self):
+        self.clean = False
+        # Rest of the iteration does not need checking.
+        self.detach()
+
+    def _plain(self, addr: TAddr) -> bool:
+        self._accesses += 1
+        if self._accesses > MAX_ACCESSES:
+            return False
+        return self.bus.is_plain(addr)
+
+    @property
+    def pc(self) -> int:
+        return self.bus.pc
+
+    @pc.setter
+    def pc(self, value: int):
+        self.bus.pc = value
+
+    def __getattr__(self, name: str):
+        return getattr(self.bus, name)
+
+    def read(self, addr: TAddr, silent=False) -> BusRet:
+        value = self.bus.read(addr, silent)
+        if self.clean and (callable(value) or not self._plain(addr)):
+            self._fail()
+        return value
+
+    def write(self, addr: TAddr, data: TData):
+        # Plain memory can be read back without side effects.
+        if self.clean and not (self._plain(addr) and self.bus.read(addr, silent=True) == data):
+            self._fail()
+        self.bus.write(addr, data)
+
+
+class IdleSkip:
+    """
+    Fast-forward of idle loops, e.g. the KERNAL waiting for a key press. See CPU.idle.
+
+    A loop is idle when one iteration of it ends in the state it started from: same registers,
+    reads only from plain memory (see BusPart.is_plain), and writes only of values the memory
+    already has. All following iterations are then the same until a clocked device does something,
+    so the clock is advanced by whole iterations up to the next device event (see Clock.next_event)
+    instead of running them. Cycle counts and device state stay exact.
+
+    Loops are found by the program counter going backwards. An iteration is checked
+    with a stand-in for the bus when registers at the loop start repeat.
+    """
+
+    __slots__ = ("skipped", "skips", "_regs", "_repeats", "_cycles", "_watch")
+
+    def __init__(self):
+        # Cycles skipped, and count of skips.
+        self.skipped = 0
+        self.skips = 0
+
+        # Registers on the last backwards jump, and how many times in row they were the same.
+        self._regs: typing.Optional[typing.Tuple[int, ...]] = None
+        self._repeats = 0
+        # Cycles at the start of the checked iteration.
+        self._cycles = 0
+        self._watch: typing.Optional[_Watch] = None
+
+    def cancel(self):
+        """
+        Stop checking the current loop, if any.
+        """
+        if self._watch is not None:
+            self._watch.detach()
+            self._watch = None
+        self._regs = None
+
+    def backward(self, cpu: CPU, end: int):
+        """
+        Called by CPU.run when the program counter did not advance, i.e. after a jump backwards.
+
+        :param end: Cycle count the run ends at, or -1 if it does not end.
+        """
+        watch = self._watch
+        if watch is not None:
+            watch.detach()
+            self._watch = None
+
+        clock = cpu.clock
+        regs = (cpu.pc, cpu._A, cpu._X, cpu._Y, cpu.p.val, cpu.sp)
+        if cpu.irq or regs != self._regs:
+            self._regs = regs
+            self._repeats = 0
+            return
+
+        if watch is not None and watch.clean:
+            length = clock.cycles - self._cycles
+            limit = clock.next_event()
+            if end >= 0 and (limit is None or end - clock.cycles < limit):
+                limit = end - clock.cycles
+            if limit is not None and limit >= length:
+                skip = limit - limit % length
+                clock.skip(skip)
+                self.skipped += skip
+                self.skips += 1
+            self._repeats = 0
+
+        # Check the next iteration. Loops accessing e.g. I/O are checked less and less often.
+        r = self._repeats = self._repeats + 1
+        if r & (r - 1) == 0 or r & 63 == 0:
+            self._cycles = clock.cycles
+            self._watch = _Watch(cpu)
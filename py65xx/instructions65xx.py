@@ -9,10 +9,6 @@ if typing.TYPE_CHECKING:
     from .cpu65xx import CPU
 
 from .bcd import bcdtoi, itobcd
-from .statelog import LOG
-
-# Should JMP and B* instructions check for self-jump, which would stuck the CPU (until IQR/NMI)?
-CHECK_STUCK = False
 
 
 def _data_or_read(self: CPU):
@@ -278,6 +274,8 @@ def jsr(self: CPU):
     self.pc = self.addr_val
     self.clock.wait_cycle()
     self.print_stack()
+    if self.call_profiler is not None:
+        self.call_profiler.call(self.pc, self.sp)
 
 
 def rts(self: CPU):
@@ -291,6 +289,8 @@ def rts(self: CPU):
     self.pc = (pch << 8) + pcl + 1
     self.clock.wait_cycle()
     self.print_stack()
+    if self.call_profiler is not None:
+        self.call_profiler.ret(self.sp)
 
 
 def _prepare_irq(self: CPU, isr: int):
@@ -307,12 +307,16 @@ def irq(self: CPU, is_brk: bool):
     self.p.B = is_brk
     _prepare_irq(self, isr)
     self.irq |= 0x80
+    if self.call_profiler is not None:
+        self.call_profiler.call(isr, self.sp)
 
 
 def nmi(self: CPU):
     isr = self.bus.read(0xFFFA) | self.bus.read(0xFFFB) << 8
     _prepare_irq(self, isr)
     self.irq |= 0x80
+    if self.call_profiler is not None:
+        self.call_profiler.call(isr, self.sp)
 
 
 def rti(self: CPU):
@@ -321,6 +325,8 @@ def rti(self: CPU):
     pch = _pop(self)
     self.pc = (pch << 8) + pcl
     self.irq = 0
+    if self.call_profiler is not None:
+        self.call_profiler.ret(self.sp)
 
 
 def brk(self: CPU):
@@ -407,11 +413,11 @@ def cpy(self: CPU):
 def _chk_jump(self: CPU):
     self.pc = self.addr_val
 
-    if CHECK_STUCK and self.addr_val == self.spc:
-        if not LOG.dis:
+    if self.check_stuck and self.addr_val == self.spc:
+        if not self.log.dis:
             self.fault_log("<stuck>")
         else:
-            LOG.print("<stuck>")
+            self.log.print("<stuck>")
         raise StopIteration
 
 
@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 from .addressing65xx import *
+from .disasm import Disassembler
 from .instructions65xx import *
 
 if typing.TYPE_CHECKING:
@@ -25,7 +26,7 @@ class SetOnceList(list):
 
 
 class ISet:
-    __slots__ = ("iset", "rts", "brk")
+    __slots__ = ("iset", "rts", "brk", "_disassembler")
 
     def __init__(self):
 
@@ -258,40 +259,27 @@ class ISet:
 
         self.brk = brk
         self.rts = rts
+        self._disassembler: typing.Optional[Disassembler] = None
 
     def __getitem__(self, item):
         return self.iset[item]
 
+    @property
+    def disassembler(self) -> Disassembler:
+        if self._disassembler is None:
+            self._disassembler = Disassembler(self)
+        return self._disassembler
+
     def dis(
         self,
-        mem: typing.Union[typing.List, Bus],
+        mem: typing.Union[typing.Sequence, Bus],
         start: int,
         end: typing.Optional[int] = None,
     ):
-        i = start
-        if end is None:
-            _end = start
-        else:
-            _end = end
-        ret: typing.List[str] = []
-        while i <= _end:
-            b = mem[i]
-            if b is None:
-                ret.append(f"${i:04X} None")
-                continue
-            instr = self.iset[b]
-            arg_len = instr[2] - 1
-            arg = mem[i + 1 : i + 1 + arg_len]
-            arg_hex = "".join(f"{a:02X}" for a in reversed(arg))
-
-            bs = " ".join(f"{a:02X}" for a in mem[i : i + 1 + arg_len])
-            if instr[0] == fault:
-                bs += " " + str(mem[i])
-
-            # noinspection PyUnresolvedReferences
-            body = f"${i:04X} {instr[0].__name__.upper()} {instr[1].dis(arg_hex)}"
-            ret.append(f"{body:20} {bs}")
-            i += 1 + arg_len
+        """
+        Disassemble one instruction at start, or list of instructions from start to end (inclusive).
+        See disasm.Disassembler for more.
+        """
         if end is None:
-            return ret[0]
-        return ret
+            return self.disassembler.line(mem, start)[0]
+        return [text for _, text in self.disassembler.disassemble(mem, start, end)]
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import collections
+import typing
+
+if typing.TYPE_CHECKING:
+    from .cpu65xx import CPU
+
+from . import snapshot
+from .defs import TAddr, TData
+
+_HASH_MASK = (1 << 64) - 1
+_HASH_MUL = 1000003
+
+
+class WriteTap:
+    """
+    Observer of all writes through a bus, Bus or FlatBus. Replaces the write method of the bus,
+    so it must be attached after anything else replacing it, e.g. FlatBus.add_io.
+    Writes are combined into a rolling hash, and optionally recorded.
+    """
+
+    __slots__ = ("hash", "count", "writes", "_bus", "_write")
+
+    def __init__(self, bus):
+        self.hash = 0
+        self.count = 0
+        self.writes: typing.Optional[typing.List[typing.Tuple[int, int]]] = None
+        self._bus = bus
+        self._write: typing.Callable[[TAddr, TData], None] = bus.write
+        bus.write = self.write
+
+    def detach(self):
+        if self._bus.write == self.write:
+            self._bus.write = self._write
+
+    def clear(self, record: bool = False):
+        self.hash = 0
+        self.count = 0
+        self.writes = [] if record else None
+
+    def write(self, addr: TAddr, data: TData):
+        self.hash = (self.hash * _HASH_MUL + (addr << 8 | data)) & _HASH_MASK
+        self.count += 1
+        if self.writes is not None:
+            self.writes.append((addr, data))
+        self._write(addr, data)
+
+
+class Divergence(typing.NamedTuple):
+    cycles: int
+    # Start address of the instruction after which the difference was seen.
+    pc: int
+    reason: str
+    # Disassembly of the instructions before the divergence, last one being the diverging one.
+    context: typing.List[str]
+
+    def __str__(self):
+        return "\n".join(
+            [f"Divergence after ${self.pc:04X} at cycle {self.cycles}: {self.reason}"] + self.context
+        )
+
+
+def _regs(cpu: CPU) -> typing.Tuple[int, int, int, int, int, int]:
+    return cpu.pc, cpu.sp, cpu.p.val, cpu.A, cpu.X, cpu.Y
+
+
+def _fmt_regs(regs: typing.Tuple[int, ...]) -> str:
+    return "pc=${:04X} sp=${:02X} p=${:02X} A=${:02X} X=${:02X} Y=${:02X}".format(*regs)
+
+
+class Lockstep:
+    """
+    Run two CPUs with separate buses side by side and report the first difference in
+    registers, flags, cycles or memory writes.
+
+    Run is done in blocks: both sides run a block, and only the end state and a rolling hash
+    of the writes are compared. When they differ, both sides are restored to the start of
+    the block and the block is run again one instruction at time to find the exact place.
+    So memory use does not depend on the length of the run.
+
+    The interpreter against FlatCPU, running a loop storing a counter:
+
+    >>> from py65xx.bus import Bus, RAM
+    >>> from py65xx.clock import Clock
+    >>> from py65xx.cpu65xx import CPU
+    >>> from py65xx.flat import FlatCPU, FlatMachine
+    >>> program = bytes.fromhex("a200e88610e005d0f94c0002")
+    >>> def reference():
+    ...     bus, ram = Bus(), RAM()
+    ...     bus.register(ram)
+    ...     bus.mem = ram.mem
+    ...     ram.write_block(0x0200, program)
+    ...     clock = Clock()
+    ...     cpu = clock.cpu = CPU(bus, clock)
+    ...     cpu.pc = 0x0200
+    ...     return cpu
+    >>> def flat(cpu_class=FlatCPU):
+    ...     machine = FlatMachine(program, 0x0200)
+    ...     cpu = machine.clock.cpu = cpu_class(machine.bus, machine.clock)
+    ...     cpu.pc = 0x0200
+    ...     return cpu
+    >>> print(Lockstep(reference(), flat(), block=100).run(1000))
+    None
+
+    An engine storing a wrong value on the third round:
+
+    >>> class Broken(FlatCPU):
+    ...     def run(self, cycles=-1, step=False):
+    ...         result = super().run(cycles, step)
+    ...         if self.X == 3 and self.pc == 0x0205:
+    ...             self.bus.write(0x10, 0)
+    ...         return result
+    >>> print(Lockstep(reference(), flat(Broken), block=100, context=3).run(1000))
+    Divergence after $0203 at cycle 20: writes $0010=$03 != $0010=$03 $0010=$00
+    $0207 BNE PC-7       D0 F9
+    $0202 INX            E8
+    $0203 STX $10,Z      86 10
+    """
+
+    def __init__(self, a: CPU, b: CPU, block: int = 10000, context: int = 16):
+        """
+        :param a: Reference CPU.
+        :param b: CPU to verify against the reference.
+        :param block: Cycles run before comparing. 1 compares after every instruction.
+        :param context: Count of instructions shown before a divergence.
+        """
+        self.a = a
+        self.b = b
+        self.block = block
+        self.context = context
+        self.tap_a = WriteTap(a.bus)
+        self.tap_b = WriteTap(b.bus)
+
+    def detach(self):
+        """
+        Stop observing the writes of the buses.
+        """
+        self.tap_a.detach()
+        self.tap_b.detach()
+
+    def run(self, cycles: int = -1) -> typing.Optional[Divergence]:
+        """
+        Run until given cycles are run, either CPU stops, or a divergence is found.
+
+        :param cycles: Cycles to run, negative to run until stopped.
+        :return: The divergence, or None if the runs were identical.
+        """
+        a, b = self.a, self.b
+        end = a.clock.cycles + cycles
+        if self.block == 1:
+            return self._run_detailed(end if cycles >= 0 else -1)
+
+        while cycles < 0 or a.clock.cycles < end:
+            block = self.block if cycles < 0 else min(self.block, end - a.clock.cycles)
+            start_a = snapshot.capture(a)
+            start_b = snapshot.capture(b)
+            self.tap_a.clear()
+            self.tap_b.clear()
+            ra = a.run(block)
+            rb = b.run(block)
+            if (
+                ra != rb
+                or a.clock.cycles != b.clock.cycles
+                or _regs(a) != _regs(b)
+                or self.tap_a.hash != self.tap_b.hash
+                or self.tap_a.count != self.tap_b.count
+            ):
+                snapshot.restore(a, start_a)
+                snapshot.restore(b, start_b)
+                found = self._run_detailed(a.clock.cycles + block)
+                if found is not None:
+                    return found
+                # Running the same block again gave different result.
+                return Divergence(a.clock.cycles, a.pc, "block differs, but not when run again", [])
+            if ra != 0:
+                return None
+        return None
+
+    def _run_detailed(self, end: int) -> typing.Optional[Divergence]:
+        a, b = self.a, self.b
+        history = collections.deque(maxlen=self.context)
+        while end < 0 or a.clock.cycles < end:
+            pc = a.pc
+            history.append(pc)
+            self.tap_a.clear(record=True)
+            self.tap_b.clear(record=True)
+            ra = a.run(1)
+            rb = b.run(1)
+
+            reason = None
+            if _regs(a) != _regs(b):
+                reason = f"registers {_fmt_regs(_regs(a))} != {_fmt_regs(_regs(b))}"
+            elif a.clock.cycles != b.clock.cycles:
+                reason = f"cycles {a.clock.cycles} != {b.clock.cycles}"
+            elif self.tap_a.writes != self.tap_b.writes:
+                reason = "writes {} != {}".format(
+                    " ".join(f"${addr:04X}=${d:02X}" for addr, d in self.tap_a.writes),
+                    " ".join(f"${addr:04X}=${d:02X}" for addr, d in self.tap_b.writes),
+                )
+            elif ra != rb:
+                reason = f"run result {ra} != {rb}"
+            if reason is not None:
+                self.tap_a.clear()
+                self.tap_b.clear()
+                return Divergence(
+                    a.clock.cycles, pc, reason, [a.iset.dis(a.bus, h) for h in history]
+                )
+            if ra != 0:
+                break
+        self.tap_a.clear()
+        self.tap_b.clear()
+        return None
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import array
+import bisect
+import re
+import typing
+
+if typing.TYPE_CHECKING:
+    from .cpu65xx import CPU
+
+from .iset65xx import ISet
+
+# VICE monitor label file: "al C:e000 .label"
+_VICE_LABEL = re.compile(r"^al\s+(?:[A-Za-z]+:)?([0-9A-Fa-f]{1,4})\s+\.?(\S+)")
+# AS65 listing line: "0400 : d8              start   cld"
+_LST_LINE = re.compile(r"^([0-9A-Fa-f]{4})\s*:\s*((?:[0-9A-Fa-f]{2})*)\s+>?\s*(\S.*)$")
+_IDENTIFIER = re.compile(r"^[A-Za-z_][\w.]*:?$")
+_LST_DIRECTIVES = {
+    "org", "db", "dw", "ds", "dd", "equ", "set", "macro", "endm", "if", "ifdef", "ifndef",
+    "else", "endif", "end", "include", "noopt", "opt", "bss", "code", "data", "align", "fill",
+    "trap", "trap_eq", "trap_ne", "trap_cs", "trap_cc", "trap_mi", "trap_pl", "trap_vs", "trap_vc",
+    "success",
+}
+
+
+class Symbols:
+    """
+    Addresses with names. Any address belongs to the routine of the nearest preceding label.
+    """
+
+    def __init__(self, labels: typing.Optional[typing.Dict[int, str]] = None):
+        self._labels: typing.Dict[int, str] = {}
+        self._addrs: typing.List[int] = []
+        if labels:
+            self.update(labels)
+
+    def update(self, labels: typing.Dict[int, str]):
+        self._labels.update(labels)
+        self._addrs = sorted(self._labels)
+
+    def __len__(self):
+        return len(self._labels)
+
+    def label(self, addr: int) -> typing.Optional[str]:
+        """
+        :return: Name of the exact address.
+        """
+        return self._labels.get(addr)
+
+    def routine(self, addr: int) -> typing.Optional[str]:
+        i = bisect.bisect_right(self._addrs, addr) - 1
+        if i < 0:
+            return None
+        return self._labels[self._addrs[i]]
+
+    def load_vice(self, fname: str):
+        """
+        Load labels from VICE monitor label file (as written by `save_labels`).
+        """
+        labels = {}
+        with open(fname, "r") as f:
+            for line in f:
+                m = _VICE_LABEL.match(line.strip())
+                if m:
+                    labels[int(m.group(1), 16)] = m.group(2)
+        self.update(labels)
+
+    def load_lst(self, fname: str):
+        """
+        Load code labels from AS65 listing file, e.g. 6502_functional_test.lst.
+        """
+        mnemonics = {instr[0].__name__ for instr in ISet().iset}
+        labels = {}
+        with open(fname, "r", errors="replace") as f:
+            for line in f:
+                m = _LST_LINE.match(line.rstrip())
+                if not m:
+                    continue
+                token = m.group(3).split()[0]
+                if token.startswith(";") or not _IDENTIFIER.match(token):
+                    continue
+                token = token.rstrip(":")
+                if token.lower() in mnemonics or token.lower() in _LST_DIRECTIVES:
+                    continue
+                # First label of an address wins, the later ones are usually local.
+                labels.setdefault(int(m.group(1), 16), token)
+        self.update(labels)
+
+    def load(self, fname: str):
+        """
+        Load labels, guessing the format by file name.
+        """
+        if fname.lower().endswith(".lst"):
+            self.load_lst(fname)
+        else:
+            self.load_vice(fname)
+
+
+def _counters() -> array.array:
+    return array.array("L", bytes(65536 * array.array("L").itemsize))
+
+
+class Profiler:
+    """
+    Instruction and cycle counters for every address. Set as `CPU.profiler` to enable.
+    Counting is done in CPU.run for the address where each instruction starts,
+    so the cost is two array increments per instruction.
+    """
+
+    def __init__(self):
+        self.instructions = _counters()
+        self.cycles = _counters()
+
+    def reset(self):
+        self.instructions = _counters()
+        self.cycles = _counters()
+
+    @property
+    def total_cycles(self) -> int:
+        return sum(self.cycles)
+
+    def hot_spots(self, top: int = 20) -> typing.List[typing.Tuple[int, int, int]]:
+        """
+        :return: (address, cycles, instructions) of the most expensive addresses.
+        """
+        cycles = self.cycles
+        used = [pc for pc in range(65536) if cycles[pc]]
+        used.sort(key=lambda pc: cycles[pc], reverse=True)
+        return [(pc, cycles[pc], self.instructions[pc]) for pc in used[:top]]
+
+    def routines(self, symbols: Symbols) -> typing.List[typing.Tuple[str, int, int]]:
+        """
+        :return: (routine name, cycles, instructions) of every routine that was run, most expensive first.
+        """
+        totals: typing.Dict[str, typing.List[int]] = {}
+        for pc in range(65536):
+            c = self.cycles[pc]
+            if not c:
+                continue
+            name = symbols.routine(pc) or "?"
+            t = totals.setdefault(name, [0, 0])
+            t[0] += c
+            t[1] += self.instructions[pc]
+        out = [(name, c, i) for name, (c, i) in totals.items()]
+        out.sort(key=lambda r: r[1], reverse=True)
+        return out
+
+    def report(self, cpu: CPU, symbols: typing.Optional[Symbols] = None, top: int = 20):
+        total = self.total_cycles or 1
+        if symbols is not None and len(symbols):
+            print("Routines:")
+            print(f"{'cycles':>12} {'%':>6} {'instructions':>12}  routine")
+            for name, c, i in self.routines(symbols)[:top]:
+                print(f"{c:12} {100 * c / total:6.2f} {i:12}  {name}")
+            print()
+
+        print("Hot spots:")
+        print(f"{'cycles':>12} {'%':>6} {'instructions':>12}  instruction")
+        for pc, c, i in self.hot_spots(top):
+            if callable(cpu.bus[pc]):
+                dis = f"${pc:04X} <native>"
+            else:
+                dis = cpu.iset.dis(cpu.bus.plain_memory(pc, pc + 2), pc)
+            if symbols is not None and symbols.routine(pc) is not None:
+                dis = f"{dis:32} {symbols.routine(pc)}"
+            print(f"{c:12} {100 * c / total:6.2f} {i:12}  {dis}")
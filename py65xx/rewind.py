@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import collections
+import typing
+
+if typing.TYPE_CHECKING:
+    from .bus import RAM
+    from .cpu65xx import CPU
+
+from . import snapshot
+
+_PAGES = 256
+
+
+class _Frame(typing.NamedTuple):
+    cycles: int
+    # Full memory for key frames, otherwise None.
+    memory: typing.Optional[bytes]
+    # Page index to page contents before the frame, for pages written since previous frame.
+    pages: typing.Dict[int, bytes]
+    # Snapshot of everything else than the memory.
+    devices: bytes
+
+    @property
+    def size(self):
+        return (
+            len(self.memory or b"")
+            + sum(len(p) for p in self.pages.values())
+            + len(self.devices)
+        )
+
+
+class Rewind:
+    """
+    Ring buffer of past frames for stepping the machine back in time.
+
+    Each frame stores the previous contents of the pages written during it (undo pages), so stepping
+    back a frame restores only the pages that frame changed. Every key_interval:th frame also stores
+    the whole memory, which is used instead when it is less copying, e.g. when stepping back many frames.
+    Device state is stored for every frame. Oldest frames are dropped when either of max_frames or
+    max_bytes would be exceeded. A copy of memory as of the last frame is kept besides those.
+
+    >>> from py65xx.bus import Bus, RAM
+    >>> from py65xx.clock import Clock
+    >>> from py65xx.cpu65xx import CPU
+    >>> bus, ram = Bus(), RAM()
+    >>> _ = bus.register(ram)
+    >>> bus.mem = ram.mem
+    >>> rewind = Rewind(CPU(bus, Clock()), ram, key_interval=1000, max_bytes=64 * 1024)
+    >>> for frame in range(100):
+    ...     ram.write_block(0, bytes([frame]) * 0x1000)
+    ...     rewind.capture()
+    ...     assert rewind.size <= 64 * 1024
+    >>> rewind.step_back(3), ram[0], ram[0xFFF]
+    (True, 96, 96)
+    """
+
+    def __init__(
+        self,
+        cpu: CPU,
+        ram: RAM,
+        key_interval: int = 25,
+        max_frames: int = 250,
+        max_bytes: int = 4 * 1024 * 1024,
+    ):
+        self._cpu = cpu
+        self._ram = ram
+        self._key_interval = key_interval
+        self._max_frames = max_frames
+        self._max_bytes = max_bytes
+        self._frames: typing.Deque[_Frame] = collections.deque()
+        # Frames captured since and including the latest key frame.
+        self._since_key = 0
+        self._bytes = 0
+        # Memory as of the last captured frame.
+        self._memory = bytearray(len(ram.mem))
+
+    def __len__(self):
+        return len(self._frames)
+
+    @property
+    def size(self) -> int:
+        """
+        Bytes used by stored frames.
+        """
+        return self._bytes
+
+    def capture(self):
+        """
+        Store current state as a new frame. Should be called once per frame.
+        """
+        ram = self._ram
+        mem = memoryview(ram.mem)
+        last = memoryview(self._memory)
+        pages = {}
+        if not self._frames:
+            # Nothing to step back to, so nothing to undo.
+            last[:] = mem
+        else:
+            for page in ram.dirty_pages():
+                start, end = page << 8, (page + 1) << 8
+                pages[page] = bytes(last[start:end])
+                last[start:end] = mem[start:end]
+        ram.clear_dirty()
+
+        memory = None
+        if not self._frames or self._since_key >= self._key_interval:
+            memory = ram.mem.tobytes()
+            self._since_key = 0
+        self._since_key += 1
+
+        frame = _Frame(
+            self._cpu.clock.cycles,
+            memory,
+            pages,
+            snapshot.capture(self._cpu, skip=(ram,)),
+        )
+        self._frames.append(frame)
+        self._bytes += frame.size
+        self._evict()
+
+    def _evict(self):
+        frames = self._frames
+        while len(frames) > 1 and (len(frames) > self._max_frames or self._bytes > self._max_bytes):
+            self._bytes -= frames.popleft().size
+            # Nothing is older than the oldest frame, so its undo pages are not needed.
+            self._replace(0, frames[0]._replace(pages={}))
+        if self._bytes > self._max_bytes and frames[0].memory is not None:
+            # The only frame is restored from the copy of the last frame, without its memory.
+            self._replace(0, frames[0]._replace(memory=None))
+
+    def _replace(self, index: int, frame: _Frame):
+        self._bytes += frame.size - self._frames[index].size
+        self._frames[index] = frame
+
+    def step_back(self, frames: int = 1) -> bool:
+        """
+        Restore the machine to state of an earlier frame.
+        The restored frame stays in the buffer, newer frames are dropped.
+        When the machine has run after last capture, first step returns to the last captured frame.
+
+        :param frames: Count of frames to step back.
+        :return: False if there are not enough frames in the buffer.
+        """
+        if not self._frames:
+            return False
+        if self._cpu.clock.cycles != self._frames[-1].cycles:
+            # Machine has run past the last frame, returning to it is the first step.
+            frames -= 1
+        if frames >= len(self._frames):
+            return False
+        self._restore(len(self._frames) - 1 - frames)
+        for _ in range(frames):
+            self._bytes -= self._frames.pop().size
+        # Without a key frame left, the next frame is one.
+        self._since_key = self._key_interval
+        for i, frame in enumerate(reversed(self._frames), 1):
+            if frame.memory is not None:
+                self._since_key = i
+                break
+        return True
+
+    def _restore(self, target: int):
+        frames = self._frames
+        ram = self._ram
+        mem = memoryview(ram.mem)
+        last = memoryview(self._memory)
+
+        # Undo pages of frames after the target, from the last frame or from a key frame after the target.
+        changed = set(ram.dirty_pages())
+        cost = len(changed) + sum(len(frames[i].pages) for i in range(target + 1, len(frames)))
+        start = len(frames) - 1
+        for key in range(target, len(frames)):
+            if frames[key].memory is not None:
+                if _PAGES + sum(len(frames[i].pages) for i in range(target + 1, key + 1)) < cost:
+                    last[:] = frames[key].memory
+                    changed = set(range(_PAGES))
+                    start = key
+                break
+
+        for i in range(start, target, -1):
+            for page, data in frames[i].pages.items():
+                last[page << 8 : (page + 1) << 8] = data
+                changed.add(page)
+        for page in changed:
+            mem[page << 8 : (page + 1) << 8] = last[page << 8 : (page + 1) << 8]
+        ram.clear_dirty()
+        snapshot.restore(self._cpu, frames[target].devices, skip=(ram,))
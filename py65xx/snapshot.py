@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import struct
+import typing
+
+if typing.TYPE_CHECKING:
+    from .cpu65xx import CPU
+
+MAGIC = b"PY65SNAP"
+VERSION = 1
+
+# Magic, version, chunk count.
+_HEADER = struct.Struct("<8sHH")
+# Tag, data length.
+_CHUNK = struct.Struct("<4sI")
+_LENGTH = struct.Struct("<I")
+_NONE = 0xFFFFFFFF
+
+TAG_CPU = b"CPU "
+TAG_CLOCK = b"CLK "
+TAG_BUS = b"BUS "
+TAG_LAYOUT = b"LYT "
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def pack_states(states: typing.Iterable[typing.Optional[bytes]]) -> bytes:
+    """
+    Pack states of several sub-parts into one state.
+    """
+    out = []
+    for state in states:
+        if state is None:
+            out.append(_LENGTH.pack(_NONE))
+        else:
+            out.append(_LENGTH.pack(len(state)))
+            out.append(state)
+    return b"".join(out)
+
+
+def unpack_states(data: bytes) -> typing.List[typing.Optional[bytes]]:
+    states = []
+    pos = 0
+    while pos < len(data):
+        (length,) = _LENGTH.unpack_from(data, pos)
+        pos += _LENGTH.size
+        if length == _NONE:
+            states.append(None)
+        else:
+            states.append(data[pos : pos + length])
+            pos += length
+    return states
+
+
+def _part_tag(prefix: str, index: int) -> bytes:
+    return f"{prefix}{index:03d}".encode()
+
+
+def _stateful(cpu: CPU, skip: typing.Container = ()):
+    """
+    :return: Tag and object of each part taking part in the snapshot.
+    """
+    yield TAG_CPU, cpu
+    yield TAG_CLOCK, cpu.clock
+    yield TAG_BUS, cpu.bus
+    for i, part in enumerate(cpu.bus.parts):
+        if part not in skip:
+            yield _part_tag("P", i), part
+    # Clocked devices connected to bus are handled as bus parts.
+    for i, listener in enumerate(cpu.clock.listeners):
+        if listener not in cpu.bus.parts and listener not in skip:
+            yield _part_tag("C", i), listener
+
+
+def capture(cpu: CPU, skip: typing.Container = ()) -> bytes:
+    """
+    Capture state of the CPU, clock and all bus parts and clocked devices.
+
+    :param cpu: CPU of the machine.
+    :param skip: Parts to leave out from the snapshot.
+    :return: The snapshot.
+    """
+    chunks = []
+    layout = []
+    for tag, part in _stateful(cpu, skip):
+        state = part.get_state()
+        if state is not None:
+            chunks.append((tag, state))
+            layout.append(tag + type(part).__name__.encode())
+    chunks.insert(0, (TAG_LAYOUT, b"\n".join(layout)))
+
+    out = [_HEADER.pack(MAGIC, VERSION, len(chunks))]
+    for tag, state in chunks:
+        out.append(_CHUNK.pack(tag, len(state)))
+        out.append(state)
+    return b"".join(out)
+
+
+def read_chunks(data: bytes) -> typing.Dict[bytes, bytes]:
+    if len(data) < _HEADER.size:
+        raise SnapshotError("Not a snapshot")
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("Not a snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+
+    chunks = {}
+    pos = _HEADER.size
+    for _ in range(count):
+        if pos + _CHUNK.size > len(data):
+            raise SnapshotError("Snapshot is truncated")
+        tag, length = _CHUNK.unpack_from(data, pos)
+        pos += _CHUNK.size
+        if pos + length > len(data):
+            raise SnapshotError("Snapshot is truncated")
+        chunks[tag] = data[pos : pos + length]
+        pos += length
+    return chunks
+
+
+def restore(cpu: CPU, data: bytes, skip: typing.Container = ()):
+    """
+    Restore a snapshot made with capture into a machine with same layout.
+    No reset code is run, all state comes from the snapshot.
+
+    Running on from a restored snapshot goes the same way as running on from the capture:
+
+    >>> from py65xx.bus import Bus, RAM
+    >>> from py65xx.clock import Clock
+    >>> from py65xx.cpu65xx import CPU
+    >>> def machine():
+    ...     bus, ram = Bus(), RAM()
+    ...     bus.register(ram)
+    ...     bus.mem = ram.mem
+    ...     ram.write_block(0x0200, bytes.fromhex("e610e84c0002"))  # INC $10, INX, JMP $0200
+    ...     clock = Clock()
+    ...     cpu = clock.cpu = CPU(bus, clock)
+    ...     cpu.pc = 0x0200
+    ...     return cpu
+    >>> def state(cpu):
+    ...     return bytes(cpu.bus.mem), repr(cpu), cpu.clock.cycles
+    >>> cpu = machine()
+    >>> _ = cpu.run(1000)
+    >>> data = capture(cpu)
+    >>> _ = cpu.run(1000)
+    >>> other = machine()
+    >>> restore(other, data)
+    >>> _ = other.run(1000)
+    >>> state(other) == state(cpu)
+    True
+
+    Missing state is an error:
+
+    >>> restore(other, data[:-1])
+    Traceback (most recent call last):
+    ...
+    py65xx.snapshot.SnapshotError: Snapshot is truncated
+    >>> restore(other, capture(cpu, skip=cpu.bus.parts))
+    Traceback (most recent call last):
+    ...
+    py65xx.snapshot.SnapshotError: Snapshot is not made with similar machine
+
+    :raises SnapshotError: If the data is not a complete snapshot of a similar machine.
+    """
+    chunks = read_chunks(data)
+    if TAG_LAYOUT not in chunks:
+        raise SnapshotError("Snapshot has no layout")
+
+    parts = []
+    layout = []
+    for tag, part in _stateful(cpu, skip):
+        state = chunks.get(tag)
+        if state is not None:
+            parts.append((part, state))
+            layout.append(tag + type(part).__name__.encode())
+        elif part.get_state() is not None:
+            # Would be left in its current state.
+            raise SnapshotError("Snapshot is not made with similar machine")
+    if b"\n".join(layout) != chunks[TAG_LAYOUT]:
+        raise SnapshotError("Snapshot is not made with similar machine")
+
+    for part, state in parts:
+        part.set_state(state)
+
+
+def save(cpu: CPU, fname: str):
+    with open(fname, "wb") as f:
+        f.write(capture(cpu))
+
+
+def load(cpu: CPU, fname: str):
+    with open(fname, "rb") as f:
+        restore(cpu, f.read())
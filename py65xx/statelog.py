@@ -1,9 +1,20 @@
 # -*- coding: utf-8 -*-
 # Copyright (C) 2021  Jyrki Launonen
 
+import sys
+import typing
+
 
 class Log:
-    def __init__(self):
+    """
+    Debug logging switches of one machine. The CPU has one as `CPU.log`, shared with its bus.
+    """
+
+    def __init__(self, out: typing.Optional[typing.TextIO] = None):
+        """
+        :param out: Stream to print into, sys.stdout by default.
+        """
+        self.out = out
         self.dis = False
         self.chk_clk = False
         self.chk_cmd = False
@@ -22,11 +33,14 @@ class Log:
         self.bus_write = True
 
     def disable_all(self):
-        self.__init__()
-
-    @staticmethod
-    def print(*args, **kwargs):
-        print(*args, **kwargs)
+        self.__init__(self.out)
 
+    @property
+    def per_instruction(self) -> bool:
+        """
+        Whether any logging done for every instruction by CPU.run is enabled.
+        """
+        return self.dis or self.status or self.chk_cmd or self.chk_clk
 
-LOG = Log()
+    def print(self, *args, **kwargs):
+        print(*args, file=self.out if self.out is not None else sys.stdout, **kwargs)
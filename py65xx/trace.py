@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import queue
+import struct
+import threading
+import typing
+
+if typing.TYPE_CHECKING:
+    from .bus import Bus
+    from .clock import Clock
+    from .cpu65xx import CPU
+
+from .iset65xx import ISet
+
+MAGIC = b"P65T"
+VERSION = 1
+
+# Magic, version, record size.
+_HEADER = struct.Struct("<4sHH")
+# Cycles, PC, kind, opcode, operands, A, X, Y, P, SP, pending interrupt.
+# For bus accesses PC is the address and opcode is the data.
+_RECORD = struct.Struct("<QHBBBBBBBBBB")
+RECORD_SIZE = _RECORD.size
+
+KIND_INSTRUCTION = 0
+KIND_READ = 1
+KIND_WRITE = 2
+
+# NumPy dtype of the records, see TraceReader.array.
+DTYPE = [
+    ("cycles", "<u8"), ("pc", "<u2"), ("kind", "u1"), ("opcode", "u1"), ("op1", "u1"), ("op2", "u1"),
+    ("a", "u1"), ("x", "u1"), ("y", "u1"), ("p", "u1"), ("sp", "u1"), ("irq", "u1"),
+]
+
+
+class TraceRecord(typing.NamedTuple):
+    cycles: int
+    pc: int
+    kind: int
+    opcode: int
+    op1: int
+    op2: int
+    a: int
+    x: int
+    y: int
+    p: int
+    sp: int
+    irq: int
+
+
+class Tracer:
+    """
+    Binary execution trace. Set as `CPU.tracer`, and use `attach` to trace also bus accesses.
+
+    Records are packed into preallocated buffers. A full buffer is handed to a writer thread,
+    which writes it into the file and gives it back for reuse, so the emulation only waits
+    for the disk if all buffers are full.
+
+    >>> import os, tempfile
+    >>> from py65xx.bus import Bus, RAM
+    >>> from py65xx.clock import Clock
+    >>> from py65xx.cpu65xx import CPU
+    >>> bus, ram = Bus(), RAM()
+    >>> _ = bus.register(ram)
+    >>> bus.mem = ram.mem
+    >>> ram.write_block(0x0200, bytes.fromhex("a9428d00034c0502"))  # LDA #$42, STA $0300, JMP $0205
+    >>> clock = Clock()
+    >>> cpu = clock.cpu = CPU(bus, clock)
+    >>> cpu.pc = 0x0200
+    >>> fname = os.path.join(tempfile.mkdtemp(), "test.trace")
+    >>> tracer = cpu.tracer = Tracer(fname, clock)
+    >>> tracer.attach(bus)
+    >>> _ = cpu.run(6)
+    >>> tracer.close()
+    >>> print("\\n".join(TraceReader(fname).text()))
+             0   <- $0200: $A9
+             0 $0200 LDA #$42       A=$00 X=$00 Y=$00 P=$30 SP=$FF
+             1   <- $0201: $42
+             2   <- $0202: $8D
+             2 $0202 STA $0300      A=$42 X=$00 Y=$00 P=$30 SP=$FF
+             3   <- $0203: $00
+             4   <- $0204: $03
+             5   -> $0300: $42
+    >>> list(TraceReader(fname))[4]
+    TraceRecord(cycles=2, pc=514, kind=0, opcode=141, op1=0, op2=3, a=66, x=0, y=0, p=48, sp=255, irq=0)
+    """
+
+    def __init__(
+        self,
+        fname: str,
+        clock: typing.Optional[Clock] = None,
+        buffer_records: int = 65536,
+        buffers: int = 4,
+    ):
+        """
+        :param fname: Output file name.
+        :param clock: Clock for cycles of bus accesses. Not needed when only instructions are traced.
+        :param buffer_records: Count of records in a buffer.
+        :param buffers: Count of buffers.
+        """
+        self._clock = clock
+        self._f = open(fname, "wb")
+        self._f.write(_HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+        self._free: queue.Queue = queue.Queue()
+        self._full: queue.Queue = queue.Queue()
+        for _ in range(buffers - 1):
+            self._free.put(bytearray(buffer_records * RECORD_SIZE))
+        self._buf = bytearray(buffer_records * RECORD_SIZE)
+        self._pos = 0
+        self.records = 0
+        self._thread = threading.Thread(target=self._writer, name="trace writer", daemon=True)
+        self._thread.start()
+
+    def attach(self, bus: Bus):
+        """
+        Trace also reads and writes of the bus. Needs the clock for their cycles.
+        """
+        bus.tracer = self
+        bus.observe()
+
+    def _writer(self):
+        while True:
+            item = self._full.get()
+            if item is None:
+                return
+            buf, length = item
+            self._f.write(memoryview(buf)[:length])
+            self._free.put(buf)
+
+    def _flush(self):
+        self._full.put((self._buf, self._pos))
+        self._buf = self._free.get()
+        self._pos = 0
+
+    def instruction(self, cpu: CPU, pc: int, opcode: int, length: int, cycles: int):
+        """
+        Called by CPU.run after decoding, before the instruction is executed.
+        """
+        bus = cpu.bus
+        _RECORD.pack_into(
+            self._buf,
+            self._pos,
+            cycles,
+            pc,
+            KIND_INSTRUCTION,
+            opcode,
+            bus.read(pc + 1, silent=True) if length > 1 else 0,
+            bus.read(pc + 2, silent=True) if length > 2 else 0,
+            cpu._A,
+            cpu._X,
+            cpu._Y,
+            cpu.p.val,
+            cpu.sp,
+            cpu.irq,
+        )
+        self._pos += RECORD_SIZE
+        self.records += 1
+        if self._pos >= len(self._buf):
+            self._flush()
+
+    def _access(self, kind: int, addr: int, data: int):
+        cycles = self._clock.cycles if self._clock is not None else 0
+        _RECORD.pack_into(self._buf, self._pos, cycles, addr, kind, data, 0, 0, 0, 0, 0, 0, 0, 0)
+        self._pos += RECORD_SIZE
+        self.records += 1
+        if self._pos >= len(self._buf):
+            self._flush()
+
+    def bus_read(self, addr: int, data: int):
+        self._access(KIND_READ, addr, data)
+
+    def bus_write(self, addr: int, data: int):
+        self._access(KIND_WRITE, addr, data)
+
+    def close(self):
+        if self._pos:
+            self._full.put((self._buf, self._pos))
+        self._full.put(None)
+        self._thread.join()
+        self._f.close()
+
+
+class TraceReader:
+    """
+    Reads traces written by Tracer. Records are decoded lazily, block at time.
+    """
+
+    def __init__(self, fname: str, block_records: int = 65536):
+        self._fname = fname
+        self._block = block_records
+        with open(fname, "rb") as f:
+            magic, version, size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{fname} is not a trace")
+        if version != VERSION or size != RECORD_SIZE:
+            raise ValueError(f"Unsupported trace version {version}")
+
+    def __iter__(self) -> typing.Iterator[TraceRecord]:
+        with open(self._fname, "rb") as f:
+            f.seek(_HEADER.size)
+            while True:
+                data = f.read(self._block * RECORD_SIZE)
+                if not data:
+                    return
+                for values in _RECORD.iter_unpack(data[: len(data) - len(data) % RECORD_SIZE]):
+                    yield TraceRecord(*values)
+
+    def text(self) -> typing.Iterator[str]:
+        """
+        Records as text lines, instructions disassembled.
+        """
+        iset = ISet()
+        for r in self:
+            if r.kind == KIND_INSTRUCTION:
+                instr, addressing, length, _ = iset[r.opcode]
+                arg = (r.op2, r.op1)[3 - length :] if length > 1 else ()
+                arg_hex = "".join(f"{a:02X}" for a in arg)
+                body = f"${r.pc:04X} {instr.__name__.upper()} {addressing.dis(arg_hex)}"
+                yield (
+                    f"{r.cycles:10} {body:20} A=${r.a:02X} X=${r.x:02X} Y=${r.y:02X}"
+                    f" P=${r.p:02X} SP=${r.sp:02X}" + (f" irq={r.irq}" if r.irq else "")
+                )
+            else:
+                arrow = "<-" if r.kind == KIND_READ else "->"
+                yield f"{r.cycles:10}   {arrow} ${r.pc:04X}: ${r.opcode:02X}"
+
+    def array(self):
+        """
+        :return: The whole trace as NumPy structured array, see DTYPE. Requires numpy.
+        """
+        import numpy
+
+        return numpy.fromfile(self._fname, dtype=numpy.dtype(DTYPE), offset=_HEADER.size)
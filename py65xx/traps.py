@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import collections
+import typing
+
+if typing.TYPE_CHECKING:
+    from .cpu65xx import CPU
+
+from .bus import Bus, MMap
+from .defs import BusRet, TAddr
+
+
+class Trap(typing.NamedTuple):
+    """
+    Native implementation of a ROM routine, run instead of the instruction at addr.
+
+    The function is called with cpu.pc after the opcode, like an instruction. It must do what the ROM
+    code would do: reads and writes through cpu.bus, so that every part sees them, and registers and flags
+    as the ROM code leaves them. It sets cpu.pc to where the ROM code continues, e.g. its final RTS.
+    It may return False before changing anything, and the ROM instruction is run instead.
+    It may also return the count of cycles the ROM code would have taken, charged instead of cycles.
+    """
+
+    name: str
+    addr: TAddr
+    func: typing.Callable[[CPU], typing.Union[None, bool, int]]
+    # Cycles charged for the trap, including the opcode fetch. Typically what the interpreter takes for the ROM code.
+    cycles: int
+    # ROM contents the function implements, as (address, bytes) pairs.
+    # The trap is installed only if the ROM has exactly these.
+    code: typing.Tuple[typing.Tuple[TAddr, bytes], ...]
+
+    def matches(self, rom: MMap) -> bool:
+        for addr, code in self.code:
+            if not (rom.start_addr <= addr and addr + len(code) - 1 <= rom.end_addr):
+                return False
+            offset = addr - rom.start_addr
+            if bytes(rom.data[offset : offset + len(code)]) != code:
+                return False
+        return True
+
+
+class TrappedMMap(MMap):
+    """
+    ROM giving trap functions instead of opcodes of trapped addresses, see Traps.
+    Shares the data of the ROM it replaces.
+    """
+
+    __slots__ = ("bus", "calls")
+
+    def __init__(self, rom: MMap, bus: Bus):
+        self.name = rom.name
+        self.start_addr = rom.start_addr
+        self.end_addr = rom.end_addr
+        self.writable = rom.writable
+        self.write_through = rom.write_through
+        self.rom_file = rom.rom_file
+        self.pristine = rom.pristine
+        self.data = rom.data
+        self.bus = bus
+        # Trap entry functions by address.
+        self.calls: typing.Dict[TAddr, typing.Callable[[CPU], None]] = {}
+
+    def read_address(self, addr: TAddr) -> BusRet:
+        if self.start_addr <= addr <= self.end_addr:
+            # Only the opcode fetch is trapped: the CPU sets bus.pc before it. Other reads get the ROM.
+            if addr == self.bus.pc:
+                call = self.calls.get(addr)
+                if call is not None:
+                    return call
+            return self.data[addr - self.start_addr]
+
+
+class Traps:
+    """
+    Registry of native implementations of ROM routines.
+
+    Trapped ROMs return a function instead of the opcode at a trapped address, which CPU.run calls
+    instead of running the instruction (see TrappedMMap). As the ROM is a part of the bus, a trap is
+    active only while the ROM is enabled, e.g. mapped in by a PLA, and only for ROMs having the code
+    the trap implements (see Trap.code).
+
+    A trap charges its cycles after doing its work. Devices are clocked meanwhile and interrupts they
+    request are taken when the trap returns, instead of in the middle of the ROM code. Traps of routines
+    running with interrupts enabled should therefore return to the ROM before enabling them.
+    """
+
+    __slots__ = ("traps", "costs", "fixed", "hits", "fallbacks", "cycles", "installed", "skipped")
+
+    def __init__(self, traps: typing.Iterable[Trap], costs: typing.Optional[typing.Dict[str, int]] = None):
+        """
+        :param traps: Available traps.
+        :param costs: Cycles charged by trap name, instead of the default of the trap,
+            or the cycles counted by the trap function.
+        """
+        self.traps: typing.Dict[TAddr, Trap] = {trap.addr: trap for trap in traps}
+        self.costs = {trap.name: trap.cycles for trap in self.traps.values()}
+        # Names of traps charged their cost even if the function counts cycles.
+        self.fixed: typing.Set[str] = set()
+        if costs is not None:
+            unknown = set(costs) - set(self.costs)
+            if unknown:
+                raise ValueError(f"Unknown traps: {', '.join(sorted(unknown))}")
+            self.costs.update(costs)
+            self.fixed.update(costs)
+        # Runs by trap name, times the trap declined and ROM code was run instead, and cycles charged.
+        self.hits: typing.Counter[str] = collections.Counter()
+        self.fallbacks: typing.Counter[str] = collections.Counter()
+        self.cycles: typing.Counter[str] = collections.Counter()
+        # Names of installed traps, and of traps not installed as the ROM code differs.
+        self.installed: typing.List[str] = []
+        self.skipped: typing.List[str] = []
+
+    def install(self, bus: Bus, rom: MMap) -> TrappedMMap:
+        """
+        Replace the ROM in the bus with a trapped one, with the traps within the ROM address range.
+
+        :return: The trapped ROM, to be used in place of rom.
+        """
+        trapped = rom if isinstance(rom, TrappedMMap) else TrappedMMap(rom, bus)
+        for addr, trap in self.traps.items():
+            if not rom.start_addr <= addr <= rom.end_addr:
+                continue
+            if trap.matches(rom):
+                trapped.calls[addr] = self._entry(trap, trapped)
+                self.installed.append(trap.name)
+            else:
+                self.skipped.append(trap.name)
+        if trapped is not rom:
+            bus.replace(rom, trapped)
+        return trapped
+
+    def drop_blocks(self, cpu: CPU):
+        """
+        Remove translated blocks starting at trapped addresses, see CPU.aot, so that the traps are run.
+        """
+        if cpu.aot is not None:
+            for addr in self.traps:
+                cpu.aot.pop(addr, None)
+
+    def _entry(self, trap: Trap, rom: TrappedMMap) -> typing.Callable[[CPU], None]:
+        name = trap.name
+
+        def call(cpu: CPU):
+            cycles = trap.func(cpu)
+            if cycles is False:
+                self.fallbacks[name] += 1
+                # Run the ROM instruction, the opcode of which was already fetched.
+                cpu.cmd_val = opcode = rom.data[trap.addr - rom.start_addr]
+                instruction, addressing, _, _ = cpu.iset[opcode]
+                cpu.save = addressing(cpu)
+                instruction(cpu)
+                return
+            if cycles is None or name in self.fixed:
+                cycles = self.costs[name]
+            self.hits[name] += 1
+            self.cycles[name] += cycles
+            cpu.clock.advance(cycles - 1)
+
+        return call
+
+    def report(self):
+        """
+        Print the runs of each trap.
+        """
+        print("Traps:")
+        print(f"{'runs':>10} {'declined':>8} {'cycles':>8}  trap")
+        for addr, trap in sorted(self.traps.items()):
+            name = trap.name
+            if name not in self.installed:
+                continue
+            # Mean of the charged cycles, as traps may count them.
+            cycles = self.cycles[name] // self.hits[name] if self.hits[name] else self.costs[name]
+            print(f"{self.hits[name]:10} {self.fallbacks[name]:8} {cycles:8}  ${addr:04X} {name}")
+        if self.skipped:
+            print("Not installed, ROM code differs:", ", ".join(self.skipped))
@@ -0,0 +1,641 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+"""
+Many flat memory machines run in lockstep with NumPy. Requires numpy.
+"""
+
+from __future__ import annotations
+
+import typing
+
+import numpy
+
+from .addressing65xx import (
+    aabs,
+    aabsx,
+    aabsy,
+    aacc,
+    afault,
+    aimm,
+    aimpl,
+    aind,
+    aindx,
+    aindy,
+    arel,
+    azero,
+    azerox,
+    azeroy,
+)
+from .bcd import bcdtoi
+from .cpu65xx import CPU
+from .flat import _TAIL, MEM_SIZE, FlatMachine
+from .instructions65xx import *
+from .iset65xx import ISet
+
+# Status register masks.
+_C, _Z, _I, _D, _B, _R, _V, _N = 0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80
+
+# N and Z flags of a value.
+_NZ = numpy.array([(v & _N) | (_Z if v == 0 else 0) for v in range(256)], dtype=numpy.int64)
+_BCD_TO_I = numpy.array([bcdtoi(v) for v in range(256)], dtype=numpy.int64)
+
+# Status of a machine.
+RUNNING = 0
+# Stopped by a faulty or jamming opcode, or a self-jump with check_stuck.
+HALTED = 1
+
+Index = numpy.ndarray
+
+_SIZE = MEM_SIZE + _TAIL
+# Addresses are taken modulo memory size. Stack addresses are not wrapped by JSR and RTS,
+# and negative addresses index FlatBus memory from its end. Addresses beyond memory would
+# raise in FlatBus, which only badly broken code does.
+
+
+def _itobcd(v: numpy.ndarray) -> numpy.ndarray:
+    return (v % 10) | ((v // 10) % 10) << 4
+
+
+class VectorMachine:
+    """
+    N flat memory machines (see flat.FlatMachine) executing in lockstep.
+
+    Registers are arrays of N and memory is an (N, 64 KB) array. Each step runs one instruction
+    on every machine: machines are grouped by their current opcode, and each group is
+    run with array operations. Machines following the same code path share the cost of
+    interpretation, so aggregate speed grows with N as long as the paths do not diverge much.
+
+    Results are identical to FlatMachine, including the quirks of the interpreter
+    and cycle counts. Differences:
+
+    - Only BRK interrupts, no IRQ or NMI.
+    - Faulty and jamming opcodes, and self-jumps with check_stuck, halt the machine
+      (see status) instead of raising out of run.
+    - Nothing is logged or printed.
+    """
+
+    def __init__(self, n: int, data: bytes = b"", start: int = 0, check_stuck: bool = False):
+        """
+        :param n: Count of machines.
+        :param data: Initial memory contents of every machine.
+        :param start: Address of data.
+        :param check_stuck: Halt machines jumping to the jump itself, see CPU.check_stuck.
+        """
+        self.n = n
+        self.check_stuck = check_stuck
+        # Tail beyond 64 KB like in FlatBus, reads give zero and writes are ignored.
+        self.mem = numpy.zeros((n, _SIZE), dtype=numpy.uint8)
+        self._flat = self.mem.reshape(-1)
+        self.mem[:, start : start + len(data)] = numpy.frombuffer(bytes(data), dtype=numpy.uint8)
+        self.pc = numpy.zeros(n, dtype=numpy.int64)
+        self.sp = numpy.full(n, 0xFF, dtype=numpy.int64)
+        self.p = numpy.full(n, _B | _R, dtype=numpy.int64)
+        self.a = numpy.zeros(n, dtype=numpy.int64)
+        self.x = numpy.zeros(n, dtype=numpy.int64)
+        self.y = numpy.zeros(n, dtype=numpy.int64)
+        self.cycles = numpy.zeros(n, dtype=numpy.int64)
+        # BRK executed, the interrupt is taken before next instruction.
+        self.brk = numpy.zeros(n, dtype=bool)
+        self.status = numpy.zeros(n, dtype=numpy.uint8)
+        # Total count of instructions executed.
+        self.instructions = 0
+        self._handlers = _handlers()
+
+    def reset(self, pc: typing.Optional[int] = None):
+        """
+        Reset CPUs of all machines, like CPU.reset. Memory is kept.
+
+        :param pc: Start address, instead of reset vector of each machine.
+        """
+        if pc is None:
+            self.pc[:] = self.mem[:, 0xFFFC].astype(numpy.int64) | self.mem[:, 0xFFFD].astype(numpy.int64) << 8
+        else:
+            self.pc[:] = pc
+        self.sp[:] = 0xFF
+        self.p[:] = _B | _R
+        self.a[:] = self.x[:] = self.y[:] = 0
+        self.cycles[:] = 0
+        self.brk[:] = False
+        self.status[:] = RUNNING
+
+    def load_machine(self, i: int, machine: FlatMachine):
+        """
+        Copy state of a flat machine into machine i.
+        """
+        cpu = machine.cpu
+        self.mem[i, :MEM_SIZE] = numpy.frombuffer(bytes(machine.mem[:MEM_SIZE]), dtype=numpy.uint8)
+        self.mem[i, MEM_SIZE:] = 0
+        self.pc[i], self.sp[i], self.p[i] = cpu.pc, cpu.sp, cpu.p.val
+        self.a[i], self.x[i], self.y[i] = cpu.A, cpu.X, cpu.Y
+        self.cycles[i] = machine.clock.cycles
+        self.brk[i] = cpu.irq == CPU.IRQ.BRK
+        self.status[i] = RUNNING
+
+    def machine(self, i: int) -> FlatMachine:
+        """
+        :return: Copy of machine i as FlatMachine, e.g. for debugging it.
+        """
+        out = FlatMachine()
+        out.mem[:MEM_SIZE] = self.mem[i, :MEM_SIZE].tobytes()
+        cpu = out.cpu
+        cpu.pc, cpu.sp, cpu.p.val = int(self.pc[i]), int(self.sp[i]), int(self.p[i])
+        cpu.A, cpu.X, cpu.Y = int(self.a[i]), int(self.x[i]), int(self.y[i])
+        cpu.irq = CPU.IRQ.BRK if self.brk[i] else CPU.IRQ.NONE
+        out.clock.cycles = int(self.cycles[i])
+        return out
+
+    def step(self, active: typing.Optional[Index] = None) -> int:
+        """
+        Run one instruction on each of the active machines.
+
+        :param active: Indices of machines to run. Default is all running machines.
+        :return: Count of machines run.
+        """
+        if active is None:
+            active = numpy.flatnonzero(self.status == RUNNING)
+        if len(active) == 0:
+            return 0
+
+        taking = active[self.brk[active]]
+        if len(taking):
+            self._interrupt(taking)
+
+        opcodes = self._flat.take(active * _SIZE + self.pc[active] % _SIZE)
+        # Stable sort of bytes is a radix sort.
+        order = numpy.argsort(opcodes, kind="stable")
+        ordered = opcodes[order]
+        bounds = numpy.flatnonzero(ordered[1:] != ordered[:-1]) + 1
+        starts = numpy.concatenate(([0], bounds))
+        ends = numpy.concatenate((bounds, [len(ordered)]))
+        handlers = self._handlers
+        for s, e in zip(starts, ends):
+            handlers[ordered[s]](self, active[order[s:e]])
+        self.instructions += len(active)
+        return len(active)
+
+    def run(self, cycles: int = -1, max_steps: int = -1) -> int:
+        """
+        Run each machine until it has run for the given cycles, like FlatMachine.run,
+        or until it halts.
+
+        :param cycles: Cycles to run each machine, -1 for no limit.
+        :param max_steps: Maximum count of steps, -1 for no limit.
+        :return: Count of steps.
+        """
+        end = self.cycles + cycles
+        steps = 0
+        while steps != max_steps:
+            running = self.status == RUNNING
+            if cycles >= 0:
+                running &= self.cycles < end
+            if not self.step(numpy.flatnonzero(running)):
+                break
+            steps += 1
+        return steps
+
+    # region Memory access
+
+    def _read(self, idx: Index, addr: numpy.ndarray) -> numpy.ndarray:
+        return self._flat.take(idx * _SIZE + addr % _SIZE).astype(numpy.int64)
+
+    def _read16(self, idx: Index, addr: numpy.ndarray) -> numpy.ndarray:
+        return self._read(idx, addr) | self._read(idx, addr + 1) << 8
+
+    def _write(self, idx: Index, addr: numpy.ndarray, val: numpy.ndarray):
+        ok = addr < MEM_SIZE
+        if not ok.all():
+            idx, addr, val = idx[ok], addr[ok], val[ok]
+        self._flat[idx * _SIZE + addr % _SIZE] = val
+
+    def _nz(self, idx: Index, val: numpy.ndarray):
+        self.p[idx] = (self.p[idx] & ~(_N | _Z)) | _NZ[val & 0xFF]
+
+    def _push(self, idx: Index, val: numpy.ndarray):
+        sp = self.sp[idx]
+        self._write(idx, 0x100 + sp, val)
+        sp = sp - 1
+        self.sp[idx] = numpy.where(sp < 0, 0xFF, sp)
+
+    def _pop(self, idx: Index) -> numpy.ndarray:
+        sp = self.sp[idx] + 1
+        sp = numpy.where(sp > 0xFF, 0, sp)
+        self.sp[idx] = sp
+        return self._read(idx, 0x100 + sp)
+
+    def _interrupt(self, idx: Index):
+        isr = self._read16(idx, numpy.full(len(idx), 0xFFFE))
+        self.p[idx] |= _B
+        pc = self.pc[idx]
+        self._push(idx, pc >> 8)
+        self._push(idx, pc & 0xFF)
+        self._push(idx, self.p[idx])
+        self.pc[idx] = isr
+        self.p[idx] |= _I
+        self.brk[idx] = False
+
+    # endregion
+
+
+# region Addressing modes
+# Called with machine, indices and PC after opcode.
+# Return address or None, value or None and PC after the instruction.
+
+
+def _a_none(vm: VectorMachine, idx: Index, pc):
+    return None, None, pc
+
+
+def _a_imm(vm: VectorMachine, idx: Index, pc):
+    return None, vm._read(idx, pc), pc + 1
+
+
+def _a_acc(vm: VectorMachine, idx: Index, pc):
+    return None, vm.a[idx], pc
+
+
+def _a_abs(vm: VectorMachine, idx: Index, pc):
+    return vm._read16(idx, pc), None, pc + 2
+
+
+def _a_absx(vm: VectorMachine, idx: Index, pc):
+    return vm._read16(idx, pc) + vm.x[idx], None, pc + 2
+
+
+def _a_absy(vm: VectorMachine, idx: Index, pc):
+    return vm._read16(idx, pc) + vm.y[idx], None, pc + 2
+
+
+def _a_ind(vm: VectorMachine, idx: Index, pc):
+    return vm._read16(idx, vm._read16(idx, pc)), None, pc + 2
+
+
+def _a_indx(vm: VectorMachine, idx: Index, pc):
+    base = vm._read(idx, pc) + vm.x[idx]
+    base = numpy.where(base > 0xFF, base - 0x100, base)
+    return vm._read16(idx, base), None, pc + 1
+
+
+def _a_indy(vm: VectorMachine, idx: Index, pc):
+    zoff = vm._read(idx, pc)
+    off = vm._read(idx, zoff) + vm.y[idx]
+    hb = vm._read(idx, zoff + 1) + (off > 0xFF)
+    return (off & 0xFF) | hb << 8, None, pc + 1
+
+
+def _a_rel(vm: VectorMachine, idx: Index, pc):
+    rel = vm._read(idx, pc)
+    return pc + 1 + numpy.where(rel >= 0x80, rel - 0x100, rel), None, pc + 1
+
+
+def _a_zero(vm: VectorMachine, idx: Index, pc):
+    return vm._read(idx, pc), None, pc + 1
+
+
+def _a_zerox(vm: VectorMachine, idx: Index, pc):
+    return (vm._read(idx, pc) + vm.x[idx]) & 0xFF, None, pc + 1
+
+
+def _a_zeroy(vm: VectorMachine, idx: Index, pc):
+    return (vm._read(idx, pc) + vm.y[idx]) & 0xFF, None, pc + 1
+
+
+# Vector version and clock waits of each addressing mode.
+_ADDRESSING = {
+    afault: (_a_none, 0),
+    aimpl: (_a_none, 0),
+    aimm: (_a_imm, 1),
+    aacc: (_a_acc, 0),
+    aabs: (_a_abs, 2),
+    aabsx: (_a_absx, 2),
+    aabsy: (_a_absy, 2),
+    aind: (_a_ind, 0),
+    aindx: (_a_indx, 3),
+    aindy: (_a_indy, 2),
+    arel: (_a_rel, 0),
+    azero: (_a_zero, 0),
+    azerox: (_a_zerox, 0),
+    azeroy: (_a_zeroy, 0),
+}
+
+# endregion
+
+
+# region Instructions
+# Called with machine, indices, address and value from addressing mode, and whether
+# the result is saved into A (accumulator addressing). PC is already past the instruction.
+
+
+def _value(vm: VectorMachine, idx: Index, addr, data):
+    return data if data is not None else vm._read(idx, addr)
+
+
+def _load(reg: str):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        v = _value(vm, idx, addr, data)
+        getattr(vm, reg)[idx] = v
+        vm._nz(idx, v)
+
+    return op
+
+
+def _store(reg: str):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        vm._write(idx, addr, getattr(vm, reg)[idx])
+
+    return op
+
+
+def _transfer(src: str, dst: str):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        v = getattr(vm, src)[idx]
+        # Like CPU register setters; only SP can be out of 8 bits.
+        v = numpy.where(v < 0, v + 0x100, numpy.where(v > 0xFF, v - 0x100, v))
+        getattr(vm, dst)[idx] = v
+        vm._nz(idx, v)
+
+    return op
+
+
+def _txs(vm: VectorMachine, idx: Index, addr, data, acc):
+    vm.sp[idx] = vm.x[idx]
+
+
+def _step(reg: str, delta: int):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        v = (getattr(vm, reg)[idx] + delta) & 0xFF
+        getattr(vm, reg)[idx] = v
+        vm._nz(idx, v)
+
+    return op
+
+
+def _step_mem(delta: int):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        v = (vm._read(idx, addr) + delta) & 0xFF
+        vm._write(idx, addr, v)
+        vm._nz(idx, v)
+
+    return op
+
+
+def _adc(vm: VectorMachine, idx: Index, addr, data, acc):
+    p = vm.p[idx]
+    dec = (p & _D) != 0
+    a = vm.a[idx]
+    b = _value(vm, idx, addr, data)
+    a = numpy.where(dec, _BCD_TO_I[a], a)
+    b = numpy.where(dec, _BCD_TO_I[b], b)
+    m = a + b + (p & _C)
+    v = (a ^ b) & 0x80
+    carry = numpy.where(dec, m > 99, m > 0xFF)
+    m = numpy.where(dec, m, m & 0xFF)
+    overflow = (v == 0) & (((a ^ m) & 0x80) != 0)
+    m = numpy.where(dec, _itobcd(m), m)
+    vm.p[idx] = (
+        (p & ~(_C | _V | _N | _Z))
+        | numpy.where(carry, _C, 0)
+        | numpy.where(overflow, _V, 0)
+        | _NZ[m & 0xFF]
+    )
+    vm.a[idx] = m
+
+
+def _sbc(vm: VectorMachine, idx: Index, addr, data, acc):
+    p = vm.p[idx]
+    dec = (p & _D) != 0
+    a = vm.a[idx]
+    b = _value(vm, idx, addr, data)
+    a = numpy.where(dec, _BCD_TO_I[a], a)
+    b = numpy.where(dec, _BCD_TO_I[b], b)
+    m = a - b - (1 - (p & _C))
+    v = (a ^ b) & 0x80
+    carry = m >= 0
+    m = numpy.where(dec & ~carry, m + 100, m) & 0xFF
+    overflow = (v != 0) & (((a ^ m) & 0x80) != 0)
+    m = numpy.where(dec, _itobcd(m), m)
+    vm.p[idx] = (
+        (p & ~(_C | _V | _N | _Z))
+        | numpy.where(carry, _C, 0)
+        | numpy.where(overflow, _V, 0)
+        | _NZ[m & 0xFF]
+    )
+    vm.a[idx] = m
+
+
+def _compare(reg: str):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        m = _value(vm, idx, addr, data)
+        r = getattr(vm, reg)[idx]
+        vm.p[idx] = (vm.p[idx] & ~(_C | _N | _Z)) | _NZ[(r - m) & 0xFF] | numpy.where(r >= m, _C, 0)
+
+    return op
+
+
+def _bit(vm: VectorMachine, idx: Index, addr, data, acc):
+    m = _value(vm, idx, addr, data)
+    z = numpy.where((vm.a[idx] & m) == 0, _Z, 0)
+    vm.p[idx] = (vm.p[idx] & ~(_N | _V | _Z)) | (m & (_N | _V)) | z
+
+
+def _logic(fn):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        v = fn(_value(vm, idx, addr, data), vm.a[idx])
+        vm.a[idx] = v
+        vm._nz(idx, v)
+
+    return op
+
+
+def _shift(fn):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        v = _value(vm, idx, addr, data)
+        p = vm.p[idx]
+        v, carry = fn(v, p & _C)
+        if acc:
+            vm.a[idx] = v
+        else:
+            vm._write(idx, addr, v)
+        vm.p[idx] = (p & ~(_C | _N | _Z)) | carry | _NZ[v]
+
+    return op
+
+
+def _branch(mask: int, taken_if_set: bool):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        cond = (vm.p[idx] & mask) != 0
+        if not taken_if_set:
+            cond = ~cond
+        vm.pc[idx] = numpy.where(cond, addr, vm.pc[idx])
+
+    return op
+
+
+def _jmp(vm: VectorMachine, idx: Index, addr, data, acc):
+    vm.pc[idx] = addr
+
+
+def _jsr(vm: VectorMachine, idx: Index, addr, data, acc):
+    ra = vm.pc[idx] - 1
+    sp = vm.sp[idx]
+    vm._write(idx, 0x100 + sp - 1, ra & 0xFF)
+    vm._write(idx, 0x100 + sp, ra >> 8)
+    vm.sp[idx] = sp - 2
+    vm.pc[idx] = addr
+
+
+def _rts(vm: VectorMachine, idx: Index, addr, data, acc):
+    sp = vm.sp[idx]
+    pch = vm._read(idx, 0x100 + sp + 2)
+    pcl = vm._read(idx, 0x100 + sp + 1)
+    vm.sp[idx] = sp + 2
+    vm.pc[idx] = (pch << 8) + pcl + 1
+
+
+def _rti(vm: VectorMachine, idx: Index, addr, data, acc):
+    vm.p[idx] = vm._pop(idx) | _R
+    pcl = vm._pop(idx)
+    pch = vm._pop(idx)
+    vm.pc[idx] = (pch << 8) + pcl
+
+
+def _brk(vm: VectorMachine, idx: Index, addr, data, acc):
+    vm.pc[idx] += 1
+    vm.brk[idx] = True
+
+
+def _php(vm: VectorMachine, idx: Index, addr, data, acc):
+    vm._push(idx, vm.p[idx])
+
+
+def _plp(vm: VectorMachine, idx: Index, addr, data, acc):
+    # B is set as no interrupt is being handled in the middle of an instruction.
+    vm.p[idx] = vm._pop(idx) | _R | _B
+
+
+def _pha(vm: VectorMachine, idx: Index, addr, data, acc):
+    vm._push(idx, vm.a[idx])
+
+
+def _pla(vm: VectorMachine, idx: Index, addr, data, acc):
+    v = vm._pop(idx)
+    vm.a[idx] = v
+    vm._nz(idx, v)
+
+
+def _set_flag(mask: int, value: bool):
+    def op(vm: VectorMachine, idx: Index, addr, data, acc):
+        if value:
+            vm.p[idx] |= mask
+        else:
+            vm.p[idx] &= ~mask
+
+    return op
+
+
+def _nop(vm: VectorMachine, idx: Index, addr, data, acc):
+    pass
+
+
+def _halt(vm: VectorMachine, idx: Index, addr, data, acc):
+    vm.status[idx] = HALTED
+
+
+# Instructions checking for self-jumps, see CPU.check_stuck.
+_JUMPS = {jmp, bcc, bcs, bne, beq, bvc, bvs, bpl, bmi}
+# Instructions reading their operand with _data_or_read, which waits a cycle for memory operands.
+_READS = {lda, ldx, ldy, adc, sbc, cmp, cpx, cpy, bit, iand, ora, eor, asl, lsr, rol, ror}
+
+# Vector version and clock waits of each instruction, not counting the operand read.
+_INSTRUCTIONS = {
+    fault: (_halt, 0),
+    jam: (_halt, 0),
+    nop: (_nop, 0),
+    lda: (_load("a"), 0),
+    ldx: (_load("x"), 0),
+    ldy: (_load("y"), 0),
+    sta: (_store("a"), 1),
+    stx: (_store("x"), 1),
+    sty: (_store("y"), 1),
+    tax: (_transfer("a", "x"), 0),
+    txa: (_transfer("x", "a"), 0),
+    tay: (_transfer("a", "y"), 0),
+    tya: (_transfer("y", "a"), 0),
+    tsx: (_transfer("sp", "x"), 0),
+    txs: (_txs, 0),
+    inx: (_step("x", 1), 1),
+    iny: (_step("y", 1), 1),
+    dex: (_step("x", -1), 1),
+    dey: (_step("y", -1), 1),
+    inc: (_step_mem(1), 0),
+    dec: (_step_mem(-1), 0),
+    adc: (_adc, 0),
+    sbc: (_sbc, 0),
+    jsr: (_jsr, 3),
+    rts: (_rts, 5),
+    rti: (_rti, 0),
+    brk: (_brk, 0),
+    clc: (_set_flag(_C, False), 0),
+    sec: (_set_flag(_C, True), 0),
+    cld: (_set_flag(_D, False), 0),
+    sed: (_set_flag(_D, True), 0),
+    cli: (_set_flag(_I, False), 0),
+    sei: (_set_flag(_I, True), 0),
+    clv: (_set_flag(_V, False), 0),
+    cmp: (_compare("a"), 0),
+    cpx: (_compare("x"), 0),
+    cpy: (_compare("y"), 0),
+    bit: (_bit, 0),
+    jmp: (_jmp, 0),
+    bcc: (_branch(_C, False), 0),
+    bcs: (_branch(_C, True), 0),
+    bne: (_branch(_Z, False), 0),
+    beq: (_branch(_Z, True), 0),
+    bvc: (_branch(_V, False), 0),
+    bvs: (_branch(_V, True), 0),
+    bpl: (_branch(_N, False), 0),
+    bmi: (_branch(_N, True), 0),
+    asl: (_shift(lambda v, c: ((v << 1) & 0xFF, v >> 7)), 0),
+    lsr: (_shift(lambda v, c: (v >> 1, v & 1)), 0),
+    rol: (_shift(lambda v, c: (((v << 1) | c) & 0xFF, v >> 7)), 0),
+    ror: (_shift(lambda v, c: ((v >> 1) | (c << 7), v & 1)), 0),
+    iand: (_logic(numpy.bitwise_and), 0),
+    ora: (_logic(numpy.bitwise_or), 0),
+    eor: (_logic(numpy.bitwise_xor), 0),
+    php: (_php, 0),
+    plp: (_plp, 0),
+    pha: (_pha, 0),
+    pla: (_pla, 0),
+}
+
+# endregion
+
+
+def _handler(instruction, addressing):
+    mode, mode_waits = _ADDRESSING[addressing]
+    op, op_waits = _INSTRUCTIONS[instruction]
+    # Opcode fetch, addressing, operand read and instruction.
+    cycles = 1 + mode_waits + op_waits
+    if instruction in _READS and addressing not in (aimm, aacc):
+        cycles += 1
+    if op is _halt:
+        cycles = 1
+    acc = addressing is aacc
+    jump = instruction in _JUMPS
+
+    def handle(vm: VectorMachine, idx: Index):
+        spc = vm.pc[idx]
+        addr, data, pc = mode(vm, idx, spc + 1)
+        vm.pc[idx] = pc
+        vm.cycles[idx] += cycles
+        op(vm, idx, addr, data, acc)
+        if jump and vm.check_stuck:
+            stuck = vm.pc[idx] == spc
+            if stuck.any():
+                vm.status[idx[stuck]] = HALTED
+
+    return handle
+
+
+def _handlers() -> typing.List[typing.Callable[[VectorMachine, Index], None]]:
+    return [_handler(instruction, addressing) for instruction, addressing, _, _ in ISet().iset]
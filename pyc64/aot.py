@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from py65xx.bus import MMap
+
+# KERNAL jump table, JMP instructions three bytes apart.
+KERNAL_JUMP_TABLE = range(0xFF81, 0xFFF4, 3)
+# Default RAM vectors at $0314 (IRQ, BRK, NMI, OPEN ... USRCMD, LOAD, SAVE).
+KERNAL_VECTORS = (0xFD30, 16)
+# CPU vectors: NMI, reset, IRQ.
+CPU_VECTORS = (0xFFFA, 3)
+
+# BASIC cold and warm start.
+BASIC_START = (0xA000, 2)
+# Statement dispatch, address - 1 for RTS, tokens $80-$A2.
+BASIC_STATEMENTS = (0xA00C, 35)
+# Function dispatch, tokens $B4-$CA.
+BASIC_FUNCTIONS = (0xA052, 23)
+# Operator table: priority and address - 1 of + - * / ^ AND OR, unary minus, NOT and comparison.
+BASIC_OPERATORS = (0xA080, 10)
+# Default RAM vectors at $0300 (IERROR, IMAIN, ICRNCH, IQPLOP, IGONE, IEVAL).
+BASIC_VECTORS = (0xE447, 6)
+
+
+def _word(read: typing.Callable[[int], int], addr: int) -> int:
+    return read(addr) | read(addr + 1) << 8
+
+
+def seeds(basic: MMap, kernal: MMap) -> typing.List[int]:
+    """
+    Entry points of BASIC and KERNAL code for static translation, see py65xx.aot.
+
+    The tables are read from the given ROMs, so addresses are right only for the standard ROMs.
+    A wrong seed only makes the translator translate some data too.
+    """
+
+    def read(addr: int) -> int:
+        for rom in (basic, kernal):
+            if rom.start_addr <= addr <= rom.end_addr:
+                return rom.data[addr - rom.start_addr]
+        return 0
+
+    out = list(KERNAL_JUMP_TABLE)
+    for table, count in (CPU_VECTORS, KERNAL_VECTORS, BASIC_START, BASIC_FUNCTIONS, BASIC_VECTORS):
+        out += [_word(read, table + 2 * i) for i in range(count)]
+    table, count = BASIC_STATEMENTS
+    out += [_word(read, table + 2 * i) + 1 for i in range(count)]
+    table, count = BASIC_OPERATORS
+    out += [_word(read, table + 3 * i + 1) + 1 for i in range(count)]
+    return out
@@ -0,0 +1,831 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import math
+import typing
+
+if typing.TYPE_CHECKING:
+    from py65xx.cpu65xx import CPU
+
+from py65xx.bus import RAM
+from py65xx.traps import Trap
+
+# Floating point accumulator: exponent, 4 bytes of mantissa, sign. Rounding byte is separate.
+FAC = 0x61
+FAC_SIGN = 0x66
+# Fill byte of mantissa shifts.
+BITS = 0x68
+# Argument register, as FAC.
+ARG = 0x69
+ARG_SIGN = 0x6E
+# Sign of FAC xor sign of ARG.
+ARISGN = 0x6F
+FAC_ROUND = 0x70
+ARG_ROUND = 0x56
+# Result of multiplication and division, 4 bytes.
+RESULT = 0x26
+
+# Entry points taking the operand in ARG, the sign comparison in ARISGN, and exponent of FAC in A.
+FADDT = 0xB86A
+FMULTT = 0xBA2B
+FDIVT = 0xBB12
+# Errors: overflow, and division by zero.
+OVERFLOW = 0xB97E
+DIVISION_BY_ZERO = 0xBB8A
+
+# ROM code implemented here, as (address, hex) of each routine.
+_RTS_B848 = (0xB848, "60")
+_FADD = (
+    0xB862,
+    "2099b9903c208cbad0034cfcbba6708656a269a569a8f0ce38e561f024901284"
+    "61a46e846649ff6900a0008456a261d004a0008470c9f930c7a8a570560120b0"
+    "b9246f1057a061e069f002a0693849ff65568570b90400f5048565b90300f503"
+    "8564b90200f5028563b90100f5018562b0032047b9",
+)
+_NORMALIZE = (
+    0xB8D7,
+    "a0009818a662d04aa6638662a6648663a6658664a670866584706908c920d0e4"
+    "a900856185666065568570a565656d8565a564656c8564a563656b8563a56265"
+    "6a85624c36b969010670266526642663266210f238e561b0c749ff6901856190"
+    "0ee661f0426662666366646665667060a56649ff8566a56249ff8562a56349ff"
+    "8563a56449ff8564a56549ff8565a57049ff8570e670d00ee665d00ae664d006"
+    "e663d002e66260",
+)
+_SHIFT_RIGHT = (
+    0xB983,
+    "a225b4048470b4039404b4029403b4019402a4689401690830e8f0e6e908a8a5"
+    "70b01416019002f601760176017602760376046ac8d0ec1860",
+)
+_MULTIPLY = (
+    0xBA2B,
+    "d0034c8bba20b7baa9008526852785288529a5702059baa5652059baa5642059"
+    "baa5632059baa562205eba4c8fbbd0034c83b94a0980a8901918a529656d8529"
+    "a528656c8528a527656b8527a526656a852666266627662866296670984ad0d6"
+    "60",
+)
+_MULDIV = (
+    0xBAB7,
+    "a569f01f1865619004301d182c101469808561d0034cfbb8a56f856660a56649"
+    "ff300568684cf7b84c7eb9",
+)
+_MOVE_RESULT = (0xBB8F, "a5268562a5278563a5288564a52985654cd7b8")
+_DIVIDE = (
+    0xBB12,
+    "f076201bbca90038e561856120b7bae661f0baa2fca901a46ac462d010a46bc4"
+    "63d00aa46cc464d004a46dc465082a9009e89529f0321034a90128b00e066d26"
+    "6c266b266ab0e630ce10e2a8a56de565856da56ce564856ca56be563856ba56a"
+    "e562856a984c4fbba940d0ce0a0a0a0a0a0a8570284c8fbb",
+)
+_ROUND = (0xBC1A, "60a561f0fb067090f7206fb9d0f24c38b9")
+_MOVE_ARG = (0xBBFC, "a56e8566a205b5689560cad0f9867060")
+
+
+def _code(*blocks: typing.Tuple[int, str]) -> typing.Tuple[typing.Tuple[int, bytes], ...]:
+    return tuple((addr, bytes.fromhex(text)) for addr, text in blocks)
+
+
+_C, _Z, _I, _D, _B, _RES, _V, _N = (1 << i for i in range(8))
+
+
+class _Regs:
+    """
+    Registers and flags of the ROM code run natively, and its zero page and stack.
+    Instructions change flags and memory as the interpreter does.
+
+    Cycles are counted as the interpreter takes them for the instructions run. Stack instructions done
+    by methods here count their own, the routines count the rest.
+    """
+
+    __slots__ = ("mem", "a", "x", "y", "p", "sp", "pc", "cycles")
+
+    def __init__(self, cpu: CPU, mem):
+        self.mem = mem
+        self.a, self.x, self.y = cpu.A, cpu.X, cpu.Y
+        self.p = cpu.p.val
+        self.sp = cpu.sp
+        # Address of the instruction the ROM code continues at.
+        self.pc = 0
+        # Cycles of the ROM code up to pc, including the opcode fetch of the trapped instruction.
+        self.cycles = 0
+
+    def nz(self, v: int) -> int:
+        self.p = self.p & ~(_N | _Z) | v & _N | (0 if v else _Z)
+        return v
+
+    def lda(self, v: int):
+        self.a = self.nz(v)
+
+    def adc(self, b: int):
+        a = self.a
+        m = a + b + (self.p & _C)
+        p = self.p & ~(_N | _V | _Z | _C)
+        if m > 0xFF:
+            p |= _C
+            m &= 0xFF
+        if not (a ^ b) & 0x80 and (a ^ m) & 0x80:
+            p |= _V
+        self.p = p
+        self.a = self.nz(m)
+
+    def sbc(self, b: int):
+        a = self.a
+        m = a - b - (0 if self.p & _C else 1)
+        p = self.p & ~(_N | _V | _Z | _C)
+        if m >= 0:
+            p |= _C
+        m &= 0xFF
+        if (a ^ b) & 0x80 and (a ^ m) & 0x80:
+            p |= _V
+        self.p = p
+        self.a = self.nz(m)
+
+    def cmp(self, reg: int, b: int):
+        self.nz((reg - b) & 0xFF)
+        self.p = self.p | _C if reg >= b else self.p & ~_C
+
+    def asl(self, v: int) -> int:
+        self.p = self.p | _C if v & 0x80 else self.p & ~_C
+        return self.nz((v << 1) & 0xFF)
+
+    def rol(self, v: int) -> int:
+        c = self.p & _C
+        self.p = self.p | _C if v & 0x80 else self.p & ~_C
+        return self.nz((v << 1) & 0xFF | c)
+
+    def ror(self, v: int) -> int:
+        c = self.p & _C
+        self.p = self.p | _C if v & 1 else self.p & ~_C
+        return self.nz(v >> 1 | c << 7)
+
+    def lsr(self, v: int) -> int:
+        self.p = self.p | _C if v & 1 else self.p & ~_C
+        return self.nz(v >> 1)
+
+    def m_asl(self, addr: int):
+        self.mem[addr] = self.asl(self.mem[addr])
+
+    def m_rol(self, addr: int):
+        self.mem[addr] = self.rol(self.mem[addr])
+
+    def m_ror(self, addr: int):
+        self.mem[addr] = self.ror(self.mem[addr])
+
+    def m_inc(self, addr: int):
+        self.mem[addr] = self.nz((self.mem[addr] + 1) & 0xFF)
+
+    def jsr(self, ret: int):
+        """
+        :param ret: Address after the JSR instruction.
+        """
+        ret -= 1
+        self.mem[0x100 + self.sp - 1] = ret & 0xFF
+        self.mem[0x100 + self.sp] = ret >> 8
+        self.sp -= 2
+        self.cycles += 6
+
+    def rts(self):
+        self.sp += 2
+        self.cycles += 6
+
+    def php(self):
+        self.mem[0x100 + self.sp] = self.p
+        self.sp -= 1
+        self.cycles += 1
+
+    def plp(self):
+        self.sp += 1
+        # Interrupt requests are handled before instructions, so none is pending and B is set.
+        self.p = self.mem[0x100 + self.sp] | _RES | _B
+        self.cycles += 1
+
+    def pla(self):
+        self.sp += 1
+        self.lda(self.mem[0x100 + self.sp])
+        self.cycles += 1
+
+
+# Routines below are named by their addresses, and follow the ROM code instruction by instruction,
+# except loops done at once where their effect on registers and flags is known.
+# A routine returns normally at its RTS. On error, r.pc is set to the error code, and the rest is skipped.
+# Cycles are added per run of instructions, commented with their addresses. The RTS a routine ends at
+# is counted by the r.rts() of its caller.
+
+
+class _Error(Exception):
+    pass
+
+
+def _overflow(r: _Regs):
+    r.pc = OVERFLOW
+    raise _Error()
+
+
+def _shift_right(r: _Regs, x: int, entry: int):
+    """
+    Shift the mantissa at x + 1 ... x + 4 right, through the rounding byte. B983 and its entries:
+    B985 moves a byte first, B999 with A = -count, and B9B0 in the middle of a bit shift, with Y = -count.
+    """
+    m = r.mem
+    if entry == 0xB9B0:
+        # Rest of the first step of the loop, done below.
+        r.m_ror((x + 2) & 0xFF)
+        r.m_ror((x + 3) & 0xFF)
+        r.m_ror((x + 4) & 0xFF)
+        r.a = r.ror(r.a)
+        r.y = r.nz((r.y + 1) & 0xFF)
+        r.cycles += 10  # B9B0-B9B8
+        if r.y != 0:
+            _shift_bits(r, x)
+        r.p &= ~_C
+        r.cycles += 1  # B9BA
+        return
+    r.x = x
+    while True:
+        if entry == 0xB985:
+            r.y = m[(x + 4) & 0xFF]
+            m[FAC_ROUND] = r.y
+            for i in (3, 2, 1):
+                r.y = m[(x + i) & 0xFF]
+                m[(x + i + 1) & 0xFF] = r.y
+            r.y = m[BITS]
+            m[(x + 1) & 0xFF] = r.y
+            r.cycles += 20  # B985-B997
+        entry = 0xB985
+        r.adc(0x08)
+        r.cycles += 3  # B999-B99B
+        if r.p & _N:
+            continue
+        r.cycles += 1  # B99D
+        if r.p & _Z:
+            continue
+        break
+    r.sbc(0x08)
+    r.y = r.nz(r.a)
+    r.lda(m[FAC_ROUND])
+    r.cycles += 6  # B99F-B9A4
+    if not r.p & _C:
+        _shift_bits(r, x)
+    r.p &= ~_C
+    r.cycles += 1  # B9BA
+
+
+def _shift_bits(r: _Regs, x: int):
+    # B9A6: ASL/INC/ROR/ROR keep the sign bit of the top byte while shifting right.
+    m = r.mem
+    while True:
+        r.m_asl((x + 1) & 0xFF)
+        if r.p & _C:
+            r.m_inc((x + 1) & 0xFF)
+            r.cycles += 1  # B9AA
+        r.m_ror((x + 1) & 0xFF)
+        r.m_ror((x + 1) & 0xFF)
+        r.m_ror((x + 2) & 0xFF)
+        r.m_ror((x + 3) & 0xFF)
+        r.m_ror((x + 4) & 0xFF)
+        r.a = r.ror(r.a)
+        r.y = r.nz((r.y + 1) & 0xFF)
+        r.cycles += 17  # B9A6-B9A8, B9AC-B9B8
+        if r.y == 0:
+            return
+
+
+def _complement(r: _Regs):
+    # B947: negate the sign and the mantissa with the rounding byte.
+    m = r.mem
+    for addr in (FAC_SIGN, FAC + 1, FAC + 2, FAC + 3, FAC + 4, FAC_ROUND):
+        r.lda(m[addr] ^ 0xFF)
+        m[addr] = r.a
+    r.m_inc(FAC_ROUND)
+    r.cycles += 38  # B947-B96D
+    if not r.p & _Z:
+        return
+    _increment(r)
+
+
+def _increment(r: _Regs):
+    # B96F: increment the mantissa.
+    for addr in (FAC + 4, FAC + 3, FAC + 2):
+        r.m_inc(addr)
+        r.cycles += 2  # INC, BNE
+        if not r.p & _Z:
+            return
+    r.m_inc(FAC + 1)
+    r.cycles += 1  # B97B
+
+
+def _zero(r: _Regs):
+    # B8F7
+    r.lda(0)
+    r.mem[FAC] = 0
+    r.mem[FAC_SIGN] = 0
+    r.cycles += 6  # B8F7-B8FB
+    r.pc = 0xB8FD
+
+
+def _normalize(r: _Regs):
+    """
+    B8D7: normalize FAC after an operation. Sets r.pc to the RTS it ends at.
+    """
+    m = r.mem
+    r.y = r.nz(0)
+    r.lda(r.y)
+    r.p &= ~_C
+    r.cycles += 4  # B8D7-B8DA
+    while True:
+        r.x = r.nz(m[FAC + 1])
+        r.cycles += 3  # B8DB-B8DD
+        if r.x:
+            break
+        for i in (1, 2, 3):
+            r.x = r.nz(m[FAC + i + 1])
+            m[FAC + i] = r.x
+        r.x = r.nz(m[FAC_ROUND])
+        m[FAC + 4] = r.x
+        m[FAC_ROUND] = r.y
+        r.adc(0x08)
+        r.cmp(r.a, 0x20)
+        r.cycles += 23  # B8DF-B8F5
+        if r.a == 0x20:
+            _zero(r)
+            return
+    # B929: shift bits left until the top bit is set.
+    while not r.p & _N:
+        r.adc(0x01)
+        r.m_asl(FAC_ROUND)
+        for i in (4, 3, 2, 1):
+            r.m_rol(FAC + i)
+        r.cycles += 13  # B929, B91D-B927
+    r.p |= _C
+    r.sbc(m[FAC])
+    r.cycles += 5  # B929-B92E
+    if r.p & _C:
+        _zero(r)
+        return
+    r.lda(r.a ^ 0xFF)
+    r.adc(0x01)
+    m[FAC] = r.a
+    r.cycles += 6  # B930-B934
+    _carry_exponent(r)
+
+
+def _carry_exponent(r: _Regs):
+    # B936: with carry from the mantissa, increment the exponent and shift the carry in.
+    r.cycles += 1  # B936
+    if r.p & _C:
+        r.m_inc(FAC)
+        r.cycles += 2  # B938-B93A
+        if r.p & _Z:
+            _overflow(r)
+        for addr in (FAC + 1, FAC + 2, FAC + 3, FAC + 4, FAC_ROUND):
+            r.m_ror(addr)
+        r.cycles += 10  # B93C-B944
+    r.pc = 0xB946
+
+
+def _move_result(r: _Regs):
+    # BB8F: copy the result to FAC and normalize.
+    m = r.mem
+    for i in range(4):
+        r.lda(m[RESULT + i])
+        m[FAC + 1 + i] = r.a
+    r.cycles += 19  # BB8F-BB9F
+    _normalize(r)
+
+
+def _muldiv(r: _Regs, ret: int) -> bool:
+    """
+    BAB7: add exponents of ARG and FAC for multiplication or division.
+
+    :param ret: Address after the JSR.
+    :return: False if FAC was set to zero, and the RTS returns from the calling routine.
+    """
+    m = r.mem
+    r.jsr(ret)
+    r.lda(m[ARG])
+    r.cycles += 3  # BAB7-BAB9
+    if r.p & _Z:
+        return _muldiv_zero(r)
+    r.p &= ~_C
+    r.adc(m[FAC])
+    r.cycles += 4  # BABB-BABE
+    if r.p & _C:
+        r.cycles += 1  # BAC0
+        if r.p & _N:
+            r.cycles += 3  # BADF
+            _overflow(r)
+        r.p &= ~_C
+        # BIT $1410, skipping the BPL: flags are set again below.
+        r.cycles += 5  # BAC2-BAC3
+    else:
+        r.cycles += 1  # BAC4
+        if not r.p & _N:
+            return _muldiv_zero(r)
+    r.adc(0x80)
+    m[FAC] = r.a
+    r.cycles += 5  # BAC6-BACA
+    if r.p & _Z:
+        # JMP B8FB: STA FAC_SIGN and RTS.
+        m[FAC_SIGN] = r.a
+        r.cycles += 5  # BACC, B8FB
+    else:
+        r.lda(m[ARISGN])
+        m[FAC_SIGN] = r.a
+        r.cycles += 4  # BACF-BAD1
+    r.rts()
+    return True
+
+
+def _muldiv_zero(r: _Regs) -> bool:
+    # BADA: drop the return address, set FAC to zero and return from the caller.
+    r.pla()
+    r.pla()
+    r.cycles += 3  # BADC
+    _zero(r)
+    return False
+
+
+def _move_arg(r: _Regs):
+    # BBFC: copy ARG to FAC.
+    m = r.mem
+    r.lda(m[ARG_SIGN])
+    m[FAC_SIGN] = r.a
+    for x in range(5, 0, -1):
+        r.lda(m[0x68 + x])
+        m[0x60 + x] = r.a
+    r.x = r.nz(0)
+    m[FAC_ROUND] = 0
+    r.cycles += 43  # BBFC-BC09
+    r.pc = 0xBC0B
+
+
+def _faddt(r: _Regs):
+    """
+    B86A: FAC = ARG + FAC.
+    """
+    m = r.mem
+    r.cycles += 1  # B86A
+    if r.p & _Z:
+        r.cycles += 3  # B86C
+        _move_arg(r)
+        return
+    r.x = r.nz(m[FAC_ROUND])
+    m[ARG_ROUND] = r.x
+    r.x = r.nz(ARG)
+    r.lda(m[ARG])
+    r.y = r.nz(r.a)
+    r.cycles += 10  # B86F-B878
+    if r.p & _Z:
+        r.pc = 0xB848
+        return
+    r.p |= _C
+    r.sbc(m[FAC])
+    r.cycles += 4  # B87A-B87D
+    if not r.p & _Z:
+        r.cycles += 1  # B87F
+        if r.p & _C:
+            # ARG is larger, shift FAC.
+            m[FAC] = r.y
+            r.y = r.nz(m[ARG_SIGN])
+            m[FAC_SIGN] = r.y
+            r.lda(r.a ^ 0xFF)
+            r.adc(0x00)
+            r.y = r.nz(0)
+            m[ARG_ROUND] = 0
+            r.x = r.nz(FAC)
+            r.cycles += 17  # B881-B891
+        else:
+            r.y = r.nz(0)
+            m[FAC_ROUND] = 0
+            r.cycles += 4  # B893-B895
+        # B897
+        r.cmp(r.a, 0xF9)
+        r.cycles += 3  # B897-B899
+        if r.p & _N:
+            r.jsr(0xB865)
+            _shift_right(r, r.x, 0xB999)
+            r.rts()
+            r.cycles += 1  # B865
+        else:
+            r.y = r.nz(r.a)
+            r.lda(m[FAC_ROUND])
+            addr = (r.x + 1) & 0xFF
+            m[addr] = r.lsr(m[addr])
+            r.cycles += 5  # B89B-B89E
+            r.jsr(0xB8A3)
+            _shift_right(r, r.x, 0xB9B0)
+            r.rts()
+    # B8A3: add or subtract by signs.
+    sign = m[ARISGN]
+    r.p = r.p & ~(_N | _V | _Z) | sign & (_N | _V) | (0 if r.a & sign else _Z)
+    r.cycles += 3  # B8A3-B8A5
+    if not sign & 0x80:
+        # B8FE
+        r.adc(m[ARG_ROUND])
+        m[FAC_ROUND] = r.a
+        for i in (4, 3, 2, 1):
+            r.lda(m[FAC + i])
+            r.adc(m[ARG + i])
+            m[FAC + i] = r.a
+        r.cycles += 31  # B8FE-B91A
+        _carry_exponent(r)
+        return
+    r.y = r.nz(FAC)
+    r.cmp(r.x, ARG)
+    r.cycles += 5  # B8A7-B8AB
+    if r.x != ARG:
+        r.y = r.nz(ARG)
+        r.cycles += 2  # B8AD
+    # B8AF: FAC = larger - smaller.
+    r.p |= _C
+    r.lda(r.a ^ 0xFF)
+    r.adc(m[ARG_ROUND])
+    m[FAC_ROUND] = r.a
+    for i in (4, 3, 2, 1):
+        r.lda(m[r.y + i])
+        r.sbc(m[(r.x + i) & 0xFF])
+        m[FAC + i] = r.a
+    r.cycles += 40  # B8AF-B8D2
+    if not r.p & _C:
+        r.jsr(0xB8D7)
+        _complement(r)
+        r.rts()
+    _normalize(r)
+
+
+def _multiply_byte(r: _Regs, ret: int, entry: int):
+    """
+    BA59 (BA5E for the top byte): multiply ARG with the byte in A, adding to the result.
+    A zero byte only shifts the result a byte right, with B983.
+    """
+    r.jsr(ret)
+    m = r.mem
+    if entry == 0xBA59:
+        r.cycles += 1  # BA59
+        if r.a == 0:
+            r.cycles += 5  # BA5B, B983
+            _shift_right(r, 0x25, 0xB985)
+            r.rts()
+            return
+    r.a = r.lsr(r.a)
+    r.a = r.nz(r.a | 0x80)
+    r.cycles += 3  # BA5E-BA5F
+    # Result and rounding byte as one number, ARG mantissa to add.
+    value = m[RESULT] << 32 | m[RESULT + 1] << 24 | m[RESULT + 2] << 16 | m[RESULT + 3] << 8 | m[FAC_ROUND]
+    arg = (m[ARG + 1] << 24 | m[ARG + 2] << 16 | m[ARG + 3] << 8 | m[ARG + 4]) << 8
+    bits = r.a
+    carry = r.p & _C
+    p = r.p
+    cycles = 0
+    while True:
+        # BA61: carry out of the addition is rotated in at the top.
+        if carry:
+            a = value >> 32
+            value += arg
+            s = value >> 32 & 0xFF
+            b = m[ARG + 1]
+            p = p & ~_V | (_V if not (a ^ b) & 0x80 and (a ^ s) & 0x80 else 0)
+            cycles += 25  # BA64-BA7B
+        value >>= 1
+        carry = bits & 1
+        bits >>= 1
+        cycles += 15  # BA61-BA62, BA7D-BA89
+        if not bits:
+            break
+    # Flags of the last LSR: A is zero, carry is the marker bit. V is from the last addition, if any.
+    r.y = 1
+    r.a = 0
+    m[RESULT] = value >> 32 & 0xFF
+    m[RESULT + 1] = value >> 24 & 0xFF
+    m[RESULT + 2] = value >> 16 & 0xFF
+    m[RESULT + 3] = value >> 8 & 0xFF
+    m[FAC_ROUND] = value & 0xFF
+    r.p = p & ~(_N | _Z) | _Z | _C
+    r.cycles += cycles
+    r.rts()
+
+
+def _fmultt(r: _Regs):
+    """
+    BA2B: FAC = ARG * FAC.
+    """
+    m = r.mem
+    r.cycles += 1  # BA2B
+    if r.p & _Z:
+        r.cycles += 3  # BA2D
+        r.pc = 0xBA8B
+        return
+    if not _muldiv(r, 0xBA33):
+        return
+    r.lda(0)
+    for i in range(4):
+        m[RESULT + i] = 0
+    r.cycles += 10  # BA33-BA3B
+    for ret, addr in ((0xBA42, FAC_ROUND), (0xBA47, FAC + 4), (0xBA4C, FAC + 3), (0xBA51, FAC + 2)):
+        r.lda(m[addr])
+        r.cycles += 2  # LDA
+        _multiply_byte(r, ret, 0xBA59)
+    r.lda(m[FAC + 1])
+    r.cycles += 2  # BA51
+    _multiply_byte(r, 0xBA56, 0xBA5E)
+    r.cycles += 3  # BA56
+    _move_result(r)
+
+
+def _round(r: _Regs, ret: int):
+    # BC1B: round FAC by the rounding byte.
+    m = r.mem
+    r.jsr(ret)
+    r.lda(m[FAC])
+    r.cycles += 3  # BC1B-BC1D
+    if r.p & _Z:
+        r.rts()
+        return
+    r.m_asl(FAC_ROUND)
+    r.cycles += 3  # BC1F-BC21
+    if not r.p & _C:
+        r.rts()
+        return
+    r.jsr(0xBC26)
+    _increment(r)
+    r.rts()
+    r.cycles += 1  # BC26
+    if r.p & _Z:
+        # JMP B938 with carry set by the ASL.
+        r.m_inc(FAC)
+        r.cycles += 5  # BC28, B938-B93A
+        if r.p & _Z:
+            _overflow(r)
+        for addr in (FAC + 1, FAC + 2, FAC + 3, FAC + 4, FAC_ROUND):
+            r.m_ror(addr)
+        r.cycles += 10  # B93C-B944
+    r.rts()
+
+
+def _fdivt(r: _Regs):
+    """
+    BB12: FAC = ARG / FAC.
+    """
+    m = r.mem
+    r.cycles += 1  # BB12
+    if r.p & _Z:
+        r.pc = DIVISION_BY_ZERO
+        raise _Error()
+    _round(r, 0xBB17)
+    r.lda(0)
+    r.p |= _C
+    r.sbc(m[FAC])
+    m[FAC] = r.a
+    r.cycles += 7  # BB17-BB1C
+    if not _muldiv(r, 0xBB21):
+        return
+    r.m_inc(FAC)
+    r.cycles += 2  # BB21-BB23
+    if r.p & _Z:
+        r.cycles += 3  # BADF
+        _overflow(r)
+    r.x = r.nz(0xFC)
+    r.lda(0x01)
+    r.cycles += 4  # BB25-BB27
+    while True:
+        # BB29: compare mantissas of ARG and FAC.
+        for i in (1, 2, 3, 4):
+            r.y = r.nz(m[ARG + i])
+            r.cmp(r.y, m[FAC + i])
+            if i == 4:
+                r.cycles += 4  # LDY, CPY
+                break
+            r.cycles += 5  # LDY, CPY, BNE
+            if r.y != m[FAC + i]:
+                break
+        while True:
+            # BB3F: next quotient bit is the carry of the compare.
+            r.php()
+            r.a = r.rol(r.a)
+            r.cycles += 2  # BB40-BB41
+            if r.p & _C:
+                r.x = r.nz((r.x + 1) & 0xFF)
+                m[(RESULT + 3 + r.x) & 0xFF] = r.a
+                r.cycles += 5  # BB43-BB46
+                if r.x == 0:
+                    # Two more bits for rounding.
+                    r.lda(0x40)
+                    r.cycles += 3  # BB7A-BB7C
+                elif not r.p & _N:
+                    # BB7E
+                    for _ in range(6):
+                        r.a = r.asl(r.a)
+                    m[FAC_ROUND] = r.a
+                    r.cycles += 9  # BB48, BB7E-BB84
+                    r.plp()
+                    r.cycles += 3  # BB87
+                    _move_result(r)
+                    return
+                else:
+                    r.lda(0x01)
+                    r.cycles += 3  # BB48-BB4A
+            # BB4C
+            r.plp()
+            r.cycles += 1  # BB4D
+            if r.p & _C:
+                # BB5D: ARG -= FAC.
+                r.y = r.nz(r.a)
+                for i in (4, 3, 2, 1):
+                    r.lda(m[ARG + i])
+                    r.sbc(m[FAC + i])
+                    m[ARG + i] = r.a
+                r.lda(r.y)
+                r.cycles += 29  # BB5D-BB77
+            # BB4F: ARG <<= 1, and compare again only if the top bit is set.
+            r.m_asl(ARG + 4)
+            for i in (3, 2, 1):
+                r.m_rol(ARG + i)
+            r.cycles += 9  # BB4F-BB57
+            if r.p & _C:
+                continue
+            r.cycles += 1  # BB59
+            if r.p & _N:
+                break
+            r.cycles += 1  # BB5B
+
+
+def _trap(routine: typing.Callable[[_Regs], None]) -> typing.Callable[[CPU], typing.Union[bool, int]]:
+    def run(cpu: CPU) -> typing.Union[bool, int]:
+        bus = cpu.bus
+        if cpu.p.D or cpu.sp < 8 or cpu.irq:
+            return False
+        # Zero page and stack are used in RAM directly, so no other part may see them.
+        ram = next((p for p in bus.parts if isinstance(p, RAM) and p.mem is bus.mem), None)
+        if ram is None or not bus.only_part(ram, 0x0002, 0x01FF):
+            return False
+        saved = ram.mem[0x0002:0x0200]
+        r = _Regs(cpu, ram.mem)
+        try:
+            routine(r)
+        except _Error:
+            pass
+        quiet = cpu.clock.next_event()
+        if quiet is not None and quiet < r.cycles - 1:
+            # A device may request an interrupt before the ROM code would return,
+            # so the ROM code is run instead to take it at the same instruction.
+            ram.mem[0x0002:0x0200] = saved
+            return False
+        ram.dirty[0] = ram.dirty[1] = 1
+        cpu.A, cpu.X, cpu.Y = r.a, r.x, r.y
+        cpu.p.val = r.p
+        cpu.sp = r.sp
+        cpu.pc = r.pc
+        return r.cycles
+
+    return run
+
+
+def basic_float_traps() -> typing.List[Trap]:
+    """
+    Traps of the floating point routines of BASIC, see py65xx.traps. Functions using these,
+    e.g. polynomial evaluation of SIN, LOG and EXP, and number conversions, use the traps too.
+
+    The traps charge the cycles the interpreter would take for the ROM code with the same operands,
+    so timing is the same as without them. The routines run with interrupts enabled, as BASIC does,
+    and a trap cannot be interrupted in the middle. When a device has an event due before the routine
+    would return, the trap declines and the ROM code is run instead, so that interrupts are taken
+    at the same instruction as without the traps.
+    """
+    normalize = (_NORMALIZE, _SHIFT_RIGHT, _MOVE_RESULT)
+    # The traps count their own cycles. These are averages of the ROM code with random operands,
+    # charged only when given as costs to Traps.
+    return [
+        Trap("FADDT", FADDT, _trap(_faddt), 240, _code(_RTS_B848, _FADD, _MOVE_ARG, *normalize)),
+        Trap("FMULTT", FMULTT, _trap(_fmultt), 300, _code(_MULTIPLY, _MULDIV, *normalize)),
+        Trap("FDIVT", FDIVT, _trap(_fdivt), 850, _code(_DIVIDE, _ROUND, _MULDIV, *normalize)),
+    ]
+
+
+def pack(value: float) -> bytes:
+    """
+    :return: Value in the 5-byte memory format: exponent, and mantissa with the sign in the top bit.
+        Rounded to nearest.
+    """
+    if value == 0:
+        return bytes(5)
+    mantissa, exponent = math.frexp(abs(value))
+    m = round(mantissa * (1 << 32))
+    if m >> 32:
+        m >>= 1
+        exponent += 1
+    if not -128 < exponent < 127:
+        raise OverflowError(f"{value} out of range")
+    m = m & 0x7FFFFFFF | (0x80000000 if value < 0 else 0)
+    return bytes([exponent + 128]) + m.to_bytes(4, "big")
+
+
+def unpack(data: bytes) -> float:
+    """
+    :return: Value of the 5-byte memory format.
+    """
+    if data[0] == 0:
+        return 0.0
+    m = int.from_bytes(data[1:5], "big")
+    sign = -1 if m & 0x80000000 else 1
+    return sign * math.ldexp(m | 0x80000000, data[0] - 128 - 32)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import typing
+
+if typing.TYPE_CHECKING:
+    from pyc64.machine import C64
+
+from py65xx import snapshot
+from py65xx.aot import default_cache_dir
+from pyc64.framelog import FrameImage
+
+READY_TEXT = "READY."
+# Cycles run between checks for the READY prompt.
+CHECK_CYCLES = 20000
+
+
+def rom_key(machine: C64) -> str:
+    """
+    :return: Hash of kernal, basic and chargen ROMs, the snapshot format, and the installed traps
+        with their costs, as they change the cycles the boot takes.
+    """
+    h = hashlib.sha1(f"boot{snapshot.VERSION}".encode())
+    for rom in (machine.kernal, machine.basic, machine.chargen):
+        h.update(rom.name.encode())
+        h.update(bytes(rom.data))
+    if machine.traps is not None:
+        for name in sorted(machine.traps.installed):
+            h.update(f"trap {name}={machine.traps.costs[name]}".encode())
+    return h.hexdigest()
+
+
+def cache_path(machine: C64, cache_dir: typing.Optional[str] = None) -> str:
+    return os.path.join(
+        cache_dir if cache_dir is not None else default_cache_dir(), f"boot_{rom_key(machine)}.p65"
+    )
+
+
+def boot(
+    machine: C64,
+    cache_dir: typing.Optional[str] = None,
+    max_cycles: int = 5_000_000,
+    ready_text: str = READY_TEXT,
+) -> bool:
+    """
+    Bring the machine to the READY prompt, either from a cached snapshot or by a real reset.
+
+    After a real reset the machine is run until the screen shows ready_text, and the snapshot
+    taken there is cached for the ROMs in use. If the prompt does not appear in max_cycles,
+    nothing is cached and the machine is left where it is.
+
+    :return: True if the machine was restored from cache.
+    """
+    fname = cache_path(machine, cache_dir)
+    machine.reset()
+    if os.path.exists(fname):
+        try:
+            machine.load_snapshot(fname)
+            return True
+        except (snapshot.SnapshotError, struct.error) as e:
+            print(f"Ignoring boot snapshot {fname}: {e}")
+            machine.reset()
+
+    while machine.clock.cycles < max_cycles:
+        if machine.run(CHECK_CYCLES) != 0:
+            return False
+        if any(line.startswith(ready_text) for line in FrameImage.of(machine).text()):
+            break
+    else:
+        return False
+
+    os.makedirs(os.path.dirname(fname), exist_ok=True)
+    tmp = f"{fname}.{os.getpid()}.tmp"
+    machine.save_snapshot(tmp)
+    os.replace(tmp, fname)
+    return False
@@ -5,11 +5,13 @@ from __future__ import annotations
 
 import dataclasses
 import enum
+import struct
 import typing
 
 from py65xx.bcd import bcdtoi, itobcd
 from py65xx.clock import Clock, Clocked
 from py65xx.defs import BusPart, BusRet, TAddr, TData
+from py65xx.snapshot import pack_states, unpack_states
 
 if typing.TYPE_CHECKING:
     from pyc64.keyboard import Keyboard
@@ -23,6 +25,12 @@ class _CIAPart:
     def reset(self):
         raise NotImplementedError()
 
+    def get_state(self) -> typing.Optional[bytes]:
+        return None
+
+    def set_state(self, state: bytes):
+        pass
+
     @property
     def value(self):
         raise NotImplementedError()
@@ -32,6 +40,14 @@ class _CIAPart:
         raise NotImplementedError()
 
 
+# Timer 1 value, latch, active; timer 2 value, latch, active; DDRs; TOD frozen, TOD, alarm, TOD cycles;
+# ICR data, ICR mask, CRA, CRB.
+_STATE = struct.Struct("<iH?iH?BB?4B4BIBBBB")
+# ddr, VIC memory index, serial clock, serial counter, serial data, serial ATN.
+_STATE_2A = struct.Struct("<BB?IB?")
+# ddr, strobe
+_STATE_1AB = struct.Struct("<BB")
+
 # How many cycles should be counted before 1/10s is increased. 100_000 would be kind of emulation-accurate.
 CIA_TOD_DIVIDER = 15_000
 
@@ -156,6 +172,65 @@ class CIA(BusPart, Clocked):
         if self.pio2 is not None:
             self.pio2.reset()
 
+    def get_state(self) -> bytes:
+        tod = self._tod
+        alarm = self._tod_alarm
+        return _STATE.pack(
+            self._tmr1_val,
+            self._tmr1_latch,
+            self._tmr1_active,
+            self._tmr2_val,
+            self._tmr2_latch,
+            self._tmr2_active,
+            self._pa1_ddr,
+            self._pa2_ddr,
+            self._tod_freeze is not None,
+            tod.s_per_10,
+            tod.s,
+            tod.m,
+            tod.h,
+            alarm.s_per_10,
+            alarm.s,
+            alarm.m,
+            alarm.h,
+            self._tod_cycles,
+            self._icr_data,
+            self._icr_mask,
+            self._cra,
+            self._crb,
+        ) + pack_states(
+            pio.get_state() if pio is not None else None
+            for pio in (self.pio1, self.pio2)
+        )
+
+    def set_state(self, state: bytes):
+        (
+            self._tmr1_val,
+            self._tmr1_latch,
+            self._tmr1_active,
+            self._tmr2_val,
+            self._tmr2_latch,
+            self._tmr2_active,
+            self._pa1_ddr,
+            self._pa2_ddr,
+            frozen,
+            *times,
+            self._tod_cycles,
+            self._icr_data,
+            self._icr_mask,
+            self._cra,
+            self._crb,
+        ) = _STATE.unpack_from(state)
+        self._tod = RealTime(*times[:4])
+        self._tod_alarm = RealTime(*times[4:])
+        # Freezing only ever refers the current time.
+        self._tod_freeze = self._tod if frozen else None
+
+        pio_states = unpack_states(state[_STATE.size :])
+        for pio, pio_state in zip((self.pio1, self.pio2), pio_states):
+            if pio is not None and pio_state is not None:
+                pio.set_state(pio_state)
+
     def read_address(self, addr: TAddr) -> BusRet:
         if self._base_addr <= addr < self._end_addr:
             c_addr = addr & 0xF
@@ -313,6 +388,12 @@ class CIA(BusPart, Clocked):
                 if data & CRB.LATCH_ONCE:
                     self._tmr2_val = self._tmr2_latch
 
+    def is_plain(self, addr: TAddr) -> bool:
+        return not self._base_addr <= addr < self._end_addr
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        return start < self._end_addr and end >= self._base_addr
+
     def flag(self):
         # TODO
         self._icr_data |= 1 << 4
@@ -360,6 +441,28 @@ class CIA(BusPart, Clocked):
 
         return r
 
+    def next_event(self) -> typing.Optional[int]:
+        if self._icr_data & self._icr_mask & 0x1F:
+            # Requesting interrupt on every clock.
+            return 0
+        n = None
+        if self._tmr1_active:
+            n = max(self._tmr1_val, 0)
+        if self._tmr2_active and self._crb & CRB.TMR_COUNT_MASK == CRB.TMR_COUNT_SYS:
+            n = max(self._tmr2_val, 0) if n is None else min(n, max(self._tmr2_val, 0))
+        # Timer B counting underflows of timer A changes only on the event of timer A.
+        return n
+
+    def skip(self, cycles: int):
+        tod_cycles = self._tod_cycles + cycles
+        for _ in range(tod_cycles // CIA_TOD_DIVIDER):
+            self._tod.tick_10th()
+        self._tod_cycles = tod_cycles % CIA_TOD_DIVIDER
+        if self._tmr1_active:
+            self._tmr1_val -= cycles
+        if self._tmr2_active and self._crb & CRB.TMR_COUNT_MASK == CRB.TMR_COUNT_SYS:
+            self._tmr2_val -= cycles
+
     def __repr__(self):
         return (
             f"CIA({self._base_addr:04X}, {self._tmr1_val:04X}/{self._tmr1_latch:04X})"
@@ -368,26 +471,47 @@ class CIA(BusPart, Clocked):
 
 class CIA2A(_CIAPart):
     def __init__(self, vic: typing.Optional[VIC2] = None):
-        self.ddr = 0
-
         self._vic: typing.Optional[VIC2] = None
         # self._bus = bus
-        self._vic_mem_index = 0
+        self.reset()
         if vic is not None:
             self.set_vic(vic)
 
+    def reset(self):
+        self.ddr = 0
+        # VIC2 resets to this bank itself.
+        self._vic_mem_index = 0
+
         self._so_clk_last = False
         self._so_clk_counter = 0
         self._so_data = 0
         self._so_is_atn = False
 
-    def reset(self):
-        self.__init__(self._vic)
-
     def set_vic(self, vic):
         self._vic = vic
         vic.set_mem_base_index(self._vic_mem_index)
 
+    def get_state(self) -> bytes:
+        return _STATE_2A.pack(
+            self.ddr,
+            self._vic_mem_index,
+            self._so_clk_last,
+            self._so_clk_counter,
+            self._so_data,
+            self._so_is_atn,
+        )
+
+    def set_state(self, state: bytes):
+        # VIC restores its own memory base.
+        (
+            self.ddr,
+            self._vic_mem_index,
+            self._so_clk_last,
+            self._so_clk_counter,
+            self._so_data,
+            self._so_is_atn,
+        ) = _STATE_2A.unpack(state)
+
     @property
     def value(self):
         return self._vic_mem_index
@@ -418,6 +542,18 @@ class CIA1AB(_CIAPart):
     def reset(self):
         self._keyboard.reset()
 
+    def get_state(self) -> bytes:
+        state = _STATE_1AB.pack(self.ddr, self.strobe)
+        # Keyboard is shared by both ports, so only port A saves it.
+        if not self._is_b:
+            state += self._keyboard.get_state()
+        return state
+
+    def set_state(self, state: bytes):
+        self.ddr, self.strobe = _STATE_1AB.unpack_from(state)
+        if not self._is_b:
+            self._keyboard.set_state(state[_STATE_1AB.size :])
+
     @property
     def value(self):
         return (~self._key_fn(self.strobe)) & 0xFF
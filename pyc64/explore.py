@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import hashlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from pyc64.machine import C64
+
+from py65xx.forking import fork_map
+from pyc64.framelog import FrameImage
+from pyc64.inputlog import InputEvent, InputPlayer
+from pyc64.machine import FRAME_CYCLES
+
+# Input script: events with cycles relative to the point the machine is cloned at.
+Script = typing.List[InputEvent]
+# Result of a script from the machine and status returned by run.
+ResultFunc = typing.Callable[["C64", int], typing.Any]
+
+STATUS = {0: "budget", 1: "interrupted", 2: "stopped"}
+
+
+def key_presses(
+    keys: typing.Iterable[str],
+    at: int = 0,
+    hold: int = FRAME_CYCLES,
+    gap: int = FRAME_CYCLES,
+) -> Script:
+    """
+    Script pressing keys one after another.
+
+    >>> [(e.cycles, e.kind, e.args) for e in key_presses(["A", "RETURN"], at=100, hold=10, gap=5)]
+    [(100, 'push', ('A',)), (110, 'release', ('A',)), (115, 'push', ('RETURN',)), (125, 'release', ('RETURN',))]
+
+    :param keys: Key names, see Keyboard.LIST. A string of single character key names works too.
+    :param at: Cycle of the first push.
+    :param hold: Cycles each key is held down. The KERNAL scans keyboard once per 1/60 s.
+    :param gap: Cycles between release and next push.
+    """
+    out = []
+    for key in keys:
+        out.append(InputEvent(at, "push", (key,)))
+        at += hold
+        out.append(InputEvent(at, "release", (key,)))
+        at += gap
+    return out
+
+
+def summary(machine: C64, status: int) -> typing.Dict[str, typing.Any]:
+    """
+    Default result of a script: status, registers, screen text and hashes of RAM.
+    """
+    cpu = machine.cpu
+    return dict(
+        status=STATUS.get(status, str(status)),
+        cycles=machine.clock.cycles,
+        pc=cpu.pc,
+        a=cpu.A,
+        x=cpu.X,
+        y=cpu.Y,
+        screen=FrameImage.of(machine).text(),
+        ram_sha1=hashlib.sha1(bytes(machine.ram.mem)).hexdigest(),
+        color_sha1=hashlib.sha1(bytes(machine.c_ram.mem)).hexdigest(),
+    )
+
+
+def explore(
+    machine: C64,
+    scripts: typing.Sequence[Script],
+    cycles: int,
+    result: ResultFunc = summary,
+    jobs: typing.Optional[int] = None,
+) -> typing.List[typing.Any]:
+    """
+    Clone the machine into a child process for each script, run the script in it
+    for the cycle budget, and collect results.
+
+    The clones share memory with this process copy-on-write (see py65xx.forking.fork_map),
+    so memory cost is the pages each clone writes, not a full copy of the machine.
+    The machine itself is not changed.
+
+    :param machine: Machine in the starting state.
+    :param scripts: Input scripts, cycles relative to the current cycle of the machine.
+    :param cycles: Cycle budget of each script.
+    :param result: Called in the child after the run with the machine and run status.
+        The return value is pickled back, so it should be compact.
+    :param jobs: Maximum count of clones running at once. Default is count of CPUs.
+    :return: Results in order of scripts.
+    """
+    start = machine.clock.cycles
+
+    def run(script: Script) -> typing.Any:
+        # Parent may be recording its input, which the clones must not write into.
+        machine.input_listener = None
+        player = InputPlayer(machine, [InputEvent(start + e.cycles, e.kind, e.args) for e in script], exact=False)
+        return result(machine, player.run(cycles))
+
+    out: typing.List[typing.Any] = [None] * len(scripts)
+    for index, value in fork_map(run, scripts, jobs):
+        out[index] = value
+    return out
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import array
+import struct
+import typing
+import zlib
+
+if typing.TYPE_CHECKING:
+    from pyc64.machine import C64
+    from pyc64.vic2 import VIC2
+
+from pyc64.vic2 import DisplayMode
+
+MAGIC = b"P64F"
+VERSION = 1
+
+# Magic, version, cycles per frame.
+_HEADER = struct.Struct("<4sHI")
+# Length of compressed frame data.
+_RECORD = struct.Struct("<I")
+# Cycles, VIC state, delta count.
+_FRAME = struct.Struct("<QBBHHHB4sBBBBH")
+# Memory space, address, length.
+_DELTA = struct.Struct("<BHH")
+
+SPACE_RAM = 0
+SPACE_COLOR = 1
+
+# Granularity of memory deltas. Small enough to keep typing in text mode cheap.
+CHUNK = 64
+
+# Character ROM shadow addresses as seen by VIC. See TextRenderer.
+ROM_FONTS = (0x1000, 0x1800, 0x9000, 0x9800)
+
+# Mode value of invalid display modes.
+MODE_INVALID = 0xFF
+
+# Screen codes 0-127 as text.
+_SCREEN_CODES = "@ABCDEFGHIJKLMNOPQRSTUVWXYZ[£]↑←" + "".join(map(chr, range(32, 64))) + " " * 64
+
+
+class VicState(typing.NamedTuple):
+    """
+    The VIC2 state required to draw a frame.
+    """
+
+    den: int
+    mode: int
+    display_base: int
+    font_base: int
+    graphics_base: int
+    bord_cl: int
+    bg_cl: bytes
+    scroll_x: int
+    scroll_y: int
+    columns: int
+    rows: int
+
+    @classmethod
+    def of(cls, vic: VIC2) -> VicState:
+        try:
+            mode = vic.mode()
+        except RuntimeError:
+            mode = MODE_INVALID
+        return cls(
+            int(vic.den),
+            mode,
+            vic.display_base,
+            vic.font_base,
+            vic.graphics_base,
+            vic.bord_cl,
+            bytes(vic.bg_cl),
+            vic.scroll_x,
+            vic.scroll_y,
+            vic.columns,
+            vic.rows,
+        )
+
+    @property
+    def is_bitmap(self):
+        return self.mode in (DisplayMode.BM_STANDARD, DisplayMode.BM_MULTI_COLOR)
+
+    @property
+    def is_rom_font(self):
+        return self.font_base in ROM_FONTS
+
+
+class Frame(typing.NamedTuple):
+    index: int
+    cycles: int
+    vic: VicState
+    # (space, address, data)
+    deltas: typing.List[typing.Tuple[int, int, bytes]]
+
+
+class FrameImage(typing.NamedTuple):
+    """
+    Everything needed to draw one frame, see pyc64.softrender.
+    """
+
+    index: int
+    vic: VicState
+    screen: bytes
+    colors: bytes
+    # Bitmap in bitmap modes, character set in text modes with character set in RAM.
+    data: typing.Optional[bytes]
+
+    @classmethod
+    def of(cls, machine: C64, index: int = 0) -> FrameImage:
+        """
+        Current displayed state of a running machine.
+        """
+        vic = VicState.of(machine.vic2)
+        mem = machine.ram.mem
+        if vic.is_bitmap:
+            data = bytes(mem[vic.graphics_base : vic.graphics_base + 8000])
+        elif not vic.is_rom_font:
+            data = bytes(mem[vic.font_base : vic.font_base + 0x800])
+        else:
+            data = None
+        screen = bytes(mem[vic.display_base : vic.display_base + 1000])
+        return cls(index, vic, screen, bytes(machine.c_ram.mem[:1000]), data)
+
+    def text(self) -> typing.List[str]:
+        """
+        Screen as text lines, assuming the upper case character set.
+        Graphics characters are shown as spaces and reverse video is ignored.
+        """
+        chars = "".join(_SCREEN_CODES[c & 0x7F] for c in self.screen)
+        return [chars[i : i + 40].rstrip() for i in range(0, 1000, 40)]
+
+
+class FrameRecorder:
+    """
+    Records the displayed state of the machine once per frame.
+    Only the VIC2 state and the changed parts of the displayed memory
+    (screen, color, bitmap and character set) are recorded.
+    """
+
+    def __init__(self, machine: C64, fname: str, frame_cycles: int):
+        self._machine = machine
+        self._f = open(fname, "wb")
+        self._f.write(_HEADER.pack(MAGIC, VERSION, frame_cycles))
+        self._ram = array.array("B", bytes(65536))
+        self._colors = bytearray(1024)
+        self.frames = 0
+
+    def record(self):
+        machine = self._machine
+        vic = VicState.of(machine.vic2)
+        out = []
+
+        mem = machine.ram.mem
+        self._diff(out, SPACE_RAM, mem, self._ram, vic.display_base, 1000)
+        if vic.is_bitmap:
+            self._diff(out, SPACE_RAM, mem, self._ram, vic.graphics_base, 8000)
+        elif not vic.is_rom_font:
+            self._diff(out, SPACE_RAM, mem, self._ram, vic.font_base, 0x800)
+        self._diff(out, SPACE_COLOR, bytes(machine.c_ram.mem), self._colors, 0, 1000)
+
+        head = _FRAME.pack(machine.clock.cycles, *vic, len(out) // 2)
+        data = zlib.compress(head + b"".join(out))
+        self._f.write(_RECORD.pack(len(data)))
+        self._f.write(data)
+        self.frames += 1
+
+    @staticmethod
+    def _diff(out: list, space: int, mem, shadow, start: int, length: int):
+        end = start + length
+        if mem[start:end] == shadow[start:end]:
+            return
+        for a in range(start, end, CHUNK):
+            b = min(a + CHUNK, end)
+            block = mem[a:b]
+            if block != shadow[a:b]:
+                shadow[a:b] = block
+                out.append(_DELTA.pack(space, a, b - a))
+                out.append(bytes(block))
+
+    def close(self):
+        self._f.close()
+
+
+class FrameReader:
+    """
+    Reads frames recorded by FrameRecorder.
+    """
+
+    def __init__(self, fname: str):
+        self._f = open(fname, "rb")
+        magic, version, self.frame_cycles = _HEADER.unpack(self._f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{fname} is not a frame log")
+        if version != VERSION:
+            raise ValueError(f"Unsupported frame log version {version}")
+
+    def __iter__(self) -> typing.Iterator[Frame]:
+        index = 0
+        while True:
+            head = self._f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            (length,) = _RECORD.unpack(head)
+            data = zlib.decompress(self._f.read(length))
+
+            cycles, *vic, count = _FRAME.unpack_from(data)
+            pos = _FRAME.size
+            deltas = []
+            for _ in range(count):
+                space, addr, size = _DELTA.unpack_from(data, pos)
+                pos += _DELTA.size
+                deltas.append((space, addr, data[pos : pos + size]))
+                pos += size
+            yield Frame(index, cycles, VicState(*vic), deltas)
+            index += 1
+
+    def images(self) -> typing.Iterator[FrameImage]:
+        """
+        Apply the recorded deltas in order and produce drawable frames.
+        This is cheap compared to drawing, so it is done sequentially.
+        """
+        mem = bytearray(65536)
+        colors = bytearray(1024)
+        spaces = (mem, colors)
+        for frame in self:
+            for space, addr, data in frame.deltas:
+                spaces[space][addr : addr + len(data)] = data
+
+            vic = frame.vic
+            if vic.is_bitmap:
+                data = bytes(mem[vic.graphics_base : vic.graphics_base + 8000])
+            elif not vic.is_rom_font:
+                data = bytes(mem[vic.font_base : vic.font_base + 0x800])
+            else:
+                data = None
+            screen = bytes(mem[vic.display_base : vic.display_base + 1000])
+            yield FrameImage(frame.index, vic, screen, bytes(colors[:1000]), data)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -139,6 +139,12 @@ class TextRenderer(BusPart):
     def mode(self) -> DisplayMode:
         return self._mode
 
+    def invalidate(self):
+        """
+        Force reloading the font, e.g. after memory has been restored from a snapshot.
+        """
+        self._base_addr = -1
+
     def set_base_addr_and_mode(self, base_address: int, mode: int):
         reload = False
         if self._base_addr != base_address:
@@ -264,3 +270,12 @@ class TextRenderer(BusPart):
                 sdl2.SDL_SetRenderTarget(self._renderer, self._fnt2)
                 self._load_mode_1_line(line, x, data)
                 self._pix.w = self._size_multiplier
+
+    def is_plain(self, addr: TAddr) -> bool:
+        # Rewriting the same font data redraws the same glyph.
+        return True
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        # Font in RAM, see write_address.
+        base = self._base_addr
+        return base not in (-1, 0x1000, 0x1800, 0x9000, 0x9800) and start < base + 0x800 and end >= base
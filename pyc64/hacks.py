@@ -44,31 +44,42 @@ class ProgramInject:
         else:
             print("Unsupported file format:", entry)
 
-    def inject_next(self):
+    def next_program(self) -> typing.Optional[DEntry]:
         if self._prog_index >= len(self._programs):
             print("Nothing to load.")
-            return
+            return None
 
         prg = self._programs[self._prog_index]
         self._prog_index = (self._prog_index + 1) % len(self._programs)
+        return prg
+
+    def inject_next(self):
+        prg = self.next_program()
+        if prg is not None:
+            inject_program(prg, self._bus, self._ram)
+
+
+def inject_program(prg: DEntry, bus: Bus, ram: RAM):
+    """
+    Write a program into memory, as if it was loaded, and put RUN into keyboard buffer.
+    """
+    prg.write_into(ram)
+    end = prg.load_addr + len(prg.data)
+
+    for copy in range(3):
+        # Vartab, Arytab, stred
+        bus.write(0x2D + copy * 2, end & 0xFF)
+        bus.write(0x2E + copy * 2, end >> 8)
+
+    # OLDTXT ptr to basic statment
+    bus.write(0x3D, prg.load_addr & 0xFF)
+    bus.write(0x3E, prg.load_addr >> 8)
+    # EAL Ending address of load
+    bus.write(0xAE, end & 0xFF)  # Load end
+    bus.write(0xAF, end >> 8)
 
-        prg.write_into(self._ram)
-        end = prg.load_addr + len(prg.data)
-
-        for copy in range(3):
-            # Vartab, Arytab, stred
-            self._bus.write(0x2D + copy * 2, end & 0xFF)
-            self._bus.write(0x2E + copy * 2, end >> 8)
-
-        # OLDTXT ptr to basic statment
-        self._bus.write(0x3D, prg.load_addr & 0xFF)
-        self._bus.write(0x3E, prg.load_addr >> 8)
-        # EAL Ending address of load
-        self._bus.write(0xAE, end & 0xFF)  # Load end
-        self._bus.write(0xAF, end >> 8)
-
-        # Put run to keyboard buffer.
-        text = "RUN\r"
-        for i, c in enumerate(text):
-            self._bus.write(0x277 + i, ord(c))
-        self._bus.write(0xC6, len(text))
+    # Put run to keyboard buffer.
+    text = "RUN\r"
+    for i, c in enumerate(text):
+        bus.write(0x277 + i, ord(c))
+    bus.write(0xC6, len(text))
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import struct
+import typing
+
+if typing.TYPE_CHECKING:
+    from pyc64.machine import C64
+
+from pyc64.support.defs import DEntry
+
+MAGIC = b"P64I"
+VERSION = 1
+
+# Magic, version, length of the starting snapshot.
+_HEADER = struct.Struct("<4sHI")
+# Cycles, event kind, length of arguments.
+_EVENT = struct.Struct("<QBI")
+_LIGHTPEN = struct.Struct("<HH")
+# Load address, length of name.
+_INJECT = struct.Struct("<HH")
+
+KINDS = ("reset", "push", "release", "nmi", "lightpen", "inject")
+
+
+class InputEvent(typing.NamedTuple):
+    cycles: int
+    kind: str
+    args: tuple
+
+
+def _pack_args(kind: str, args: tuple) -> bytes:
+    if kind in ("push", "release"):
+        return args[0].encode()
+    if kind == "lightpen":
+        return _LIGHTPEN.pack(*args)
+    if kind == "inject":
+        prg: DEntry = args[0]
+        name = prg.name.encode()
+        return _INJECT.pack(prg.load_addr, len(name)) + name + prg.data
+    return b""
+
+
+def _unpack_args(kind: str, data: bytes) -> tuple:
+    if kind in ("push", "release"):
+        return (data.decode(),)
+    if kind == "lightpen":
+        return _LIGHTPEN.unpack(data)
+    if kind == "inject":
+        load_addr, name_len = _INJECT.unpack_from(data)
+        name = data[_INJECT.size : _INJECT.size + name_len].decode()
+        return (DEntry(load_addr, name, data[_INJECT.size + name_len :]),)
+    return ()
+
+
+class InputRecorder:
+    """
+    Records all input of the machine with the cycle it happened at.
+    Together with snapshot of the starting state, the run can be replayed exactly with InputReplayer.
+    The machine must not be rewound while recording.
+    """
+
+    def __init__(self, machine: C64, fname: str):
+        self._machine = machine
+        self._f = open(fname, "wb")
+        start = machine.snapshot()
+        self._f.write(_HEADER.pack(MAGIC, VERSION, len(start)))
+        self._f.write(start)
+        self.events = 0
+        machine.input_listener = self.record
+
+    def record(self, kind: str, *args):
+        args = _pack_args(kind, args)
+        self._f.write(_EVENT.pack(self._machine.clock.cycles, KINDS.index(kind), len(args)))
+        self._f.write(args)
+        self.events += 1
+
+    def close(self):
+        self._machine.input_listener = None
+        self._f.close()
+
+
+def read_input_log(fname: str) -> typing.Tuple[bytes, typing.List[InputEvent]]:
+    """
+    :return: Snapshot of the starting state and the events.
+    """
+    with open(fname, "rb") as f:
+        data = f.read()
+    magic, version, length = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{fname} is not an input log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported input log version {version}")
+    pos = _HEADER.size
+    start = data[pos : pos + length]
+    pos += length
+
+    events = []
+    while pos < len(data):
+        cycles, kind, length = _EVENT.unpack_from(data, pos)
+        pos += _EVENT.size
+        kind = KINDS[kind]
+        events.append(InputEvent(cycles, kind, _unpack_args(kind, data[pos : pos + length])))
+        pos += length
+    return start, events
+
+
+class InputPlayer:
+    """
+    Applies input events to the machine when it reaches the cycle of each event.
+    """
+
+    def __init__(self, machine: C64, events: typing.List[InputEvent], exact: bool = True):
+        """
+        :param events: Events in order of cycles. Cycles are absolute cycles of the machine clock.
+        :param exact: Warn about events applied after their cycle. Recorded events happen
+            between instructions, but e.g. scripted events can land in middle of one.
+        """
+        self._machine = machine
+        self.events = events
+        self._exact = exact
+        self._next = 0
+
+    @property
+    def done(self) -> bool:
+        return self._next >= len(self.events)
+
+    def run(self, cycles: int) -> int:
+        """
+        Run the machine like C64.run, applying events on the way.
+        """
+        machine = self._machine
+        clock = machine.clock
+        end = clock.cycles + cycles
+        while clock.cycles < end:
+            self._apply()
+            stop = end
+            if not self.done:
+                stop = min(stop, self.events[self._next].cycles)
+            r = machine.run(stop - clock.cycles)
+            if r != 0:
+                return r
+        self._apply()
+        return 0
+
+    def _apply(self):
+        machine = self._machine
+        now = machine.clock.cycles
+        while not self.done and self.events[self._next].cycles <= now:
+            event = self.events[self._next]
+            self._next += 1
+            if self._exact and event.cycles != now:
+                print(f"Input event {event.kind} of cycle {event.cycles} applied late at {now}")
+            if event.kind == "reset":
+                machine.reset()
+            elif event.kind == "push":
+                machine.keys.push(*event.args)
+            elif event.kind == "release":
+                machine.keys.release(*event.args)
+            elif event.kind == "nmi":
+                machine.nmi()
+            elif event.kind == "lightpen":
+                machine.set_lightpen_pos(*event.args)
+            elif event.kind == "inject":
+                machine.inject_program(*event.args)
+
+
+class InputReplayer(InputPlayer):
+    """
+    Replays input recorded with InputRecorder.
+    The machine is restored to the recorded starting state, and each event is applied
+    when the machine reaches the cycle it was recorded at.
+    """
+
+    def __init__(self, machine: C64, fname: str):
+        start, events = read_input_log(fname)
+        super().__init__(machine, events)
+        machine.restore(start)
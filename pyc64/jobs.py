@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import typing
+import warnings
+
+if typing.TYPE_CHECKING:
+    from pyc64.support.defs import DEntry
+
+from py65xx.cpu65xx import BreakOp
+from pyc64 import bootcache
+from pyc64.framelog import FrameImage
+from pyc64.machine import C64, FRAME_CYCLES
+
+
+def _stop(cpu):
+    raise StopIteration
+
+
+class JobRunner:
+    """
+    Booted machine running programs one after another.
+    Every program starts from the same post-boot state, restored from a snapshot in memory.
+    """
+
+    def __init__(
+        self,
+        rom_dir: str = ".",
+        aot: bool = False,
+        aot_cache: typing.Optional[str] = None,
+        boot_cache: typing.Optional[str] = None,
+        boot_cycles: int = 5_000_000,
+        idle_skip: bool = False,
+        idioms: bool = False,
+        traps: bool = False,
+    ):
+        """
+        :param rom_dir: Directory of ROM files.
+        :param aot: Run BASIC and KERNAL translated ahead of time.
+        :param aot_cache: Directory of translated ROMs.
+        :param boot_cache: Directory of cached boot snapshots, see bootcache.
+        :param boot_cycles: Maximum cycles to reach READY prompt, if it is not cached.
+        :param idle_skip: Fast-forward loops waiting for an interrupt, e.g. for a key press.
+        :param idioms: Run recognized copy and fill loops natively.
+        :param traps: Run KERNAL routines and BASIC floating point routines natively.
+        """
+        self.machine = C64(rom_dir)
+        if aot:
+            self.machine.enable_aot(aot_cache)
+        if idle_skip:
+            self.machine.enable_idle_skip()
+        if idioms:
+            self.machine.enable_idioms()
+        if traps:
+            self.machine.enable_traps()
+        bootcache.boot(self.machine, boot_cache, boot_cycles)
+        self.boot = self.machine.snapshot()
+
+    def run(
+        self,
+        prg: DEntry,
+        frames: int,
+        frame_cycles: int = FRAME_CYCLES,
+        stop_pc: typing.Iterable[int] = (),
+        stop_text: typing.Optional[str] = None,
+    ) -> typing.Tuple[typing.Dict[str, typing.Any], FrameImage]:
+        """
+        Inject and run a program from the post-boot state.
+
+        :param prg: Program to run.
+        :param frames: Frame budget.
+        :param frame_cycles: Cycles per frame.
+        :param stop_pc: Stop when CPU reaches any of these addresses. They are breakpoints, so translated code,
+            idle skip and idioms are not used in the job, as those do not see every instruction.
+        :param stop_text: Stop when screen contains this text. Checked per frame.
+        :return: Result dict and the final screen.
+            Status of the result is "budget", "stopped" (by stop_pc) or "text".
+        """
+        machine = self.machine
+        machine.restore(self.boot)
+        cpu = machine.cpu
+        cpu.breaks.clear()
+        for addr in stop_pc:
+            cpu.breaks[addr] = BreakOp(action=_stop)
+        if cpu.breaks and (cpu.aot is not None or cpu.idle is not None or cpu.idioms is not None):
+            warnings.warn("Stop addresses turn translated code, idle skip and idioms off for the job")
+        start_cycles = machine.clock.cycles
+        machine.inject_program(prg)
+
+        status = "budget"
+        frame = 0
+        # CPU prints when stopped by a break point, and callers use stdout for their own output.
+        with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+            while frame < frames:
+                frame += 1
+                if machine.run(frame_cycles) != 0:
+                    status = "stopped"
+                    break
+                if stop_text is not None:
+                    if any(stop_text in line for line in FrameImage.of(machine).text()):
+                        status = "text"
+                        break
+
+        image = FrameImage.of(machine, frame)
+        return (
+            dict(
+                status=status,
+                frames=frame,
+                cycles=machine.clock.cycles - start_cycles,
+                pc=machine.cpu.pc,
+                screen=image.text(),
+                ram_sha1=hashlib.sha1(bytes(machine.ram.mem)).hexdigest(),
+                color_sha1=hashlib.sha1(bytes(machine.c_ram.mem)).hexdigest(),
+            ),
+            image,
+        )
@@ -27,11 +27,13 @@ class Keyboard:
     # fmt: on
     assert len(LIST) == 64
 
-    __slots__ = ("_a_values", "_b_values", "_key_map", "_key_to_pos", "unknown_key")
+    __slots__ = ("_a_values", "_b_values", "_key_map", "_key_to_pos", "unknown_key", "listener")
 
     def __init__(self, key_map: typing.Dict[int, int]):
         self._key_map = key_map
         self.unknown_key: typing.Optional[typing.Callable[[int], None]] = None
+        # Called with ("push" or "release", key name) for each key change, e.g. for recording input.
+        self.listener: typing.Optional[typing.Callable[[str, str], None]] = None
 
         # Name of key to (a,b) position. Could simplified to be scancode to (a,b).
         self._key_to_pos = {}
@@ -52,6 +54,8 @@ class Keyboard:
     def push(self, key):
         pos = self._key_to_pos.get(key)
         if pos is not None:
+            if self.listener is not None:
+                self.listener("push", key)
             a, b = pos
             self._a_values[a] |= 1 << b
             self._b_values[b] |= 1 << a
@@ -59,6 +63,8 @@ class Keyboard:
     def release(self, key):
         pos = self._key_to_pos.get(key)
         if pos is not None:
+            if self.listener is not None:
+                self.listener("release", key)
             a, b = pos
             self._a_values[a] &= ~(1 << b)
             self._b_values[b] &= ~(1 << a)
@@ -68,6 +74,13 @@ class Keyboard:
             self._a_values[i] = 0
             self._b_values[i] = 0
 
+    def get_state(self) -> bytes:
+        return bytes(self._a_values + self._b_values)
+
+    def set_state(self, state: bytes):
+        self._a_values[:] = state[:8]
+        self._b_values[:] = state[8:16]
+
     def by_a(self, mask: int):
         """
         :param mask: Mask being tested. Should contain only one 1 bit.
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import os
+import typing
+
+from py65xx import aot, snapshot
+from py65xx.bus import RAM, Bus, MMap
+from py65xx.clock import Clock
+from py65xx.cpu65xx import CPU
+from py65xx.idioms import Idioms
+from py65xx.idle import IdleSkip
+from py65xx.traps import Traps
+from pyc64.aot import seeds
+from pyc64.basicfloat import basic_float_traps
+from pyc64.cia import CIA, CIA1AB, CIA2A
+from pyc64.hacks import inject_program
+from pyc64.keyboard import Keyboard
+from pyc64.pla import PLA, Multiplex
+from pyc64.traps import kernal_traps
+from pyc64.vic2 import VIC2, ColorRAM
+
+if typing.TYPE_CHECKING:
+    from pyc64.support.defs import DEntry
+
+# 40000 cycles = 0.04 s = 25 1/s .. if the emulation could run so fast.
+# 20k gives slightly better keyboard interaction.
+FRAME_CYCLES = 20000
+
+
+class C64:
+    """
+    The C64 machine without any display or input handling.
+    Display and keyboard are connected by the user, e.g. main_sdl.py.
+
+    Input from outside of the machine should come through keys or the methods here,
+    so that input_listener sees it. See pyc64.inputlog.
+    """
+
+    def __init__(
+        self,
+        rom_dir: str = ".",
+        key_map: typing.Optional[typing.Dict[int, typing.Any]] = None,
+    ):
+        self.ram = ram = RAM()
+        self.bus = bus = Bus()
+        self.clock = clock = Clock()
+        self.cpu = cpu = CPU(bus, clock, history_length=16)
+
+        self.pla = pla = PLA(bus)
+        bus.register(pla)
+        clock.cpu = cpu
+
+        self.vic2 = vic2 = VIC2(bus, cpu)
+
+        self.io = io = Multiplex()
+        pla.i_io = bus.register(io)
+
+        # IO
+        self.keys = keys = Keyboard(key_map if key_map is not None else {})
+        keys.listener = self._on_key
+        # Called with event kind and arguments for each input event.
+        self.input_listener: typing.Optional[typing.Callable[..., None]] = None
+
+        self.cia1 = cia1 = CIA(0xDC00, clock, CPU.IRQ.IRQ)
+        cia1.pio1 = CIA1AB(keys, is_b=False)
+        cia1.pio2 = CIA1AB(keys, is_b=True)
+        cia1.pio2.other_port = cia1.pio1
+        cia1.pio1.other_port = cia1.pio2
+
+        self.cia2 = cia2 = CIA(0xDD00, clock, CPU.IRQ.NMI)
+        cia2.pio1 = CIA2A(vic2)
+
+        io.add(cia1)
+        io.add(cia2)
+        self.c_ram = c_ram = ColorRAM()
+        io.add(c_ram)
+        io.add(vic2)
+
+        clock.register(cia1)
+        clock.register(cia2)
+
+        # ROMs
+        self.kernal = MMap("kernal", os.path.join(rom_dir, "kernal"), 0xE000, 0xFFFF)
+        self.basic = MMap("basic", os.path.join(rom_dir, "basic"), 0xA000, 0xBFFF)
+        self.chargen = MMap("chargen", os.path.join(rom_dir, "chargen"), 0xD000, 0xDFFF)
+        pla.i_kernal = bus.register(self.kernal)
+        pla.i_basic = bus.register(self.basic)
+        pla.i_chargen = bus.register(self.chargen)
+
+        bus.register(ram)
+        bus.mem = ram.mem
+
+        # Native ROM routines, see enable_traps.
+        self.traps: typing.Optional[Traps] = None
+
+    def enable_aot(self, cache_dir: typing.Optional[str] = None):
+        """
+        Run BASIC and KERNAL code translated ahead of time, see py65xx.aot.
+        The translation is done on first use of the ROMs, and cached in cache_dir.
+        """
+        aot.install(self.cpu, [self.basic, self.kernal], seeds(self.basic, self.kernal), cache_dir)
+        if self.traps is not None:
+            self.traps.drop_blocks(self.cpu)
+
+    def enable_idle_skip(self):
+        """
+        Fast-forward loops that only wait for an interrupt, e.g. the KERNAL waiting for a key press.
+        See py65xx.idle.
+        """
+        self.cpu.idle = IdleSkip()
+
+    def enable_traps(self, costs: typing.Optional[typing.Dict[str, int]] = None):
+        """
+        Run KERNAL routines and BASIC floating point routines natively, where the ROMs have the code
+        they implement. See pyc64.traps and pyc64.basicfloat.
+
+        :param costs: Cycles charged by trap name, instead of the defaults.
+        """
+        self.traps = Traps(kernal_traps() + basic_float_traps(), costs)
+        self.kernal = self.traps.install(self.bus, self.kernal)
+        self.basic = self.traps.install(self.bus, self.basic)
+        self.traps.drop_blocks(self.cpu)
+
+    def enable_idioms(self):
+        """
+        Run recognized copy and fill loops natively on RAM. See py65xx.idioms.
+        """
+        self.cpu.idioms = Idioms()
+
+    def _on_key(self, kind: str, key: str):
+        if self.input_listener is not None:
+            self.input_listener(kind, key)
+
+    def reset(self):
+        if self.input_listener is not None:
+            self.input_listener("reset")
+        self.bus.reset()
+        self.cpu.reset()
+
+    def nmi(self):
+        """
+        RESTORE key.
+        """
+        if self.input_listener is not None:
+            self.input_listener("nmi")
+        self.cpu.irq = CPU.IRQ.NMI
+
+    def set_lightpen_pos(self, x: int, y: int):
+        if self.input_listener is not None:
+            self.input_listener("lightpen", x, y)
+        self.vic2.set_lightpen_pos(x, y)
+
+    def inject_program(self, prg: DEntry):
+        if self.input_listener is not None:
+            self.input_listener("inject", prg)
+        inject_program(prg, self.bus, self.ram)
+
+    def run(self, cycles: int = FRAME_CYCLES) -> int:
+        return self.cpu.run(cycles)
+
+    def snapshot(self) -> bytes:
+        return snapshot.capture(self.cpu)
+
+    def restore(self, data: bytes):
+        snapshot.restore(self.cpu, data)
+
+    def save_snapshot(self, fname: str):
+        snapshot.save(self.cpu, fname)
+
+    def load_snapshot(self, fname: str):
+        snapshot.load(self.cpu, fname)
@@ -3,12 +3,17 @@
 
 from __future__ import annotations
 
+import struct
 import typing
 
 if typing.TYPE_CHECKING:
     from py65xx.bus import Bus
 
 from py65xx.defs import BusPart, BusRet, TAddr, TData
+from py65xx.snapshot import pack_states, unpack_states
+
+# ddr, val
+_STATE = struct.Struct("<BB")
 
 
 class PLA(BusPart):
@@ -52,6 +57,19 @@ class PLA(BusPart):
             self.val = ((data & self.ddr) | (self.val & ~self.ddr)) & 0xFF
             self._update_peripherals()
 
+    def is_plain(self, addr: TAddr) -> bool:
+        return addr > 1
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        return start <= 1 and end >= 0
+
+    def get_state(self) -> bytes:
+        return _STATE.pack(self.ddr, self.val)
+
+    def set_state(self, state: bytes):
+        # Mapping of the peripherals is restored with the bus state.
+        self.ddr, self.val = _STATE.unpack(state)
+
     def set_map(self, basic, kernal, charen):
         self.val = (
             (self.val & ~0x7)
@@ -135,6 +153,14 @@ class Multiplex(BusPart):
         for part in self.parts:
             part.reset()
 
+    def get_state(self) -> bytes:
+        return pack_states(part.get_state() for part in self.parts)
+
+    def set_state(self, state: bytes):
+        for part, part_state in zip(self.parts, unpack_states(state)):
+            if part_state is not None:
+                part.set_state(part_state)
+
     def read_address(self, addr: TAddr) -> BusRet:
         i = 0
         e = len(self.parts)
@@ -151,5 +177,11 @@ class Multiplex(BusPart):
             self.parts[i].write_address(addr, data)
             i += 1
 
+    def is_plain(self, addr: TAddr) -> bool:
+        return all(part.is_plain(addr) for part in self.parts)
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        return any(part.handles(start, end) for part in self.parts)
+
     def __repr__(self):
         return "Multiplex(" + ", ".join(repr(p) for p in self.parts) + ")"
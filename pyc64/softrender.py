@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import struct
+import typing
+import zlib
+
+from pyc64.framelog import MODE_INVALID, FrameImage
+from pyc64.vic2 import Colors, DisplayMode
+
+BORDER = 32
+WIDTH = 320 + 2 * BORDER
+HEIGHT = 200 + 2 * BORDER
+
+_RGB = [bytes(Colors(i).rgb) for i in range(16)]
+
+
+class SoftRenderer:
+    """
+    Software renderer for recorded frames.
+    Does not need SDL, so it can be run in worker processes without a display.
+    """
+
+    def __init__(self, chargen: bytes):
+        self._chargen = chargen
+        # (bits, color, color, ...) -> 8 pixels of RGB.
+        self._strips: typing.Dict[tuple, bytes] = {}
+
+    def _hires(self, bits: int, fg: int, bg: int) -> bytes:
+        key = (bits, fg, bg)
+        strip = self._strips.get(key)
+        if strip is None:
+            strip = b"".join(
+                _RGB[fg] if bits & (0x80 >> x) else _RGB[bg] for x in range(8)
+            )
+            self._strips[key] = strip
+        return strip
+
+    def _multi(self, bits: int, c0: int, c1: int, c2: int, c3: int) -> bytes:
+        key = (bits, c0, c1, c2, c3)
+        strip = self._strips.get(key)
+        if strip is None:
+            cs = (c0, c1, c2, c3)
+            strip = b"".join(
+                _RGB[cs[(bits >> (6 - x)) & 3]] * 2 for x in (0, 2, 4, 6)
+            )
+            self._strips[key] = strip
+        return strip
+
+    def draw(self, image: FrameImage) -> typing.List[bytes]:
+        """
+        :return: Rows of RGB pixels, WIDTH by HEIGHT.
+        """
+        vic = image.vic
+        border = _RGB[vic.bord_cl]
+        border_row = border * WIDTH
+        if not vic.den:
+            return [border_row] * HEIGHT
+
+        if vic.mode == MODE_INVALID:
+            lines = [_RGB[0] * 320] * 200
+        elif vic.is_bitmap:
+            lines = self._draw_bitmap(image)
+        else:
+            lines = self._draw_text(image)
+
+        # XXX: Like in Renderer, scroll is only applied for the smaller screen sizes.
+        x_off = vic.scroll_x if vic.columns == 38 else 0
+        y_off = vic.scroll_y - 4 if vic.rows == 24 else 0
+        x_left, x_right = (7, 311) if vic.columns == 38 else (0, 320)
+        y_top, y_bottom = (4, 196) if vic.rows == 24 else (0, 200)
+
+        side = border * BORDER
+        rows = [border_row] * BORDER
+        for y in range(200):
+            src = y - y_off
+            if y < y_top or y >= y_bottom or not 0 <= src < 200:
+                rows.append(border_row)
+                continue
+            line = lines[src]
+            if x_off:
+                line = _RGB[vic.bg_cl[0]] * x_off + line[: (320 - x_off) * 3]
+            line = border * x_left + line[x_left * 3 : x_right * 3] + border * (320 - x_right)
+            rows.append(side + line + side)
+        rows.extend([border_row] * BORDER)
+        return rows
+
+    def _font(self, image: FrameImage) -> bytes:
+        if image.data is not None:
+            return image.data
+        offset = image.vic.font_base & 0x800
+        return self._chargen[offset : offset + 0x800]
+
+    def _draw_text(self, image: FrameImage) -> typing.List[bytes]:
+        vic = image.vic
+        font = self._font(image)
+        bgs = vic.bg_cl
+        lines = []
+        for row in range(25):
+            start = row * 40
+            chars = image.screen[start : start + 40]
+            colors = image.colors[start : start + 40]
+            for line in range(8):
+                strips = []
+                for char, color in zip(chars, colors):
+                    color &= 0xF
+                    if vic.mode == DisplayMode.TEXT_MULTI_COLOR:
+                        bits = font[char * 8 + line]
+                        if color & 0x8:
+                            strip = self._multi(bits, bgs[0], bgs[1], bgs[2], color & 7)
+                        else:
+                            strip = self._hires(bits, color & 7, bgs[0])
+                    elif vic.mode == DisplayMode.TEXT_EXTENDED:
+                        bits = font[(char & 0x3F) * 8 + line]
+                        strip = self._hires(bits, color, bgs[char >> 6])
+                    else:
+                        bits = font[char * 8 + line]
+                        strip = self._hires(bits, color, bgs[0])
+                    strips.append(strip)
+                lines.append(b"".join(strips))
+        return lines
+
+    def _draw_bitmap(self, image: FrameImage) -> typing.List[bytes]:
+        vic = image.vic
+        bitmap = image.data
+        multi = vic.mode == DisplayMode.BM_MULTI_COLOR
+        lines = []
+        for row in range(25):
+            start = row * 40
+            for line in range(8):
+                strips = []
+                for col in range(40):
+                    bits = bitmap[(start + col) * 8 + line]
+                    c = image.screen[start + col]
+                    if multi:
+                        cram = image.colors[start + col] & 0xF
+                        strip = self._multi(bits, vic.bg_cl[0], c >> 4, c & 0xF, cram)
+                    else:
+                        strip = self._hires(bits, c >> 4, c & 0xF)
+                    strips.append(strip)
+                lines.append(b"".join(strips))
+        return lines
+
+
+def scale(rows: typing.List[bytes], zoom: int) -> typing.List[bytes]:
+    if zoom == 1:
+        return rows
+    out = []
+    for row in rows:
+        scaled = b"".join(row[i : i + 3] * zoom for i in range(0, len(row), 3))
+        out.extend([scaled] * zoom)
+    return out
+
+
+def png(rows: typing.List[bytes]) -> bytes:
+    """
+    Encode RGB rows into a PNG image.
+    """
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data))
+        )
+
+    height = len(rows)
+    width = len(rows[0]) // 3
+    raw = b"".join(b"\x00" + row for row in rows)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
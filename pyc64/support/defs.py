@@ -10,5 +10,4 @@ class DEntry(typing.NamedTuple):
     data: bytes
 
     def write_into(self, ram):
-        for i, data in enumerate(self.data):
-            ram.mem[self.load_addr + i] = data
+        ram.write_block(self.load_addr, self.data)
@@ -15,6 +15,71 @@ def load_prg(name: str) -> DEntry:
     :return: DEntry.
     """
     with open(name, "rb") as f:
-        (lpos,) = struct.unpack("<H", f.read(2))
-        data = f.read()
-    return DEntry(lpos, name, data)
+        return parse_prg(f.read(), name)
+
+
+def parse_prg(data: bytes, name: str = "") -> DEntry:
+    """
+    Parse contents of a .PRG file, see load_prg.
+
+    :param data: File contents.
+    :param name: Name for the DEntry.
+    :return: DEntry.
+    """
+    if len(data) < 2:
+        raise ValueError("PRG data is shorter than load address")
+    (lpos,) = struct.unpack_from("<H", data)
+    return DEntry(lpos, name, data[2:])
+
+
+# BASIC V2 keywords, tokens from $80 on.
+KEYWORDS = (
+    "END FOR NEXT DATA INPUT# INPUT DIM READ LET GOTO RUN IF RESTORE GOSUB RETURN REM STOP ON WAIT LOAD SAVE"
+    " VERIFY DEF POKE PRINT# PRINT CONT LIST CLR CMD SYS OPEN CLOSE GET NEW TAB( TO FN SPC( THEN NOT STEP"
+    " + - * / ^ AND OR > = < SGN INT ABS USR FRE POS SQR RND LOG EXP COS SIN TAN ATN PEEK LEN STR$ VAL ASC"
+    " CHR$ LEFT$ RIGHT$ MID$ GO"
+).split()
+
+
+def tokenize(lines: str, name: str = "", load_addr: int = 0x0801) -> DEntry:
+    """
+    Make a BASIC program from text, as the BASIC line editor would.
+    Only upper case letters, digits and punctuation are supported.
+
+    >>> tokenize('10 PRINT "HI":GOTO 10').data.hex()
+    '11080a009920224849223a89203130000000'
+
+    :param lines: Program lines, each starting with its line number.
+    :param name: Name for the DEntry.
+    :param load_addr: Start address of the program.
+    :return: DEntry.
+    """
+    data = bytearray()
+    for line in lines.strip().splitlines():
+        number, text = line.strip().split(" ", 1)
+        body = bytearray()
+        i = 0
+        quoted = data_statement = remark = False
+        while i < len(text):
+            c = text[i]
+            if c == '"':
+                quoted = not quoted
+            elif not quoted and c == ":":
+                data_statement = False
+            if quoted or data_statement or remark:
+                body.append(ord(c))
+                i += 1
+                continue
+            token = next((t for t, word in enumerate(KEYWORDS) if text.startswith(word, i)), None)
+            if token is None:
+                body.append(ord(c))
+                i += 1
+                continue
+            body.append(0x80 + token)
+            i += len(KEYWORDS[token])
+            data_statement = KEYWORDS[token] == "DATA"
+            remark = KEYWORDS[token] == "REM"
+        link = load_addr + len(data) + 4 + len(body) + 1
+        data += struct.pack("<HH", link, int(number)) + body + b"\0"
+    data += b"\0\0"
+    return DEntry(load_addr, name, bytes(data))
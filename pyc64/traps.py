@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+from __future__ import annotations
+
+import typing
+
+if typing.TYPE_CHECKING:
+    from py65xx.cpu65xx import CPU
+
+from py65xx.bus import RAM
+from py65xx.traps import Trap
+
+# RAMTAS: clear zero page, pages 2 and 3, test RAM from $0400 up and set the memory limits.
+RAMTAS = 0xFD50
+RAMTAS_CODE = bytes.fromhex(
+    "a900a8990200990002990003c8d0f4a23ca00386b284b3a8a90385c2e6c2b1c1aaa95591c1d1c1d00f2a91c1d1c1d008"
+    "8a91c1c8d0e8f0e498aaa4c218202dfea9088d8202a9048d880260"
+)
+# Part of MEMTOP called by RAMTAS: STX $0283, STY $0284, RTS.
+MEMTOP_SET = 0xFE2D
+MEMTOP_SET_CODE = bytes.fromhex("8e83028c840260")
+# RTS of RAMTAS.
+RAMTAS_END = 0xFD9A
+
+# LP2: take a key from the keyboard buffer, called by GETIN after SEI.
+LP2 = 0xE5B4
+LP2_CODE = bytes.fromhex("ac7702a200bd78029d7702e8e4c6d0f5c6c698")
+# CLI of LP2.
+LP2_END = 0xE5C7
+
+KEY_BUFFER = 0x0277
+KEY_COUNT = 0xC6
+
+
+def _ramtas(cpu: CPU) -> typing.Union[bool, int]:
+    if not cpu.p.I:
+        # The ROM code could be interrupted in the middle.
+        return False
+    bus = cpu.bus
+    for i in range(0x100):
+        bus.write(0x0002 + i, 0)
+        bus.write(0x0200 + i, 0)
+        bus.write(0x0300 + i, 0)
+    bus.write(0xB2, 0x3C)
+    bus.write(0xB3, 0x03)
+
+    # Each byte is read, written with $55 and $AB, read back after both, and restored, until a byte
+    # does not keep the values. Pages of RAM only keep them. The test ends at the latest on the KERNAL ROM.
+    ram = next((p for p in bus.parts if isinstance(p, RAM) and p.mem is bus.mem), None)
+    page, low = 0x04, 0
+    # Cycles of the test of the failing byte.
+    failed = 0
+    while True:
+        addr = page << 8 | low
+        if low == 0 and ram is not None and bus.only_part(ram, addr, addr + 0xFF):
+            ram.dirty[page] = 1
+            page += 1
+            continue
+        value = bus.read(addr)
+        bus.write(addr, 0x55)
+        if bus.read(addr) != 0x55:
+            failed = 16  # FD6E-FD77
+            break
+        bus.write(addr, 0xAB)
+        if bus.read(addr) != 0xAB:
+            failed = 26  # FD6E-FD7E
+            break
+        bus.write(addr, value)
+        low = (low + 1) & 0xFF
+        if low == 0:
+            page += 1
+    bus.write(0xC2, page)
+
+    # JSR MEMTOP_SET, with the limit in X and Y.
+    ra = RAMTAS_END - 11
+    bus.write(cpu.stc + cpu.sp - 1, ra & 0xFF)
+    bus.write(cpu.stc + cpu.sp, ra >> 8)
+    bus.write(0x0283, low)
+    bus.write(0x0284, page)
+    bus.write(0x0282, 0x08)
+    bus.write(0x0288, 0x04)
+    cpu.A, cpu.X, cpu.Y = 0x04, low, page
+    cpu.p.update_by_value(0x04)
+    cpu.p.C = False
+    cpu.pc = RAMTAS_END
+
+    # FD50-FD6A, with 256 times FD53-FD5D, and FD88-FD97 with MEMTOP_SET.
+    # Each page tested takes INC and BEQ (FD6C, FD86), and each byte kept FD6E-FD84.
+    pages = page - 0x04
+    return 3894 + 2 * pages + 34 * (pages << 8 | low) + failed
+
+
+def _lp2(cpu: CPU) -> typing.Union[bool, int]:
+    if not cpu.p.I:
+        return False
+    bus = cpu.bus
+    key = bus.read(KEY_BUFFER)
+    count = bus.read(KEY_COUNT) or 0x100
+    for i in range(count):
+        bus.write(KEY_BUFFER + i, bus.read(KEY_BUFFER + 1 + i))
+    bus.write(KEY_COUNT, (count - 1) & 0xFF)
+    cpu.A = cpu.Y = key
+    cpu.X = count & 0xFF
+    cpu.p.update_by_value(key)
+    # From the CPX ending the loop.
+    cpu.p.C = True
+    cpu.pc = LP2_END
+    # E5B4-E5B7 and E5C4-E5C6, and E5B9-E5C2 for each key in the buffer.
+    return 8 + 13 * count
+
+
+def kernal_traps() -> typing.List[Trap]:
+    """
+    Traps of KERNAL routines, see py65xx.traps.
+    """
+    return [
+        # The functions count the cycles the ROM code takes, these are with RAM up to $A000 and one key.
+        Trap("RAMTAS", RAMTAS, _ramtas, 1_362_046, ((RAMTAS, RAMTAS_CODE), (MEMTOP_SET, MEMTOP_SET_CODE))),
+        Trap("LP2", LP2, _lp2, 21, ((LP2, LP2_CODE),)),
+    ]
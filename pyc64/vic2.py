@@ -5,6 +5,7 @@ from __future__ import annotations
 
 import array
 import enum
+import struct
 import typing
 
 if typing.TYPE_CHECKING:
@@ -15,6 +16,16 @@ from py65xx.defs import BusPart, BusRet, TAddr, TData
 _CL_STATIC = 0xF0
 _MASK_NIBBLE = 0x0F
 
+# Fields stored in VIC2 snapshot, in order.
+_STATE_FIELDS = (
+    "_mem_base", "_raster_pos", "_raster_latch", "_rsel", "_csel", "bord_cl",
+    "_spr_mcl1", "_spr_mcl2", "_lpx", "_lpy", "scroll_x", "scroll_y",
+    "_irst", "_erst", "_imbc", "_embc", "_immc", "_emmc", "_ilp", "_elp", "_irq",
+    "den", "_res", "_mcm", "_bmm", "_ecm", "_vc1x", "_cb1x",
+)
+# Above fields, bg_cl, _spr_x, _spr_y, _spr_en, _spr_cl.
+_STATE = struct.Struct("<HHH" + "B" * (len(_STATE_FIELDS) - 3) + "4B8H8B8B8B")
+
 
 class DisplayMode(enum.IntEnum):
     TEXT_STANDARD = 0
@@ -36,7 +47,9 @@ class VIC2(BusPart):
     def __init__(self, bus: Bus, cpu):
         self.bus = bus
         self.cpu = cpu
+        self.reset()
 
+    def reset(self):
         self._mem_base = 0xC000
 
         # Current raster position. Visible area is 51..251
@@ -90,8 +103,26 @@ class VIC2(BusPart):
         self._vc1x = 1  # 0..15 Screen memory location. * 0x400
         self._cb1x = 2  # 0..7 Character data bits 11 to 13 (= * 0x800). 3..10 is char, 0..2 is char raster line.
 
-    def reset(self):
-        self.__init__(self.bus, self.cpu)
+    def get_state(self) -> bytes:
+        return _STATE.pack(
+            *(int(getattr(self, name)) for name in _STATE_FIELDS),
+            *self.bg_cl,
+            *self._spr_x,
+            *self._spr_y,
+            *(int(e) for e in self._spr_en),
+            *self._spr_cl,
+        )
+
+    def set_state(self, state: bytes):
+        values = _STATE.unpack(state)
+        for name, value in zip(_STATE_FIELDS, values):
+            setattr(self, name, value)
+        pos = len(_STATE_FIELDS)
+        self.bg_cl[:] = values[pos : pos + 4]
+        self._spr_x[:] = values[pos + 4 : pos + 12]
+        self._spr_y[:] = values[pos + 12 : pos + 20]
+        self._spr_en[:] = [e != 0 for e in values[pos + 20 : pos + 28]]
+        self._spr_cl[:] = values[pos + 28 : pos + 36]
 
     def set_mem_base_index(self, base: int):
         # These addresses correspond to VIC2 address bits in CIA2A.
@@ -281,6 +312,12 @@ class VIC2(BusPart):
                 # Sprite colors
                 self._spr_cl[c_addr - 0x27] = data & _MASK_NIBBLE
 
+    def is_plain(self, addr: TAddr) -> bool:
+        return not 0xD000 <= addr <= 0xD3FF
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        return start <= 0xD3FF and end >= 0xD000
+
     @property
     def display_base(self):
         return self._mem_base + self._vc1x * 0x400
@@ -355,8 +392,7 @@ class ColorRAM(BusPart):
         self.mem = [0] * 1024
 
     def reset(self):
-        for i in range(len(self.mem)):
-            self.mem[i] = 0
+        self.mem[:] = bytes(len(self.mem))
 
     def read_address(self, addr: TAddr) -> BusRet:
         if 0xD800 <= addr <= 0xDBFF:
@@ -366,9 +402,21 @@ class ColorRAM(BusPart):
         if 0xD800 <= addr <= 0xDBFF:
             self.mem[addr - 0xD800] = data & 0xF
 
+    def is_plain(self, addr: TAddr) -> bool:
+        return True
+
+    def handles(self, start: TAddr, end: TAddr) -> bool:
+        return start <= 0xDBFF and end >= 0xD800
+
     def __getitem__(self, item):
         return self.mem[item]
 
+    def get_state(self) -> bytes:
+        return bytes(self.mem)
+
+    def set_state(self, state: bytes):
+        self.mem[:] = state
+
     def dump(self, fname: str):
         with open(fname, "wb") as f:
             array.array("B", self.mem).tofile(f)
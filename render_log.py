@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import multiprocessing
+import os
+import subprocess
+import time
+
+from pyc64.framelog import FrameImage, FrameReader
+from pyc64.softrender import HEIGHT, WIDTH, SoftRenderer, png, scale
+
+# Per worker process state.
+_renderer = None
+_zoom = 1
+_out_dir = ""
+
+
+def _init(chargen: str, zoom: int, out_dir: str):
+    global _renderer, _zoom, _out_dir
+    with open(chargen, "rb") as f:
+        _renderer = SoftRenderer(f.read())
+    _zoom = zoom
+    _out_dir = out_dir
+
+
+def _render_raw(image: FrameImage) -> bytes:
+    return b"".join(scale(_renderer.draw(image), _zoom))
+
+
+def _render_png(image: FrameImage) -> int:
+    with open(os.path.join(_out_dir, f"frame-{image.index:06d}.png"), "wb") as f:
+        f.write(png(scale(_renderer.draw(image), _zoom)))
+    return image.index
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Render frames recorded with --record",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("log", type=str, help="Frame log file.")
+    parser.add_argument("--out", type=str, default="frames", help="Output directory for PNG files.")
+    parser.add_argument("--video", type=str, help="Encode frames into this video file with ffmpeg instead.")
+    parser.add_argument("--fps", type=int, default=25, help="Video frame rate.")
+    parser.add_argument("--zoom", type=int, default=2, help="Zoom factor.")
+    parser.add_argument("--chargen", type=str, default="chargen", help="Character ROM file.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Count of render processes.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    start = time.time()
+
+    if args.video is None:
+        os.makedirs(args.out, exist_ok=True)
+
+    count = 0
+    with FrameReader(args.log) as reader, multiprocessing.Pool(
+        args.jobs, initializer=_init, initargs=(args.chargen, args.zoom, args.out)
+    ) as pool:
+        if args.video is not None:
+            ffmpeg = subprocess.Popen(
+                ["ffmpeg", "-loglevel", "error", "-y",
+                 "-f", "rawvideo", "-pix_fmt", "rgb24",
+                 "-s", f"{WIDTH * args.zoom}x{HEIGHT * args.zoom}", "-r", str(args.fps),
+                 "-i", "-", "-pix_fmt", "yuv420p", args.video],
+                stdin=subprocess.PIPE,
+            )
+            # Video needs the frames in order.
+            for rgb in pool.imap(_render_raw, reader.images(), chunksize=8):
+                ffmpeg.stdin.write(rgb)
+                count += 1
+            ffmpeg.stdin.close()
+            ffmpeg.wait()
+        else:
+            for _ in pool.imap_unordered(_render_png, reader.images(), chunksize=8):
+                count += 1
+
+    print("Rendered", count, "frames in", time.time() - start, "s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,15 @@
 # Copyright (C) 2021  Jyrki Launonen
 
+import argparse
 import hashlib
 import time
 
-import py65xx.instructions65xx
 from py65xx.bus import Bus, MMap
 from py65xx.clock import Clock
 from py65xx.cpu65xx import CPU, BreakOp
+from py65xx.debugger import ReverseDebugger
+from py65xx.flat import FlatMachine
+from py65xx.profiler import Profiler, Symbols
 
 BIN = "6502_functional_test.bin"
 LST = "6502_functional_test.lst"
@@ -32,23 +35,43 @@ def hash_test():
     return True
 
 
-def main():
-    bus = Bus()
-    clock = Clock()
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Run Klaus Dormann's 6502 functional test",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--reverse", type=int, default=0, metavar="INTERVAL",
+                        help="Take checkpoints every INTERVAL cycles and open debugger on failure,"
+                             " so that `dbg.step_back()` can be used. 0 disables.")
+    parser.add_argument("--flat", action="store_true",
+                        help="Run on the flat memory machine instead of generic Bus with a memory mapped file.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Count cycles per address and print hot spots, using labels from {}.".format(LST))
+    return parser.parse_args()
 
-    # Ensure we stop when expected.
-    py65xx.instructions65xx.CHECK_STUCK = True
 
-    cpu = CPU(bus, clock, history_length=16)
-    cpu.reset()
+def main():
+    args = arg_parser()
 
     # ROM from Klaus2m5/6502_65C02_functional_tests
-    # Since the binary is full memory, consider the loaded memory directly writable.
-    # The test needs to write into memory anyways.
     rom_hash_valid = hash_test()
-    rom = MMap("FlashRom", BIN, 0, writable=True, write_through=False)
-    bus.register(rom)
-    bus.mem = rom  # not really mem, but...
+    if args.flat:
+        with open(BIN, "rb") as f:
+            machine = FlatMachine(f.read(), history_length=16)
+        machine.reset()
+        cpu = machine.cpu
+        clock = machine.clock
+    else:
+        bus = Bus()
+        clock = Clock()
+        cpu = CPU(bus, clock, history_length=16)
+        cpu.reset()
+
+        # Since the binary is full memory, consider the loaded memory directly writable.
+        # The test needs to write into memory anyways.
+        rom = MMap("FlashRom", BIN, 0, writable=True, write_through=False)
+        bus.register(rom)
+        bus.mem = rom  # not really mem, but...
+    # Ensure we stop when expected.
+    cpu.check_stuck = True
     cpu.pc = 0x0400
 
     # cpu.breaks[0x35cd] = BreakOp(action="log")
@@ -56,9 +79,20 @@ def main():
 
     print("Testing... (might take few minutes)")
 
+    profiler = None
+    if args.profile:
+        profiler = cpu.profiler = Profiler()
+
+    dbg = None
+    if args.reverse > 0:
+        dbg = ReverseDebugger(cpu, interval=args.reverse)
+
     start = time.time()
     try:
-        r = cpu.run()
+        if dbg is not None:
+            r = dbg.run(1 << 62)
+        else:
+            r = cpu.run()
         print(repr(cpu))
     except:
         print(repr(cpu))
@@ -68,17 +102,27 @@ def main():
     print("took {:.3f} s".format(end - start))
     clock.stats()
 
+    if profiler is not None:
+        symbols = Symbols()
+        try:
+            symbols.load_lst(LST)
+        except FileNotFoundError:
+            print("File {} not found, reporting without labels.".format(LST))
+        profiler.report(cpu, symbols)
+
     if r == 2:
         if rom_hash_valid:
             if cpu.pc == SUCCESS_ADDRESS:
                 print("Test (probably) succeeded. Check {} to ensure we stopped in right place.".format(LST))
             else:
                 print("Test (probably) failed. Check {} to see where CPU stuck.".format(LST))
+                if dbg is not None:
+                    dbg.trace_log()
+                    print("Use dbg.step_back(), dbg.step() and dbg.trace_log() to inspect.")
+                    breakpoint()
         else:
             print("Test ended. Check {} to see where CPU stuck.".format(LST))
 
-    # rom.dump("ftest.dat")
-
 
 if __name__ == '__main__':
     main()
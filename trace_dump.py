@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2021  Jyrki Launonen
+
+import argparse
+import itertools
+
+from py65xx.trace import TraceReader
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Print a trace written with --trace as text",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("trace", type=str, help="Trace file.")
+    parser.add_argument("--skip", type=int, default=0, help="Count of records to skip.")
+    parser.add_argument("--count", type=int, default=-1, help="Count of records to print. Negative prints all.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = arg_parser()
+    lines = TraceReader(args.trace).text()
+    stop = args.skip + args.count if args.count >= 0 else None
+    try:
+        for line in itertools.islice(lines, args.skip, stop):
+            print(line)
+    except BrokenPipeError:
+        pass
+
+
+if __name__ == '__main__':
+    main()